@@ -0,0 +1,234 @@
+"""
+离线压测：启动本地替身站点，用 main.run_once 跑 N 个账号，输出单账号耗时 p50/p95、峰值内存与传输字节数。
+
+结果保存为 JSON；指定 --baseline 时与基线比较，任一指标劣化超过 --tolerance 即以退出码 1 结束，
+便于在改动 run_sign_in 前后对比。
+
+    python bench/run_bench.py --accounts 20 --concurrency 2 --latency-ms 50 --save-baseline
+    python bench/run_bench.py --accounts 20 --concurrency 2 --latency-ms 50 --baseline bench/baseline.json
+
+--profile both 用同一批账号先后跑 default 与 lite 两种浏览器配置，并列输出峰值内存与单账号耗时：
+
+    python bench/run_bench.py --accounts 10 --concurrency 2 --profile both
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from standin_server import StandInServer  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# 参与回归比较的指标（数值越大越差）
+COMPARED_METRICS = ("p50_seconds", "p95_seconds", "peak_rss_mb", "bytes_per_account")
+
+
+def percentile(values, fraction: float):
+    """最近秩百分位数；空列表返回 None。"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_config(args, base_url: str, profile: str = "default"):
+    config = main.load_config()
+    config["base_url"] = base_url
+    config["engine"] = args.engine
+    # 压测只关心签到流程本身：关闭通知、运行历史和阶段导出，避免写入正式的 state/ 目录
+    config["webhook"] = {"enabled": False}
+    config["history"] = {"enabled": False}
+    config["metrics"] = {"enabled": False}
+    config["session_cache"] = dict(config.get("session_cache") or {}, enabled=args.session_cache,
+                                   dir=os.path.join(args.work_dir, "sessions"))
+    config["browser"] = dict(config.get("browser") or {}, proxy=None, proxies=[], profile=profile)
+    config["run"] = dict(
+        config.get("run") or {},
+        concurrency=args.concurrency,
+        between_accounts_seconds=0,
+        min_start_interval_seconds=0,
+        max_retries=0,
+        rate_limit={"enabled": False},
+    )
+    return config
+
+
+async def run_bench(args, profile: str = "default"):
+    server = StandInServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, fail_rate=args.fail_rate).start()
+    # API_DAILY_BASE_URL 优先于配置文件，压测期间必须清掉
+    os.environ.pop("API_DAILY_BASE_URL", None)
+    try:
+        config = build_config(args, server.url, profile)
+        accounts = [{"username": f"bench{i:04d}", "password": server.password} for i in range(args.accounts)]
+        started_at = time.monotonic()
+        results = await main.run_once(config, accounts, force=True, spread=False)
+        wall_seconds = time.monotonic() - started_at
+        traffic = server.stats()
+    finally:
+        server.stop()
+
+    elapsed = [r["elapsed_seconds"] for r in results if r.get("elapsed_seconds") is not None]
+    peaks = [r["peak_rss_mb"] for r in results if r.get("peak_rss_mb") is not None]
+    bytes_total = traffic["bytes_sent"] + traffic["bytes_received"]
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "accounts": args.accounts,
+            "engine": args.engine,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "fail_rate": args.fail_rate,
+            "session_cache": args.session_cache,
+            "profile": profile,
+        },
+        "ok": sum(1 for r in results if r.get("ok")),
+        "failed": sum(1 for r in results if not r.get("ok")),
+        "wall_seconds": round(wall_seconds, 2),
+        "p50_seconds": percentile(elapsed, 0.50),
+        "p95_seconds": percentile(elapsed, 0.95),
+        "max_seconds": max(elapsed) if elapsed else None,
+        "peak_rss_mb": max(peaks) if peaks else None,
+        "requests": traffic["requests"],
+        "bytes_transferred": bytes_total,
+        "bytes_per_account": round(bytes_total / max(1, len(results))),
+        "accounts_detail": [
+            {
+                "username": r.get("username"),
+                "ok": bool(r.get("ok")),
+                "engine": r.get("engine"),
+                "elapsed_seconds": r.get("elapsed_seconds"),
+                "peak_rss_mb": r.get("peak_rss_mb"),
+                "phases_ms": r.get("phases") or {},
+            }
+            for r in results
+        ],
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float):
+    """返回劣化超过容差的指标列表 [(指标, 基线值, 当前值)]。"""
+    regressions = []
+    for key in COMPARED_METRICS:
+        old, new = baseline.get(key), report.get(key)
+        if old is None or new is None or old <= 0:
+            continue
+        if new > old * (1 + tolerance):
+            regressions.append((key, old, new))
+    if report.get("failed", 0) > baseline.get("failed", 0):
+        regressions.append(("failed", baseline.get("failed", 0), report.get("failed")))
+    return regressions
+
+
+def print_report(report: dict, baseline=None):
+    print("\n===== 压测结果 =====")
+    print(f"账号: {report['params']['accounts']}（成功 {report['ok']} / 失败 {report['failed']}）"
+          f" 引擎: {report['params']['engine']} 并发: {report['params']['concurrency']}"
+          f" 浏览器配置: {report['params'].get('profile', 'default')}")
+    for key in ("wall_seconds", "p50_seconds", "p95_seconds", "max_seconds", "peak_rss_mb", "requests",
+                "bytes_transferred", "bytes_per_account"):
+        line = f"{key:>18}: {report.get(key)}"
+        if baseline and baseline.get(key) is not None:
+            line += f"（基线 {baseline.get(key)}）"
+        print(line)
+
+
+PROFILE_COMPARED_METRICS = ("wall_seconds", "p50_seconds", "p95_seconds", "max_seconds", "peak_rss_mb", "bytes_per_account")
+
+
+def print_profile_comparison(reports: dict):
+    default, lite = reports["default"], reports["lite"]
+    print("\n===== default vs lite =====")
+    print(f"{'':>18}  {'default':>10}  {'lite':>10}  {'变化':>8}")
+    for key in PROFILE_COMPARED_METRICS:
+        old, new = default.get(key), lite.get(key)
+        change = f"{(new - old) / old * 100:+.0f}%" if old and new is not None else "-"
+        print(f"{key:>18}  {str(old):>10}  {str(new):>10}  {change:>8}")
+    print(f"{'ok/failed':>18}  {default['ok']}/{default['failed']:<8}  {lite['ok']}/{lite['failed']:<8}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Offline benchmark against the local stand-in console")
+    parser.add_argument("--accounts", type=int, default=10, help="Number of accounts to run")
+    parser.add_argument("--engine", choices=("browser", "http", "auto"), default="browser")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--fail-rate", type=float, default=0)
+    parser.add_argument("--session-cache", action="store_true", help="Enable the session cache (cold on first run)")
+    parser.add_argument("--work-dir", default=os.path.join("state", "bench"), help="Scratch directory for the run")
+    parser.add_argument("--output", default=None, help="Where to write this run's JSON (default: <work-dir>/<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write this run as the baseline ({DEFAULT_BASELINE})")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    parser.add_argument("--profile", choices=("default", "lite", "both"), default="default",
+                        help="browser.profile to run; 'both' runs default then lite on the same accounts and compares them")
+    args = parser.parse_args()
+
+    if args.profile == "both":
+        if args.baseline or args.save_baseline:
+            parser.error("--profile both 只做两种配置的对比，不能与 --baseline / --save-baseline 同时使用")
+        if args.engine == "http":
+            parser.error("--profile 只影响浏览器引擎，请使用 --engine browser 或 auto")
+        base_work_dir = args.work_dir
+        reports = {}
+        for profile in ("default", "lite"):
+            # 各自使用独立的工作目录，开启 --session-cache 时两边都从冷缓存开始
+            args.work_dir = os.path.join(base_work_dir, profile)
+            reports[profile] = asyncio.run(run_bench(args, profile))
+            print_report(reports[profile])
+        os.makedirs(base_work_dir, exist_ok=True)
+        output = args.output or os.path.join(
+            base_work_dir, datetime.now().strftime("%Y%m%d_%H%M%S") + "_profiles.json"
+        )
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print_profile_comparison(reports)
+        print(f"\n结果已保存: {output}")
+        return 0
+
+    report = asyncio.run(run_bench(args, args.profile))
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    output = args.output or os.path.join(args.work_dir, datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\n结果已保存: {output}")
+
+    if args.save_baseline:
+        path = args.baseline or DEFAULT_BASELINE
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"已保存为基线: {path}")
+        return 0
+
+    if baseline is not None:
+        if baseline.get("params") != report["params"]:
+            print("注意：本次参数与基线不同，比较结果仅供参考")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("\n发现性能回退：")
+            for key, old, new in regressions:
+                print(f"- {key}: {old} -> {new}")
+            return 1
+        print("\n与基线相比无明显回退。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
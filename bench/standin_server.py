@@ -0,0 +1,438 @@
+"""
+本地替身站点：模拟 gemai（new-api）控制台的登录页、个人中心、充值页及相关接口，供离线压测使用。
+
+复刻了脚本依赖的页面细节：Semi UI 协议复选框、未勾选协议时禁用的登录按钮、系统公告弹窗、
+"每日签到"/"今日已签到" 按钮以及充值页的"账户统计"区块。每个响应可注入固定延迟与随机抖动，
+接口可按比例返回 500 以模拟站点故障。
+
+单独运行：
+    python bench/standin_server.py --port 8765 --latency-ms 50
+然后用 API_DAILY_BASE_URL=http://127.0.0.1:8765 python main.py 指向它。
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import secrets
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PASSWORD = "bench-password"
+
+SITE_STATUS = {
+    "system_name": "Stand-in",
+    "quota_per_unit": 500000,
+    "quota_display_type": "USD",
+    "turnstile_check": False,
+}
+
+_COMMON_HEAD = """<meta charset="utf-8">
+<title>Stand-in Console</title>
+<link rel="stylesheet" href="/static/app.css">
+<style>
+  .semi-modal-mask { position: fixed; inset: 0; background: rgba(0,0,0,.4); }
+  .semi-modal { position: fixed; top: 20%; left: 30%; width: 40%; background: #fff; padding: 16px; }
+  .semi-toast-content { position: fixed; top: 8px; right: 8px; background: #eef; padding: 8px; }
+  .semi-checkbox { display: inline-flex; align-items: center; cursor: pointer; position: relative; }
+  .semi-checkbox input { position: absolute; opacity: 0; width: 16px; height: 16px; margin: 0; }
+  .semi-checkbox-inner { display: inline-block; width: 16px; height: 16px; border: 1px solid #999; }
+  .semi-checkbox.checked .semi-checkbox-inner { background: #36f; }
+</style>"""
+
+_HEADER = """<header><nav>
+  <img src="/static/logo.png" alt="logo" width="32" height="32">
+  <button class="semi-button semi-button-borderless" onclick="location.href='/login'">登录</button>
+</nav></header>"""
+
+# 页面脚本共用：带上 New-Api-User 头请求接口，接口的 JSON 由前端缓存到 localStorage，与 new-api 前端一致
+_API_JS = """<script>
+  function apiHeaders() {
+    const headers = { "Content-Type": "application/json" };
+    try {
+      const user = JSON.parse(localStorage.getItem("user") || "null");
+      if (user && user.id !== undefined) headers["New-Api-User"] = String(user.id);
+    } catch (e) {}
+    return headers;
+  }
+  async function api(method, path, body) {
+    const res = await fetch(path, { method, headers: apiHeaders(), credentials: "include",
+                                    body: body === undefined ? undefined : JSON.stringify(body) });
+    return res.json();
+  }
+  async function loadStatus() {
+    const payload = await api("GET", "/api/status");
+    if (payload.success) localStorage.setItem("status", JSON.stringify(payload.data));
+    return payload.data;
+  }
+  function toast(message) {
+    const el = document.createElement("div");
+    el.className = "semi-toast-content";
+    el.textContent = message;
+    document.body.appendChild(el);
+    setTimeout(() => el.remove(), 3000);
+  }
+</script>"""
+
+LOGIN_PAGE = f"""<!doctype html><html><head>{_COMMON_HEAD}</head><body>
+{_HEADER}
+<main>
+  <form id="login-form">
+    <input name="username" placeholder="用户名">
+    <input name="password" type="password" placeholder="密码">
+    <label class="semi-checkbox" id="agree">
+      <input type="checkbox">
+      <span class="semi-checkbox-inner"></span>
+      <span class="semi-checkbox-addon">我已阅读并同意《服务条款》</span>
+    </label>
+    <button type="submit" class="semi-button semi-button-primary" disabled>登录</button>
+    <div id="login-error"></div>
+  </form>
+</main>
+{_API_JS}
+<script>
+  const form = document.getElementById("login-form");
+  const box = form.querySelector("input[type='checkbox']");
+  const submit = form.querySelector("button[type='submit']");
+  // Semi UI：勾选状态由组件维护，登录按钮在勾选协议前保持禁用
+  box.addEventListener("change", () => {{
+    document.getElementById("agree").classList.toggle("checked", box.checked);
+    submit.disabled = !box.checked;
+  }});
+  loadStatus();
+  form.addEventListener("submit", async (event) => {{
+    event.preventDefault();
+    if (!box.checked) return;
+    const payload = await api("POST", "/api/user/login", {{
+      username: form.username.value, password: form.password.value,
+    }});
+    if (payload.success) {{
+      localStorage.setItem("user", JSON.stringify(payload.data));
+      location.href = "/console";
+    }} else {{
+      document.getElementById("login-error").textContent = payload.message || "登录失败";
+    }}
+  }});
+</script>
+</body></html>"""
+
+CONSOLE_PAGE = f"""<!doctype html><html><head>{_COMMON_HEAD}</head><body>
+{_HEADER}
+<main><h1>控制台</h1><img src="/static/banner.png" alt="banner" width="600" height="120"></main>
+<div class="semi-modal-mask" id="notice-mask"></div>
+<div class="semi-modal" id="notice" role="dialog">
+  <button class="semi-modal-close" aria-label="Close">×</button>
+  <h3>系统公告</h3>
+  <p>这是一个本地替身站点，用于离线压测。</p>
+  <button class="semi-button" id="notice-ok">我知道了</button>
+</div>
+{_API_JS}
+<script>
+  const hide = () => {{
+    document.getElementById("notice").style.display = "none";
+    document.getElementById("notice-mask").style.display = "none";
+  }};
+  document.querySelector(".semi-modal-close").addEventListener("click", hide);
+  document.getElementById("notice-ok").addEventListener("click", hide);
+  api("GET", "/api/user/self");
+</script>
+</body></html>"""
+
+PERSONAL_PAGE = f"""<!doctype html><html><head>{_COMMON_HEAD}</head><body>
+{_HEADER}
+<main><h1>个人中心</h1><div id="checkin-area"></div><div id="profile"></div></main>
+{_API_JS}
+<script>
+  (async () => {{
+    await loadStatus();
+    const self = await api("GET", "/api/user/self");
+    if (!self.success) {{ location.href = "/login"; return; }}
+    document.getElementById("profile").textContent = self.data.username;
+    const button = document.createElement("button");
+    button.className = "semi-button";
+    const render = (checked) => {{
+      button.textContent = checked ? "今日已签到" : "每日签到";
+      button.disabled = checked;
+    }};
+    render(self.data.checked_in_today);
+    button.addEventListener("click", async () => {{
+      const payload = await api("POST", "/api/user/checkin");
+      toast(payload.message || (payload.success ? "签到成功" : "签到失败"));
+      if (payload.success) render(true);
+    }});
+    document.getElementById("checkin-area").appendChild(button);
+  }})();
+</script>
+</body></html>"""
+
+TOPUP_PAGE = f"""<!doctype html><html><head>{_COMMON_HEAD}</head><body>
+{_HEADER}
+<main>
+  <h1>钱包</h1>
+  <div class="semi-card"><div class="semi-card-header">账户统计</div>
+    <div class="stat"><div>当前余额</div><div id="balance">-</div></div>
+    <div class="stat"><div>历史消耗</div><div id="consumption">-</div></div>
+    <div class="stat"><div>请求次数</div><div id="requests">-</div></div>
+  </div>
+</main>
+{_API_JS}
+<script>
+  (async () => {{
+    const status = await loadStatus();
+    const self = await api("GET", "/api/user/self");
+    if (!self.success) {{ location.href = "/login"; return; }}
+    const money = (quota) => "$" + (quota / status.quota_per_unit).toFixed(2);
+    document.getElementById("balance").textContent = money(self.data.quota);
+    document.getElementById("consumption").textContent = money(self.data.used_quota);
+    document.getElementById("requests").textContent = String(self.data.request_count);
+  }})();
+</script>
+</body></html>"""
+
+APP_CSS = """@font-face { font-family: "StandIn"; src: url("/static/font.woff2") format("woff2"); }
+body { font-family: "StandIn", sans-serif; margin: 0; }
+header { display: flex; padding: 8px; border-bottom: 1px solid #eee; }
+main { padding: 16px; }
+"""
+
+# 静态资源的体积与真实站点同一量级，用于衡量资源拦截节省的流量（内容本身无意义）
+STATIC_ASSETS = {
+    "/static/app.css": ("text/css; charset=utf-8", APP_CSS.encode("utf-8")),
+    "/static/logo.png": ("image/png", hashlib.shake_256(b"logo").digest(8 * 1024)),
+    "/static/banner.png": ("image/png", hashlib.shake_256(b"banner").digest(96 * 1024)),
+    "/static/font.woff2": ("font/woff2", hashlib.shake_256(b"font").digest(160 * 1024)),
+}
+
+
+class StandInState:
+    """替身站点的内存状态：会话、每个用户的额度与签到日期，以及流量统计。"""
+
+    def __init__(self, password: str):
+        self.password = password
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.users = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.injected_failures = 0
+
+    def user(self, username: str):
+        with self.lock:
+            if username not in self.users:
+                self.users[username] = {
+                    "id": len(self.users) + 1,
+                    "username": username,
+                    "quota": 5000000,
+                    "used_quota": 1250000,
+                    "request_count": 42,
+                    "checked_in_on": None,
+                }
+            return self.users[username]
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "injected_failures": self.injected_failures,
+                "users": len(self.users),
+            }
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.injected_failures = 0
+
+
+def _make_handler(state: StandInState, latency_ms: float, jitter_ms: float, fail_rate: float, turnstile: bool):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 + Content-Length，保证 HTTP 引擎的长连接复用与真实站点一致
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str, headers=None):
+            delay_ms = latency_ms + (random.uniform(0, jitter_ms) if jitter_ms > 0 else 0)
+            if delay_ms > 0:
+                time.sleep(delay_ms / 1000)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+            with state.lock:
+                state.requests += 1
+                # 响应头按近似值计入
+                state.bytes_sent += len(body) + 200
+
+        def _send_json(self, payload: dict, status: int = 200, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self._send(status, body, "application/json; charset=utf-8", headers)
+
+        def _send_html(self, html: str):
+            self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+
+        def _redirect(self, location: str):
+            self._send(302, b"", "text/plain", {"Location": location})
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length > 0 else b""
+            with state.lock:
+                state.bytes_received += length
+            try:
+                return json.loads(raw or b"{}")
+            except Exception:
+                return {}
+
+        def _session_user(self):
+            cookies = {}
+            for part in (self.headers.get("Cookie") or "").split(";"):
+                if "=" in part:
+                    key, value = part.strip().split("=", 1)
+                    cookies[key] = value
+            username = state.sessions.get(cookies.get("session"))
+            return state.user(username) if username else None
+
+        def _inject_failure(self):
+            if fail_rate > 0 and random.random() < fail_rate:
+                with state.lock:
+                    state.injected_failures += 1
+                self._send_json({"success": False, "message": "服务器内部错误（注入故障）"}, status=500)
+                return True
+            return False
+
+        def do_GET(self):
+            path = urllib.parse.urlsplit(self.path).path
+            if path == "/__bench/stats":
+                return self._send_json(state.snapshot())
+            if path in STATIC_ASSETS:
+                content_type, body = STATIC_ASSETS[path]
+                return self._send(200, body, content_type)
+            if path == "/login":
+                return self._send_html(LOGIN_PAGE)
+            if path in ("/console", "/console/personal", "/console/topup"):
+                if self._session_user() is None:
+                    return self._redirect("/login")
+                pages = {"/console": CONSOLE_PAGE, "/console/personal": PERSONAL_PAGE, "/console/topup": TOPUP_PAGE}
+                return self._send_html(pages[path])
+            if path == "/":
+                return self._redirect("/login")
+            if path.startswith("/api/") and self._inject_failure():
+                return
+            if path == "/api/status":
+                return self._send_json({"success": True, "data": dict(SITE_STATUS, turnstile_check=turnstile)})
+            if path == "/api/user/self":
+                user = self._session_user()
+                if user is None:
+                    return self._send_json({"success": False, "message": "未登录"}, status=401)
+                today = datetime.now().strftime("%Y-%m-%d")
+                data = {k: v for k, v in user.items() if k != "checked_in_on"}
+                data["checked_in_today"] = user["checked_in_on"] == today
+                return self._send_json({"success": True, "data": data})
+            self._send(404, b"not found", "text/plain")
+
+        def do_POST(self):
+            path = urllib.parse.urlsplit(self.path).path
+            payload = self._read_json()
+            if path == "/__bench/reset":
+                state.reset_counters()
+                return self._send_json({"success": True})
+            if path.startswith("/api/") and self._inject_failure():
+                return
+            if path == "/api/user/login":
+                username = str(payload.get("username") or "")
+                if not username or payload.get("password") != state.password:
+                    return self._send_json({"success": False, "message": "用户名或密码错误"})
+                user = state.user(username)
+                token = secrets.token_hex(16)
+                state.sessions[token] = username
+                return self._send_json(
+                    {"success": True, "data": {"id": user["id"], "username": username}},
+                    headers={"Set-Cookie": f"session={token}; Path=/; HttpOnly"},
+                )
+            if path == "/api/user/checkin":
+                user = self._session_user()
+                if user is None:
+                    return self._send_json({"success": False, "message": "未登录"}, status=401)
+                today = datetime.now().strftime("%Y-%m-%d")
+                with state.lock:
+                    if user["checked_in_on"] == today:
+                        return self._send_json({"success": False, "message": "今日已签到"})
+                    user["checked_in_on"] = today
+                    user["quota"] += 250000
+                return self._send_json({"success": True, "message": "签到成功，获得 $0.50"})
+            self._send(404, b"not found", "text/plain")
+
+        do_HEAD = do_GET
+
+    return Handler
+
+
+class StandInServer:
+    """在后台线程中运行替身站点；port=0 时自动选择空闲端口。"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0, jitter_ms: float = 0,
+                 fail_rate: float = 0, turnstile: bool = False, password: str = DEFAULT_PASSWORD):
+        self.state = StandInState(password)
+        handler = _make_handler(self.state, latency_ms, jitter_ms, fail_rate, turnstile)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def password(self):
+        return self.state.password
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        return self.state.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the gemai console")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Fixed delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Extra random delay in [0, jitter] per response")
+    parser.add_argument("--fail-rate", type=float, default=0, help="Fraction of /api/ requests answered with HTTP 500")
+    parser.add_argument("--turnstile", action="store_true", help="Advertise Turnstile in /api/status")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="Password accepted for every username")
+    args = parser.parse_args()
+
+    server = StandInServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.fail_rate, args.turnstile, args.password)
+    print(f"替身站点已启动: {server.url}（任意用户名，密码 {args.password}）")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
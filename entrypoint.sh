@@ -6,6 +6,14 @@
 
 echo "[Entrypoint] Starting api-daily scheduler..."
 
+# SCHEDULER_MODE=daemon: hand scheduling over to a single long-lived Python
+# process (python main.py --daemon). exec keeps it as PID 1 so SIGTERM/SIGHUP
+# from docker stop / docker kill reach it directly.
+if [ "${SCHEDULER_MODE:-shell}" = "daemon" ]; then
+    echo "[Entrypoint] Using in-process daemon scheduler."
+    exec python main.py --daemon
+fi
+
 # First run check
 FIRST_RUN=1
 
@@ -1,29 +1,65 @@
 import asyncio
+import base64
+import collections
+import contextlib
+import gc
+import gzip
+import hashlib
+import heapq
+import http.client
+import http.cookies
+import itertools
 import json
 import os
+import random
 import re
+import shutil
+import signal
+import socket
+import sqlite3
 import sys
-import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
 import urllib.request
 from datetime import datetime, timedelta
 
 # 配置信息
-BASE_URL = "https://api.gemai.cc"
+DEFAULT_BASE_URL = "https://api.gemai.cc"
+BASE_URL = DEFAULT_BASE_URL
 LOGIN_URL = f"{BASE_URL}/login"
 PERSONAL_URL = f"{BASE_URL}/console/personal"
 TOPUP_URL = f"{BASE_URL}/console/topup"
+# 个人中心的签到按钮，可能显示 '每日签到' 或 '今日已签到'
+CHECKIN_SELECTOR = "button:has-text('签到')"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+def set_base_url(base_url: str):
+    """切换目标站点（例如 bench/ 中的本地替身服务器），登录页、个人中心、充值页地址随之更新。"""
+    global BASE_URL, LOGIN_URL, PERSONAL_URL, TOPUP_URL
+    BASE_URL = (base_url or DEFAULT_BASE_URL).rstrip("/")
+    LOGIN_URL = f"{BASE_URL}/login"
+    PERSONAL_URL = f"{BASE_URL}/console/personal"
+    TOPUP_URL = f"{BASE_URL}/console/topup"
+
+def resolve_base_url(config: dict):
+    # 环境变量优先，便于在不改配置文件的情况下指向本地替身服务器
+    return os.getenv("API_DAILY_BASE_URL") or (config or {}).get("base_url") or DEFAULT_BASE_URL
 
 def get_webhook_config(config: dict):
     webhook_cfg = (config or {}).get("webhook", {}) or {}
     enabled = webhook_cfg.get("enabled", True)
     url = webhook_cfg.get("url")
+    dry_run = bool(webhook_cfg.get("dry_run", False))
 
     if os.getenv("WECHAT_WEBHOOK_ENABLED") is not None:
         enabled = os.getenv("WECHAT_WEBHOOK_ENABLED", "1") != "0"
     if os.getenv("WECHAT_WEBHOOK_URL"):
         url = os.getenv("WECHAT_WEBHOOK_URL")
+    if os.getenv("WECHAT_WEBHOOK_DRY_RUN") is not None:
+        dry_run = os.getenv("WECHAT_WEBHOOK_DRY_RUN", "0") == "1"
 
-    dry_run = os.getenv("WECHAT_WEBHOOK_DRY_RUN", "0") == "1"
     return {"enabled": bool(enabled), "url": url, "dry_run": dry_run}
 
 async def send_wechat_webhook(content: str, webhook_config: dict):
@@ -65,7 +101,9 @@ async def send_wechat_webhook(content: str, webhook_config: dict):
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
-def format_final_report(results):
+def format_final_report(results, summary=None, failure_policies=None):
+    # 失败分类的显示名取自本次运行实际生效的策略（含 run.failure_policies 中的覆盖）
+    failure_policies = failure_policies or DEFAULT_FAILURE_POLICIES
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     total = len(results)
     success_count = sum(1 for r in results if r.get("ok"))
@@ -86,6 +124,9 @@ def format_final_report(results):
         ok = bool(r.get("ok"))
         status = "成功" if ok else "失败"
         detail = (r.get("detail") or "-").replace("\r", " ").replace("\n", " ").strip()
+        if not ok and r.get("failure_class"):
+            policy = failure_policies.get(r["failure_class"]) or {}
+            detail = f"[{policy.get('label', r['failure_class'])}] {detail}"
         
         stats = r.get("stats")
         if stats and isinstance(stats, dict) and not stats.get("error"):
@@ -94,18 +135,36 @@ def format_final_report(results):
             req = stats.get("requests", "N/A")
             detail += f" [统计: 余额{b} / 消耗{c} / 请求{req}]"
 
+        elapsed = r.get("elapsed_seconds")
+        if elapsed is not None:
+            peak_rss_mb = r.get("peak_rss_mb")
+            peak_part = f" / 峰值内存{peak_rss_mb}MB" if peak_rss_mb is not None else ""
+            attempts = r.get("attempts") or 1
+            attempt_part = f" / 尝试{attempts}次共{r.get('total_seconds')}s" if attempts > 1 else ""
+            detail += f" [耗时{elapsed}s{peak_part}{attempt_part}]"
+
         lines.append(f"- {status} | {username} | {detail}")
 
+    if summary:
+        lines.append("")
+        lines.append("运行统计:")
+        for key, value in summary.items():
+            lines.append(f"- {key}: {value}")
+
     return "\n".join(lines)
 
 def load_config():
     defaults = {
+        "base_url": DEFAULT_BASE_URL,
+        "engine": "browser",
         "schedule": {
             "enabled": True,
             "run_immediately_on_start": True,
             "mode": "interval",
             "interval_seconds": 86400,
             "time_of_day": "03:30",
+            "spread_minutes": 0,
+            "spread_batch_seconds": 60,
         },
         "browser": {
             "headless": True,
@@ -116,11 +175,72 @@ def load_config():
             "timezone_id": os.getenv("TZ"),
             "debug_network": False,
             "proxy": None,
+            "proxies": [],
+            "proxy_pool": {
+                "max_per_proxy": 2,
+                "failure_threshold": 3,
+                "quarantine_seconds": 600,
+                "probe_timeout_seconds": 5,
+            },
+            "shared": True,
+            "relaunch_after_accounts": 50,
+            "close_timeout_seconds": 15,
+            "reap_orphans": True,
+            "profile": "default",
+            "block_resources": {"enabled": True},
         },
         "run": {
             "between_accounts_seconds": 2,
             "max_retries": 3,
             "retry_delay_seconds": 300,
+            "retry_base_delay_seconds": 30,
+            "deadline_seconds": 0,
+            "concurrency": 1,
+            "min_start_interval_seconds": 3,
+            "account_timeout_seconds": 180,
+            "trace_sample_rate": 0,
+            "trace_slow_seconds": 60,
+            "rate_limit": {
+                "enabled": True,
+                "initial_per_minute": 10,
+                "min_per_minute": 2,
+                "max_per_minute": 20,
+                "increase_per_minute": 1,
+                "decrease_factor": 0.5,
+                "burst": 1,
+            },
+        },
+        "http": {
+            "timeout_seconds": 20,
+            "max_idle_per_host": 8,
+            "checkin_path": "/api/user/checkin",
+        },
+        "history": {
+            "enabled": True,
+            "path": os.path.join("state", "history.sqlite3"),
+            "site_timezone": "Asia/Shanghai",
+            "skip_completed": True,
+            "retention_days": 90,
+        },
+        "metrics": {
+            "enabled": True,
+            "dir": os.path.join("state", "metrics"),
+            "prometheus_textfile": os.path.join("state", "metrics", "api_daily.prom"),
+        },
+        "artifacts": {
+            "dir": "artifacts",
+            "compress": True,
+            "run_budget_mb": 50,
+            "total_budget_mb": 500,
+            "retention_days": 14,
+            "max_files": 2000,
+            "queue_size": 100,
+        },
+        "session_cache": {
+            "enabled": True,
+            "dir": os.path.join("state", "sessions"),
+            "ttl_hours": 72,
+            "max_entries": 1000,
         },
     }
 
@@ -192,7 +312,35 @@ def compute_next_run_at(now: datetime, schedule_cfg: dict):
         interval_seconds = 1
     return now + timedelta(seconds=interval_seconds)
 
-def get_chromium_launch_args():
+# browser.profile="lite"：精简的 Chromium 参数（对内存与耗时的影响未经实测，用 bench --profile both 对比）
+# 后台网络、扩展、组件更新等 Playwright 默认已关闭，这里仍显式列出，不依赖其默认参数的变化；
+# 不覆盖 --disable-features（会替换掉 Playwright 自己的那份列表）
+LITE_JS_HEAP_MB = 128
+LITE_CHROMIUM_ARGS = [
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-extensions",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-breakpad",
+    "--disable-domain-reliability",
+    "--disable-client-side-phishing-detection",
+    "--no-default-browser-check",
+    "--mute-audio",
+    # 不启用 GPU 与软件光栅化进程，headless 截图走软件合成
+    "--disable-gpu",
+    "--disable-software-rasterizer",
+    # 不为跨站 iframe 单独开渲染进程，并限制渲染进程总数
+    "--disable-site-isolation-trials",
+    "--renderer-process-limit=2",
+    # 渲染进程的 V8 老生代堆上限
+    f"--js-flags=--max-old-space-size={LITE_JS_HEAP_MB}",
+]
+# lite 视口：宽度保持 1024，控制台不会切换到选择器不同的移动端布局
+LITE_VIEWPORT = {"width": 1024, "height": 640}
+
+def get_chromium_launch_args(profile: str = "default"):
     args = []
 
     is_linux = os.name == "posix"
@@ -214,8 +362,84 @@ def get_chromium_launch_args():
         if is_docker:
             args.append("--disable-gpu")
 
+    if profile == "lite":
+        args += [arg for arg in LITE_CHROMIUM_ARGS if arg not in args]
     return args
 
+# 失败分类：决定是否重试、退避倍数以及是否需要人工处理
+FAILURE_BAD_CREDENTIALS = "bad_credentials"
+FAILURE_CAPTCHA = "captcha"
+FAILURE_NETWORK = "network"
+FAILURE_SELECTOR_DRIFT = "selector_drift"
+FAILURE_SITE_ERROR = "site_error"
+FAILURE_UNKNOWN = "unknown"
+
+# retry: 是否重试；max_retries: 该类失败最多重试次数（不超过 run.max_retries）；
+# backoff_multiplier: 在指数退避基础上的倍数；escalate: 在通知中标记为需人工处理
+DEFAULT_FAILURE_POLICIES = {
+    FAILURE_BAD_CREDENTIALS: {"label": "账号/密码错误或账号不可用", "retry": False, "escalate": True},
+    FAILURE_CAPTCHA: {"label": "人机验证/风控", "retry": True, "max_retries": 1, "backoff_multiplier": 4, "escalate": True},
+    FAILURE_NETWORK: {"label": "网络/超时", "retry": True, "backoff_multiplier": 0.5},
+    FAILURE_SELECTOR_DRIFT: {"label": "页面结构变化", "retry": True, "max_retries": 1, "escalate": True},
+    FAILURE_SITE_ERROR: {"label": "站点错误", "retry": True, "backoff_multiplier": 2},
+    FAILURE_UNKNOWN: {"label": "未知错误", "retry": True},
+}
+
+_BAD_CREDENTIAL_HINTS = (
+    "账号或密码为空", "密码错误", "用户名或密码", "账号或密码", "用户不存在", "账号不存在",
+    "已被封禁", "已封禁", "已被禁用", "账号禁用", "invalid password", "incorrect password",
+    "invalid username", "banned", "suspended",
+)
+_CAPTCHA_HINTS = ("turnstile", "captcha", "人机", "验证码", "安全验证", "风控", "too many requests", "请求过于频繁")
+_SITE_ERROR_HINTS = (
+    "502 bad gateway", "503 service", "504 gateway", "internal server error", "服务器错误", "服务器内部错误",
+    "系统维护", "维护中", "http 5",
+)
+_NETWORK_HINTS = (
+    "net::err_", "timeout", "timed out", "超时", "connection reset", "connection refused", "name or service not known",
+    "temporary failure in name resolution", "remote end closed",
+)
+
+class SignInError(RuntimeError):
+    """签到流程中的已知失败，附带失败分类。"""
+
+    def __init__(self, message: str, failure_class: str):
+        super().__init__(message)
+        self.failure_class = failure_class
+
+def classify_failure(detail: str = "", url: str = "", exc: BaseException = None, page_text: str = ""):
+    """根据异常类型、页面文本与 URL 推断失败分类；显式标注的 SignInError 优先。"""
+    if isinstance(exc, SignInError):
+        return exc.failure_class
+
+    text = f"{page_text} {detail}".lower()
+    if any(hint in text for hint in _BAD_CREDENTIAL_HINTS):
+        return FAILURE_BAD_CREDENTIALS
+    if any(hint in text for hint in _CAPTCHA_HINTS) or "/challenge" in (url or ""):
+        return FAILURE_CAPTCHA
+    if any(hint in text for hint in _SITE_ERROR_HINTS):
+        return FAILURE_SITE_ERROR
+
+    if exc is not None:
+        if isinstance(exc, (asyncio.TimeoutError, ConnectionError, http.client.HTTPException, OSError)):
+            return FAILURE_NETWORK
+        # Playwright 的 TimeoutError 不继承内置异常，按类名识别
+        if type(exc).__name__ == "TimeoutError":
+            return FAILURE_NETWORK
+    if any(hint in text for hint in _NETWORK_HINTS):
+        return FAILURE_NETWORK
+    return FAILURE_UNKNOWN
+
+def resolve_failure_policies(config: dict):
+    overrides = ((config or {}).get("run", {}) or {}).get("failure_policies") or {}
+    policies = {}
+    for failure_class, policy in DEFAULT_FAILURE_POLICIES.items():
+        merged = dict(policy)
+        if isinstance(overrides.get(failure_class), dict):
+            merged.update(overrides[failure_class])
+        policies[failure_class] = merged
+    return policies
+
 def _safe_filename_part(value: str):
     s = (value or "").strip()
     if not s:
@@ -246,21 +470,17 @@ def _parse_proxy(proxy_cfg):
         return parsed
     return None
 
-async def run_sign_in(account, config: dict):
-    username = account.get("username")
-    password = account.get("password")
-    if not username or not password:
-        return {"ok": False, "username": username, "detail": "账号或密码为空，请检查 accounts.json"}
-    
+def _resolve_browser_options(config: dict):
     browser_cfg = (config or {}).get("browser", {}) or {}
-    headless = browser_cfg.get("headless", True)
-    proxy = _parse_proxy(browser_cfg.get("proxy"))
     launch_timeout_ms = browser_cfg.get("launch_timeout_ms", 60000)
     action_timeout_ms = browser_cfg.get("action_timeout_ms", 30000)
     navigation_timeout_ms = browser_cfg.get("navigation_timeout_ms", 45000)
-    locale = browser_cfg.get("locale", "zh-CN")
-    timezone_id = browser_cfg.get("timezone_id", os.getenv("TZ"))
-    debug_network = bool(browser_cfg.get("debug_network", False))
+    relaunch_after_accounts = browser_cfg.get("relaunch_after_accounts", 50)
+    close_timeout_seconds = browser_cfg.get("close_timeout_seconds", 15)
+    profile = str(browser_cfg.get("profile") or "default").lower()
+    if profile not in ("default", "lite"):
+        print(f"未知的 browser.profile {profile!r}，改用 default")
+        profile = "default"
     try:
         launch_timeout_ms = int(launch_timeout_ms)
     except Exception:
@@ -273,441 +493,4097 @@ async def run_sign_in(account, config: dict):
         navigation_timeout_ms = int(navigation_timeout_ms)
     except Exception:
         navigation_timeout_ms = 45000
+    try:
+        relaunch_after_accounts = int(relaunch_after_accounts)
+        if relaunch_after_accounts < 0: relaunch_after_accounts = 0
+    except Exception:
+        relaunch_after_accounts = 50
+    try:
+        close_timeout_seconds = float(close_timeout_seconds)
+        if close_timeout_seconds <= 0: close_timeout_seconds = 15
+    except Exception:
+        close_timeout_seconds = 15
 
-    from playwright.async_api import async_playwright
+    return {
+        "headless": bool(browser_cfg.get("headless", True)),
+        "profile": profile,
+        "proxy": _parse_proxy(browser_cfg.get("proxy")),
+        "proxies": [p for p in (_parse_proxy(item) for item in (browser_cfg.get("proxies") or [])) if p],
+        "launch_timeout_ms": launch_timeout_ms,
+        "action_timeout_ms": action_timeout_ms,
+        "navigation_timeout_ms": navigation_timeout_ms,
+        "locale": browser_cfg.get("locale", "zh-CN"),
+        "timezone_id": browser_cfg.get("timezone_id", os.getenv("TZ")),
+        "shared": bool(browser_cfg.get("shared", True)),
+        "relaunch_after_accounts": relaunch_after_accounts,
+        "close_timeout_seconds": close_timeout_seconds,
+        "reap_orphans": bool(browser_cfg.get("reap_orphans", True)),
+        "resource_policy": ResourcePolicy.from_config(browser_cfg.get("block_resources")),
+    }
 
-    async with async_playwright() as p:
-        # 启动浏览器
-        # 使用 headless=True 以便在无界面环境下运行
-        browser = await p.chromium.launch(
-            headless=bool(headless),
-            args=get_chromium_launch_args(),
-            timeout=launch_timeout_ms,
-            proxy=proxy,
-        )
-        context_kwargs = {
-            "viewport": {"width": 1280, "height": 800},
-            "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        }
-        if locale:
-            context_kwargs["locale"] = str(locale)
-        if timezone_id:
-            context_kwargs["timezone_id"] = str(timezone_id)
-
-        context = await browser.new_context(**context_kwargs)
-        page = await context.new_page()
-        page.set_default_timeout(action_timeout_ms)
-        page.set_default_navigation_timeout(navigation_timeout_ms)
-        
-        ok = False
-        detail = ""
-        stats = {}
-
-        artifacts_dir = "artifacts"
-        _ensure_dir(artifacts_dir)
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        name_part = _safe_filename_part(username)
-        network_log_path = os.path.join(artifacts_dir, f"{ts}_{name_part}_network.log")
-        network_events = []
-
-        def append_network_event(kind: str, message: str):
-            if not debug_network:
-                return
-            try:
-                now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                network_events.append(f"{now_str} {kind} {message}")
-            except Exception:
-                pass
+def _build_context_kwargs(options: dict):
+    lite = options.get("profile") == "lite"
+    context_kwargs = {
+        "viewport": dict(LITE_VIEWPORT) if lite else {"width": 1280, "height": 800},
+        "user_agent": USER_AGENT,
+    }
+    if lite:
+        # 签到流程不依赖 Service Worker，阻止注册可少占一份脚本上下文与缓存
+        context_kwargs["service_workers"] = "block"
+    if options.get("locale"):
+        context_kwargs["locale"] = str(options["locale"])
+    if options.get("timezone_id"):
+        context_kwargs["timezone_id"] = str(options["timezone_id"])
+    return context_kwargs
 
-        def flush_network_log():
-            if not debug_network:
-                return None
-            try:
-                content = "\n".join(network_events)
-                with open(network_log_path, "w", encoding="utf-8") as f:
-                    f.write(content)
-                return network_log_path
-            except Exception:
-                return None
+def _proc_children_map():
+    """/proc 中的进程树：ppid -> [pid]。"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+            # comm 字段可能包含空格，从最后一个 ")" 之后开始解析
+            ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        except Exception:
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
 
-        if debug_network:
-            page.on("console", lambda msg: append_network_event("console", f"{msg.type} {msg.text}"))
-            page.on("pageerror", lambda exc: append_network_event("pageerror", str(exc)))
-            page.on("requestfailed", lambda req: append_network_event("requestfailed", f"{req.method} {req.url} {req.failure}"))
-            page.on(
-                "response",
-                lambda res: append_network_event(
-                    "response",
-                    f"{res.status} {res.request.method} {res.url}",
-                )
-                if ("/api/" in res.url or "/login" in res.url or "/console" in res.url)
-                else None,
+def _process_tree_rss_bytes(root_pid=None):
+    """当前进程及其全部子进程（Playwright driver / Chromium）的 RSS 之和，仅 Linux 可用。"""
+    root_pid = root_pid or os.getpid()
+    if not os.path.isdir("/proc"):
+        return None
+
+    children = _proc_children_map()
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except Exception:
+            continue
+    return total
+
+# 追加到 Chromium 启动参数中的标记（Chromium 忽略未知开关），值为启动它的本脚本进程 PID，
+# 用于在之后的运行中识别并清理残留的浏览器进程
+CHROMIUM_OWNER_FLAG = "--api-daily-owner="
+
+def _chromium_owned_processes():
+    """带 CHROMIUM_OWNER_FLAG 的 Chromium 主进程：[(pid, owner_pid)]，仅 Linux 可用。"""
+    if not os.path.isdir("/proc"):
+        return []
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                argv = f.read().split(b"\0")
+        except Exception:
+            continue
+        for arg in argv:
+            if arg.startswith(CHROMIUM_OWNER_FLAG.encode("ascii")):
+                try:
+                    found.append((int(entry), int(arg[len(CHROMIUM_OWNER_FLAG):])))
+                except ValueError:
+                    pass
+                break
+    return found
+
+def _pid_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+def _kill_process_group(pid: int):
+    """强制结束 Chromium 主进程所在的进程组（Playwright 以独立进程组启动浏览器，渲染进程等会一并结束）。"""
+    try:
+        pgid = os.getpgid(pid)
+        if hasattr(os, "killpg") and pgid != os.getpgrp():
+            os.killpg(pgid, signal.SIGKILL)
+        else:
+            # 与本进程同组时只结束浏览器主进程，避免误杀自己
+            os.kill(pid, signal.SIGKILL)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+    except Exception as e:
+        print(f"[浏览器] 结束进程 {pid} 失败: {e}")
+        return False
+
+def reap_orphan_chromium(owner_pid: int = None):
+    """
+    清理残留的 Chromium 进程。
+
+    owner_pid 为 None 时清理启动者已经退出的浏览器（之前的运行崩溃或被强制结束后遗留）；
+    指定 owner_pid 时清理该进程启动的全部浏览器（本次运行结束时使用）。返回清理的数量。
+    """
+    reaped = 0
+    for pid, owner in _chromium_owned_processes():
+        if owner_pid is not None:
+            stale = owner == owner_pid
+        else:
+            stale = owner != os.getpid() and not os.path.exists(f"/proc/{owner}")
+        if stale and _kill_process_group(pid):
+            reaped += 1
+    return reaped
+
+# 默认拦截的资源类型：图片/字体/音视频不影响 SPA 的逻辑，却占了大部分流量
+DEFAULT_BLOCKED_RESOURCE_TYPES = ["image", "media", "font"]
+# 默认拦截的统计/广告脚本（正则，匹配完整 URL）
+DEFAULT_DENY_URL_PATTERNS = [
+    r"google-analytics\.com",
+    r"googletagmanager\.com",
+    r"hm\.baidu\.com",
+    r"clarity\.ms",
+    r"doubleclick\.net",
+]
+# 始终放行的 URL（人机验证等），优先级高于所有拦截规则
+DEFAULT_ALLOW_URL_PATTERNS = [
+    r"challenges\.cloudflare\.com",
+    r"turnstile",
+    r"captcha",
+]
+
+class ResourcePolicy:
+    """基于 context.route 的资源拦截策略：allow_patterns > deny_patterns > block_types。"""
+
+    def __init__(self, block_types, allow_patterns, deny_patterns):
+        self.block_types = set(block_types or [])
+        self.allow_patterns = [re.compile(p) for p in allow_patterns or []]
+        self.deny_patterns = [re.compile(p) for p in deny_patterns or []]
+
+    @classmethod
+    def from_config(cls, block_cfg):
+        if block_cfg is None or block_cfg is True:
+            block_cfg = {}
+        if not isinstance(block_cfg, dict) or not block_cfg.get("enabled", True):
+            return None
+        try:
+            return cls(
+                block_cfg.get("block_types", DEFAULT_BLOCKED_RESOURCE_TYPES),
+                block_cfg.get("allow_patterns", DEFAULT_ALLOW_URL_PATTERNS),
+                block_cfg.get("deny_patterns", DEFAULT_DENY_URL_PATTERNS),
             )
+        except re.error as e:
+            print(f"browser.block_resources 配置的正则无效，已关闭资源拦截: {e}")
+            return None
 
-        async def dump_artifacts(tag: str):
-            tag_part = _safe_filename_part(tag)
-            png_path = os.path.join(artifacts_dir, f"{ts}_{name_part}_{tag_part}.png")
-            html_path = os.path.join(artifacts_dir, f"{ts}_{name_part}_{tag_part}.html")
-            try:
-                await page.screenshot(path=png_path, full_page=True)
-            except Exception:
-                pass
+    def allows(self, resource_type: str, url: str):
+        if any(p.search(url) for p in self.allow_patterns):
+            return True
+        if any(p.search(url) for p in self.deny_patterns):
+            return False
+        return resource_type not in self.block_types
+
+async def install_resource_blocking(context, policy: ResourcePolicy):
+    """在 context 上注册拦截路由，返回随请求实时更新的计数字典。"""
+    counters = {"allowed": 0, "blocked": 0, "allowed_bytes": 0, "blocked_by_type": {}}
+
+    async def handle_route(route):
+        request = route.request
+        if policy.allows(request.resource_type, request.url):
+            counters["allowed"] += 1
+            # fallback 让后续注册的路由（如有）继续处理，没有则正常发出请求
+            await route.fallback()
+            return
+        counters["blocked"] += 1
+        by_type = counters["blocked_by_type"]
+        by_type[request.resource_type] = by_type.get(request.resource_type, 0) + 1
+        await route.abort("blockedbyclient")
+
+    def on_response(response):
+        # 以 Content-Length 估算放行流量；分块传输的响应没有该头，不计入
+        try:
+            counters["allowed_bytes"] += int(response.headers.get("content-length") or 0)
+        except Exception:
+            pass
+
+    await context.route("**/*", handle_route)
+    context.on("response", on_response)
+    return counters
+
+class RssSampler:
+    """后台周期采样进程树 RSS，记录峰值。"""
+
+    def __init__(self, interval_seconds: float = 0.5):
+        self.interval_seconds = interval_seconds
+        self.peak_bytes = None
+        self._task = None
+
+    def _sample(self):
+        try:
+            value = _process_tree_rss_bytes()
+        except Exception:
+            value = None
+        if value is not None and (self.peak_bytes is None or value > self.peak_bytes):
+            self.peak_bytes = value
+
+    async def _loop(self):
+        while True:
+            self._sample()
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        self._sample()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
             try:
-                html = await page.content()
-                await asyncio.to_thread(lambda: open(html_path, "w", encoding="utf-8").write(html))
-            except Exception:
+                await self._task
+            except asyncio.CancelledError:
                 pass
-            log_path = flush_network_log()
-            return {"png": png_path, "html": html_path, "log": log_path, "url": getattr(page, "url", "")}
+            self._task = None
+        self._sample()
+        if self.peak_bytes is None:
+            return None
+        return round(self.peak_bytes / (1024 * 1024), 1)
 
+class PhaseTimer:
+    """
+    记录单个账号各阶段的单调时钟耗时（毫秒，同名阶段累加）。
+
+    start() 开始新阶段时自动结束上一个阶段，适合按顺序推进的登录/签到流程；
+    phase() 用于独立计时的代码块（浏览器启动、创建/关闭 context），不影响当前顺序阶段。
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self._current = None
+        self._started_at = 0.0
+
+    def _add(self, name: str, started_at: float):
+        self.phases[name] = self.phases.get(name, 0) + int((time.monotonic() - started_at) * 1000)
+
+    def start(self, name: str):
+        self.stop()
+        self._current = name
+        self._started_at = time.monotonic()
+
+    def stop(self):
+        if self._current is not None:
+            self._add(self._current, self._started_at)
+            self._current = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        started_at = time.monotonic()
         try:
-            print(f"正在尝试登录账号: {username}...")
-            await page.goto(LOGIN_URL)
-            
-            # 等待登录表单加载
-            await page.wait_for_selector("input[name='username']", timeout=10000)
-            
-            # 输入账号密码
-            await page.fill("input[name='username']", username)
-            await page.fill("input[name='password']", password)
-            
-            # 检查并勾选用户协议（如果有）
-            checkbox = page.locator("input[type='checkbox']").first
-            label = page.locator("text=我已阅读并同意").first
-            
-            try:
-                # 策略1: 查找 input[type='checkbox']
-                if await checkbox.count() > 0:
-                    if not await checkbox.is_checked():
-                        print("检测到协议复选框，正在强制勾选...")
-                        await checkbox.check(force=True)
-                        # 补充：尝试触发 click 事件，某些框架可能监听 click 而不是 change
-                        # 针对 Semi UI 等框架，尝试点击 checkbox 的父级容器或视觉元素
-                        try:
-                            if not await checkbox.is_checked():
-                                # 尝试点击 Semi UI 的视觉元素
-                                semi_inner = page.locator(".semi-checkbox-inner").first
-                                if await semi_inner.is_visible():
-                                    await semi_inner.click()
-                                else:
-                                    await checkbox.click(force=True)
-                        except Exception:
-                            pass
-                        await asyncio.sleep(0.5)
-
-                # 策略2: 点击 "我已阅读并同意" 文本
-                # 双重保险：如果策略1没生效（例如自定义组件未绑定 input），点击文本通常能触发 toggle
-                label = page.locator("text=我已阅读并同意").first
-                if await label.is_visible():
-                    # 检查 checkbox 是否已勾选（如果能找到的话）
-                    if await checkbox.count() == 0 or not await checkbox.is_checked():
-                        print("尝试点击协议文本以确保勾选...")
-                        await label.click(force=True)
-                        await asyncio.sleep(0.5)
-            except Exception as e:
-                print(f"勾选协议尝试时忽略错误: {e}")
-
-            async def click_login_button():
-                # 优先寻找表单内的提交按钮，避免点击到 Header 栏的 "登录" 链接
-                candidates = [
-                    # 1. 明确的提交按钮
-                    "button[type='submit']",
-                    # 2. 表单内的按钮
-                    "form button:has-text('登录')",
-                    "form button:has-text('Continue')",
-                    "form button:has-text('继续')",
-                    # 3. 排除 Header/Nav 的按钮
-                    # 使用 :not(header *) 排除 header 内的按钮
-                    "button:not(header *):not(nav *):has-text('登录')",
-                    "button:not(header *):not(nav *):has-text('Continue')",
-                    "button:not(header *):not(nav *):has-text('继续')",
-                    # 4. 原有的一般性策略 (作为最后的兜底，但排除 borderless)
-                    "button:not([class*='borderless']):has-text('登录')",
-                    "button:not([class*='borderless']):has-text('Sign in')",
-                    "button:not([class*='borderless']):has-text('Continue')",
-                    "button:not([class*='borderless']):has-text('继续')",
-                ]
-
-                for selector in candidates:
+            yield
+        finally:
+            self._add(name, started_at)
+
+class BrowserManager:
+    """
+    运行期共享的 Chromium 实例。
+
+    每个账号通过 open_context() 获得独立的 BrowserContext（Cookie/存储互相隔离），
+    浏览器本身只在崩溃或累计服务 relaunch_after_accounts 个账号后才重新启动。
+    """
+
+    def __init__(self, config: dict, relaunch_after_accounts=None):
+        self.options = _resolve_browser_options(config)
+        if relaunch_after_accounts is None:
+            relaunch_after_accounts = self.options["relaunch_after_accounts"]
+        self.relaunch_after_accounts = relaunch_after_accounts
+        self.launch_count = 0
+        self._driver_cm = None
+        self._playwright = None
+        self._browser = None
+        self._served = 0
+        # browser -> 正在使用的 context 数量；被替换下来的浏览器等到计数归零再关闭
+        self._active = {}
+        # browser -> 该浏览器的 Chromium 主进程 PID，优雅关闭超时后按进程组强制结束
+        self._pids = {}
+        self._lock = asyncio.Lock()
+
+    async def _launch(self, phase_timer: PhaseTimer):
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+
+            with phase_timer.phase("driver_start"):
+                self._driver_cm = async_playwright()
+                self._playwright = await self._driver_cm.start()
+
+        options = self.options
+        # 启动浏览器
+        # 使用 headless=True 以便在无界面环境下运行
+        proxy = options["proxy"]
+        if proxy is None and options["proxies"] and sys.platform == "win32":
+            # Windows 上的 Chromium 需要启动时设置一个全局代理，按 context 指定的代理才会生效
+            proxy = {"server": "http://per-context"}
+        known_pids = {pid for pid, owner in _chromium_owned_processes() if owner == os.getpid()}
+        with phase_timer.phase("browser_launch"):
+            browser = await self._playwright.chromium.launch(
+                headless=options["headless"],
+                args=get_chromium_launch_args(options["profile"]) + [f"{CHROMIUM_OWNER_FLAG}{os.getpid()}"],
+                timeout=options["launch_timeout_ms"],
+                proxy=proxy,
+            )
+        self._pids[browser] = [
+            pid for pid, owner in _chromium_owned_processes() if owner == os.getpid() and pid not in known_pids
+        ]
+        self.launch_count += 1
+        self._served = 0
+        self._active[browser] = 0
+        return browser
+
+    async def _close_browser(self, browser):
+        self._active.pop(browser, None)
+        pids = self._pids.pop(browser, [])
+        try:
+            await asyncio.wait_for(browser.close(), self.options["close_timeout_seconds"])
+            return
+        except asyncio.TimeoutError:
+            print(f"[浏览器] 关闭 Chromium 超过 {self.options['close_timeout_seconds']:.0f} 秒，强制结束进程组")
+        except Exception:
+            if not pids:
+                return
+        for pid in pids:
+            _kill_process_group(pid)
+
+    async def _acquire_browser(self, phase_timer: PhaseTimer):
+        async with self._lock:
+            browser = self._browser
+            limit = self.relaunch_after_accounts
+            crashed = browser is not None and not browser.is_connected()
+            exhausted = browser is not None and limit > 0 and self._served >= limit
+            if browser is None or crashed or exhausted:
+                if browser is not None:
+                    if crashed:
+                        print("[浏览器] 检测到 Chromium 已断开，重新启动...")
+                    else:
+                        print(f"[浏览器] 已服务 {self._served} 个账号，重新启动 Chromium...")
+                    if crashed or self._active.get(browser, 0) == 0:
+                        await self._close_browser(browser)
+                browser = await self._launch(phase_timer)
+                self._browser = browser
+            self._served += 1
+            self._active[browser] = self._active.get(browser, 0) + 1
+            return browser
+
+    async def _release_browser(self, browser):
+        async with self._lock:
+            if browser not in self._active:
+                return
+            self._active[browser] -= 1
+            if browser is not self._browser and self._active[browser] <= 0:
+                await self._close_browser(browser)
+
+    @contextlib.asynccontextmanager
+    async def open_context(self, phase_timer: PhaseTimer = None, **context_kwargs):
+        # 共享浏览器只有触发启动的那个账号会记录 driver_start / browser_launch
+        phase_timer = phase_timer or PhaseTimer()
+        browser = await self._acquire_browser(phase_timer)
+        context = None
+        try:
+            with phase_timer.phase("context_create"):
+                context = await browser.new_context(**context_kwargs)
+            yield context
+        finally:
+            with phase_timer.phase("teardown"):
+                if context is not None:
                     try:
-                        # 查找所有匹配的元素
-                        locs = await page.locator(selector).all()
-                        
-                        for loc in locs:
-                            if await loc.is_visible():
-                                # 检查是否被禁用（通常是因为未勾选协议）
-                                if await loc.is_disabled():
-                                    print(f"发现登录按钮 ({selector}) 但被禁用，尝试再次勾选协议...")
-                                    
-                                    # 针对 Semi UI 的再次尝试
-                                    # 先尝试点击 label（通常比较稳妥）
-                                    if await label.is_visible():
-                                        await label.click(force=True)
-                                        await asyncio.sleep(0.5)
-
-                                    if await loc.is_disabled():
-                                        # 如果还不行，尝试点击 Semi UI 的 checkbox 视觉元素
-                                        semi_inner = page.locator(".semi-checkbox-inner").first
-                                        if await semi_inner.is_visible():
-                                            await semi_inner.click(force=True)
-                                            await asyncio.sleep(0.5)
-                                
-                                # 再次检查禁用状态
-                                if await loc.is_disabled():
-                                    print(f"登录按钮 ({selector}) 仍然禁用，尝试下一个...")
-                                    continue
-
-                                print(f"尝试点击登录按钮: {selector}")
-                                await loc.click(timeout=5000)
-                                return {"ok": True, "selector": selector}
+                        await asyncio.wait_for(context.close(), self.options["close_timeout_seconds"])
+                    except asyncio.TimeoutError:
+                        # context 关不掉多半是浏览器已经卡死：不再分配给后续账号，用完后强制关闭
+                        print("[浏览器] 关闭 BrowserContext 超时，该浏览器将被替换")
+                        if self._browser is browser:
+                            self._browser = None
                     except Exception:
-                        continue
-                
-                # 如果上面的都失败了，尝试盲点 Enter
+                        pass
+                await self._release_browser(browser)
+
+    async def close(self):
+        async with self._lock:
+            for browser in list(self._active):
+                await self._close_browser(browser)
+            self._browser = None
+            if self._driver_cm is not None:
                 try:
-                    await page.press("input[name='password']", "Enter")
-                    return {"ok": True, "selector": "press_enter"}
+                    await asyncio.wait_for(
+                        self._driver_cm.__aexit__(None, None, None), self.options["close_timeout_seconds"]
+                    )
                 except Exception:
                     pass
+            self._driver_cm = None
+            self._playwright = None
 
-                return {"ok": False, "selector": None}
+class ProxyEntry:
+    """代理池中的一个出口及其统计。"""
 
-            click_result = await click_login_button()
-            if not click_result.get("ok"):
-                artifacts = await dump_artifacts("login_button_missing")
-                raise RuntimeError(f"未找到可点击的登录按钮（可能页面结构变化/风控/人机验证）。{artifacts}")
-            
-            # 等待不再是登录页（因为登录后可能停留在任意页面）
-            try:
-                await page.wait_for_url(lambda url: "/login" not in url, timeout=20000)
-            except Exception:
-                print(f"等待跳转超时，当前 URL: {page.url}")
-                if "/login" in page.url:
-                    # 尝试获取页面上的错误提示信息
-                    page_text = ""
-                    try:
-                        # 获取 body 文本，限制长度
-                        body_text = await page.evaluate("document.body.innerText")
-                        page_text = (body_text or "").strip()[:500].replace("\n", " ")
-                    except Exception:
-                        pass
-                    
-                    artifacts = await dump_artifacts("login_stuck")
-                    raise RuntimeError(f"登录后停留在登录页，可能登录失败。页面部分内容: [{page_text}] {artifacts}")
-            
-            # 尝试关闭系统公告弹窗
-            try:
-                # 常见的弹窗关闭按钮选择器
-                close_selectors = [
-                    "button[aria-label='Close']",
-                    "button.ant-modal-close",
-                    # Semi UI 弹窗关闭按钮
-                    "button.semi-modal-close",
-                    "button.semi-button[aria-label='关闭']",
-                    # 通用
-                    "button:has-text('我知道了')",
-                    "button:has-text('关闭')", 
-                    ".dialog-close"
-                ]
-                for sel in close_selectors:
-                    # 使用 or_ 组合多个定位器可能会比较慢，这里简单循环检测
-                    # 设置较短的 timeout，避免浪费时间
-                    if await page.locator(sel).first.is_visible(timeout=2000):
-                        print(f"检测到弹窗，尝试关闭 ({sel})...")
-                        await page.locator(sel).first.click()
-                        await asyncio.sleep(0.5)
-            except Exception:
-                pass
-            
-            # 直接前往个人中心（签到功能所在页）
-            print(f"前往个人中心签到页面...")
-            await page.goto(PERSONAL_URL)
+    def __init__(self, proxy: dict):
+        self.proxy = proxy
+        parts = urllib.parse.urlsplit(proxy["server"] if "://" in proxy["server"] else f"http://{proxy['server']}")
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or proxy["server"]
+        self.port = parts.port or (1080 if self.scheme.startswith("socks") else 8080)
+        self.label = f"{self.host}:{self.port}"
+        self.in_use = 0
+        self.successes = 0
+        self.failures = 0
+        self.blocked = 0
+        self.consecutive_failures = 0
+        self.quarantined_until = 0.0
+        self.quarantine_count = 0
+        # 探测延迟与账号耗时均为指数滑动平均
+        self.probe_ms = None
+        self.avg_account_seconds = None
 
-            if "/login" in page.url:
-                artifacts = await dump_artifacts("redirected_to_login")
-                raise RuntimeError(f"访问个人中心被重定向到登录页，疑似未登录成功/被风控。{artifacts}")
-            
-            # 等待签到按钮出现
-            # 按钮可能显示 '每日签到' 或 '今日已签到'
+    @property
+    def success_rate(self):
+        total = self.successes + self.failures + self.blocked
+        return self.successes / total if total else 1.0
+
+    def score(self):
+        # 越小越好：延迟高、成功率低、正在使用的账号多都会降低优先级
+        latency = self.probe_ms if self.probe_ms is not None else 1000
+        return latency * (1 + self.in_use) / max(self.success_rate, 0.1)
+
+class ProxyPool:
+    """
+    browser.proxies 代理池：每个 BrowserContext 分配一个代理出口。
+
+    运行开始前对每个代理做一次轻量探测（TCP 连接，HTTP 代理再发一次 CONNECT），失败的先隔离；
+    之后按 探测延迟 × (1 + 占用数) ÷ 成功率 选择最优出口，单个代理的并发不超过 max_per_proxy。
+    连续 failure_threshold 次网络类失败的代理隔离 quarantine_seconds 秒；全部被隔离时选择最早解除的那个。
+    """
+
+    def __init__(self, proxies, max_per_proxy: int = 2, failure_threshold: int = 3, quarantine_seconds: float = 600,
+                 probe_timeout_seconds: float = 5):
+        self.entries = [ProxyEntry(p) for p in proxies]
+        self.max_per_proxy = max_per_proxy
+        self.failure_threshold = failure_threshold
+        self.quarantine_seconds = quarantine_seconds
+        self.probe_timeout_seconds = probe_timeout_seconds
+        self._cond = asyncio.Condition()
+
+    def _probe(self, entry: ProxyEntry, target_host: str, target_port: int):
+        started_at = time.monotonic()
+        with socket.create_connection((entry.host, entry.port), timeout=self.probe_timeout_seconds) as sock:
+            if entry.scheme == "http":
+                request = f"CONNECT {target_host}:{target_port} HTTP/1.1\r\nHost: {target_host}:{target_port}\r\n"
+                if entry.proxy.get("username"):
+                    token = f"{entry.proxy['username']}:{entry.proxy.get('password', '')}"
+                    request += "Proxy-Authorization: Basic " + base64.b64encode(token.encode("utf-8")).decode("ascii") + "\r\n"
+                sock.sendall((request + "\r\n").encode("ascii"))
+                status_line = sock.recv(1024).split(b"\r\n", 1)[0].decode("latin-1")
+                if " 200" not in status_line:
+                    raise ConnectionError(f"CONNECT 被拒绝: {status_line or '空响应'}")
+        return (time.monotonic() - started_at) * 1000
+
+    async def health_check(self, target_url: str):
+        parts = urllib.parse.urlsplit(target_url)
+        target_host = parts.hostname or ""
+        target_port = parts.port or (443 if parts.scheme == "https" else 80)
+
+        async def check(entry: ProxyEntry):
             try:
-                checkin_selector = "button:has-text('签到')"
-                await page.wait_for_selector(checkin_selector, timeout=10000)
-                checkin_btn = page.locator(checkin_selector).first
-                
-                button_text = await checkin_btn.inner_text()
-                if "已签到" in button_text or await checkin_btn.is_disabled():
-                    print(f"账号 {username}: 今日已签到 (按钮状态: {button_text})")
-                    ok = True
-                    detail = f"今日已签到（按钮：{button_text.strip()}）"
-                else:
-                    await checkin_btn.click()
-                    print(f"账号 {username}: 签到成功！")
-                    # 等待一下结果显示
-                    await page.wait_for_timeout(3000)
-                    ok = True
-                    detail = "已执行签到点击"
+                entry.probe_ms = await asyncio.to_thread(self._probe, entry, target_host, target_port)
             except Exception as e:
-                print(f"账号 {username}: 未能找到签到按钮或执行失败。错误: {str(e)}")
-                ok = False
-                artifacts = await dump_artifacts("checkin_failed")
-                detail = f"未找到签到按钮或执行失败：{str(e)}。{artifacts}"
-            
-            # 获取账户统计信息
-            try:
-                print(f"前往充值页面获取账户统计信息...")
-                await page.goto(TOPUP_URL)
-                # 等待页面加载
-                await page.wait_for_selector("text=账户统计", timeout=15000)
-                await page.wait_for_timeout(3000) # 等待AJAX数据加载完成
+                print(f"[代理池] {entry.label} 探测失败，暂时隔离: {e}")
+                self._quarantine(entry)
 
-                async def get_stat(label):
-                    try:
-                        # 查找包含特定文本的元素
-                        # 使用 exact=True 避免匹配到其他包含该词的文本
-                        el = page.get_by_text(label, exact=True).first
-                        
-                        # 增加重试等待，防止元素虽然渲染了但内容还在加载
-                        for _ in range(3):
-                            if await el.is_visible():
-                                break
-                            await asyncio.sleep(1)
-                            
-                        if not await el.is_visible():
-                            print(f"未找到可见的标签: {label}")
-                            return "N/A"
-
-                        # 尝试向上查找父级容器，直到找到包含数值的层级
-                        # 通常结构是：容器 -> [数值, 标签] 或 容器 -> [子容器(数值), 子容器(标签)]
-                        current = el
-                        for i in range(4): # 增加向上查找层级
-                            parent = current.locator("..")
-                            text = await parent.inner_text()
-                            # 简单的文本处理：按行分割，排除掉标签本身
-                            lines = [line.strip() for line in text.splitlines() if line.strip()]
-                            
-                            # 过滤掉标签文本
-                            values = [l for l in lines if label not in l]
-                            
-                            # 简单的数值检查：如果包含 ¥ 或 数字，更有可能是目标值
-                            for v in values:
-                                if "¥" in v or re.search(r'\d', v):
-                                    return v
-                            
-                            # 如果还没有找到，继续往上
-                            current = parent
-                        
-                        return "N/A"
-                    except Exception as e:
-                        print(f"获取 {label} 失败: {e}")
-                        return "N/A"
-
-                stats["balance"] = await get_stat("当前余额")
-                stats["consumption"] = await get_stat("历史消耗")
-                stats["requests"] = await get_stat("请求次数")
-                print(f"统计获取成功: {stats}")
-            except Exception as e:
-                print(f"获取账户统计失败: {e}")
-                # 不影响整体任务状态，仅记录错误
-                stats["error"] = str(e)
+        await asyncio.gather(*(check(entry) for entry in self.entries))
+        healthy = sum(1 for entry in self.entries if entry.quarantined_until <= time.monotonic())
+        print(f"[代理池] {healthy}/{len(self.entries)} 个代理可用")
 
-            # 由于每个账号都会关闭浏览器并开启新实例，因此无需执行复杂的退出逻辑
-            print(f"账号 {username} 任务处理完毕。")
-            
-        except Exception as e:
-            print(f"账号 {username} 执行过程中出错: {str(e)}")
-            ok = False
-            detail = str(e)
-        finally:
-            flush_network_log()
-            await browser.close()
+    def _quarantine(self, entry: ProxyEntry):
+        entry.quarantined_until = time.monotonic() + self.quarantine_seconds
+        entry.quarantine_count += 1
+        entry.consecutive_failures = 0
+
+    def _pick(self):
+        now = time.monotonic()
+        candidates = [e for e in self.entries if e.in_use < self.max_per_proxy]
+        if not candidates:
+            return None
+        healthy = [e for e in candidates if e.quarantined_until <= now]
+        if healthy:
+            return min(healthy, key=lambda e: e.score())
+        if all(e.quarantined_until > now for e in self.entries):
+            # 全部被隔离：与其让账号无限等待，不如用最早解除隔离的那个
+            return min(candidates, key=lambda e: e.quarantined_until)
+        return None
+
+    async def acquire(self):
+        async with self._cond:
+            while True:
+                entry = self._pick()
+                if entry is not None:
+                    entry.in_use += 1
+                    return entry
+                # 所有可用代理都已达到并发上限；隔离到期也需要重新检查
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
 
-        return {"ok": ok, "username": username, "detail": detail, "stats": stats}
+    async def release(self, entry: ProxyEntry, result=None, elapsed_seconds: float = None):
+        async with self._cond:
+            entry.in_use -= 1
+            if result is not None:
+                failure_class = None if result.get("ok") else result.get("failure_class")
+                if result.get("ok"):
+                    entry.successes += 1
+                    entry.consecutive_failures = 0
+                    if elapsed_seconds is not None:
+                        previous = entry.avg_account_seconds
+                        entry.avg_account_seconds = elapsed_seconds if previous is None else previous * 0.7 + elapsed_seconds * 0.3
+                elif failure_class == FAILURE_CAPTCHA:
+                    # 人机验证/风控多半与出口 IP 有关，计入成功率但不隔离
+                    entry.blocked += 1
+                elif failure_class == FAILURE_NETWORK:
+                    entry.failures += 1
+                    entry.consecutive_failures += 1
+                    if entry.consecutive_failures >= self.failure_threshold:
+                        print(f"[代理池] {entry.label} 连续 {entry.consecutive_failures} 次网络失败，隔离 {self.quarantine_seconds:.0f} 秒")
+                        self._quarantine(entry)
+            self._cond.notify_all()
 
-async def run_once(config: dict):
-    if not os.path.exists("accounts.json"):
-        print("错误: 未找到 accounts.json 配置文件。")
-        return []
-        
-    with open("accounts.json", "r", encoding="utf-8") as f:
+    def summary(self):
+        parts = []
+        for entry in self.entries:
+            probe = f"{entry.probe_ms:.0f}ms" if entry.probe_ms is not None else "不可达"
+            avg = f"{entry.avg_account_seconds:.1f}s" if entry.avg_account_seconds is not None else "-"
+            parts.append(
+                f"{entry.label} 成功 {entry.successes} / 网络失败 {entry.failures} / 风控 {entry.blocked}，"
+                f"探测 {probe}，平均耗时 {avg}，隔离 {entry.quarantine_count} 次"
+            )
+        return "；".join(parts)
+
+def create_proxy_pool(config: dict):
+    browser_cfg = (config or {}).get("browser", {}) or {}
+    proxies = [p for p in (_parse_proxy(item) for item in (browser_cfg.get("proxies") or [])) if p]
+    if not proxies:
+        return None
+    pool_cfg = browser_cfg.get("proxy_pool", {}) or {}
+
+    def number(key, default, cast=float, minimum=0):
         try:
-            accounts = json.load(f)
-        except Exception as e:
-            print(f"错误: 无法解析 accounts.json。请检查格式。{e}")
-            return []
-    
-    print(f"共发现 {len(accounts)} 个账号，准备开始自动签到任务...")
-    
-    run_cfg = (config or {}).get("run", {})
-    between_accounts_seconds = run_cfg.get("between_accounts_seconds", 2)
-    max_retries = run_cfg.get("max_retries", 3)
-    retry_delay_seconds = run_cfg.get("retry_delay_seconds", 300)
+            value = cast(pool_cfg.get(key, default))
+            return value if value >= minimum else default
+        except Exception:
+            return default
 
-    try:
-        between_accounts_seconds = float(between_accounts_seconds)
-    except Exception:
-        between_accounts_seconds = 2
+    return ProxyPool(
+        proxies,
+        max_per_proxy=number("max_per_proxy", 2, int, 1),
+        failure_threshold=number("failure_threshold", 3, int, 1),
+        quarantine_seconds=number("quarantine_seconds", 600),
+        probe_timeout_seconds=number("probe_timeout_seconds", 5, float, 0.1),
+    )
+
+class SessionCache:
+    """
+    按账号持久化 Playwright storage_state，下次运行直接带着登录态访问个人中心。
+
+    文件名为用户名的哈希，目录权限 0700、文件权限 0600；超过 ttl_seconds 的条目视为过期，
+    条目数超过 max_entries 时按最近使用时间淘汰。
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float, max_entries: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        _ensure_dir(directory)
+        try:
+            os.chmod(directory, 0o700)
+        except Exception:
+            pass
+
+    def _path(self, username: str):
+        digest = hashlib.sha256((username or "").encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _is_expired(self, path: str, now: float):
+        try:
+            return now - os.path.getmtime(path) > self.ttl_seconds
+        except OSError:
+            return True
+
+    def lookup(self, username: str):
+        path = self._path(username)
+        now = time.time()
+        if not os.path.exists(path) or self._is_expired(path, now):
+            self.misses += 1
+            self._remove(path)
+            return None
+        try:
+            # atime 记录最近使用时间（用于淘汰），mtime 保留写入时间（用于 TTL）
+            os.utime(path, (now, os.path.getmtime(path)))
+        except OSError:
+            pass
+        return path
+
+    def record_hit(self):
+        self.hits += 1
+
+    def invalidate(self, username: str, stale: bool = False):
+        if stale:
+            self.stale += 1
+            self.misses += 1
+        self._remove(self._path(username))
 
+    def store(self, username: str, state: dict):
+        path = self._path(username)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            if self._is_expired(path, now):
+                self._remove(path)
+                continue
+            try:
+                entries.append((os.path.getatime(path), path))
+            except OSError:
+                continue
+
+        overflow = len(entries) - self.max_entries
+        if overflow > 0:
+            entries.sort()
+            for _, path in entries[:overflow]:
+                self._remove(path)
+
+    def summary(self):
+        return f"命中 {self.hits} / 未命中 {self.misses}（其中失效 {self.stale}）"
+
+def create_session_cache(config: dict):
+    cache_cfg = (config or {}).get("session_cache", {}) or {}
+    if not cache_cfg.get("enabled", True):
+        return None
+
+    ttl_hours = cache_cfg.get("ttl_hours", 72)
+    max_entries = cache_cfg.get("max_entries", 1000)
     try:
-        max_retries = int(max_retries)
-        if max_retries < 0: max_retries = 0
+        ttl_hours = float(ttl_hours)
+        if ttl_hours <= 0: ttl_hours = 72
     except Exception:
-        max_retries = 3
-
+        ttl_hours = 72
     try:
-        retry_delay_seconds = int(retry_delay_seconds)
-        if retry_delay_seconds < 0: retry_delay_seconds = 300
+        max_entries = int(max_entries)
+        if max_entries < 1: max_entries = 1000
     except Exception:
-        retry_delay_seconds = 300
-    
-    final_results = {}
-    pending_accounts = list(accounts)
+        max_entries = 1000
 
-    for attempt in range(max_retries + 1):
-        if not pending_accounts:
-            break
-        
-        if attempt > 0:
-            print(f"\n[重试机制] 等待 {retry_delay_seconds} 秒后开始第 {attempt}/{max_retries} 次重试...")
-            await asyncio.sleep(retry_delay_seconds)
-            print(f"开始第 {attempt} 次重试，剩余 {len(pending_accounts)} 个账号...")
+    directory = cache_cfg.get("dir") or os.path.join("state", "sessions")
+    return SessionCache(directory, ttl_hours * 3600, max_entries)
 
-        next_pending = []
-        for account in pending_accounts:
-            username = account.get("username")
-            # 已经成功的不再跑
-            if final_results.get(username, {}).get("ok"):
-                continue
+class ArtifactWriter:
+    """
+    失败现场（截图 / HTML / 网络日志）的后台写入队列。
 
-            result = await run_sign_in(account, config)
-            
-            # 更新结果（覆盖旧的失败结果，或保留新的成功结果）
-            final_results[username] = result
+    签到流程调用 submit() 后立即返回预定的文件路径，实际的压缩与写盘由后台任务在线程中完成。
+    内容相同（哈希一致）的现场只保存一次；本次运行写入量超过 run_budget_bytes 后不再保存；
+    启动与关闭时按保留天数、文件数和总容量清理最旧的文件。
+    """
 
-            if not result.get("ok"):
-                next_pending.append(account)
-            
-            if between_accounts_seconds > 0:
-                await asyncio.sleep(between_accounts_seconds)
-        
-        pending_accounts = next_pending
-        if not pending_accounts:
-            print("所有账号均执行成功，无需重试。")
-            break
+    def __init__(self, directory: str, compress: bool = True, run_budget_bytes: int = 50 * 1024 * 1024,
+                 total_budget_bytes: int = 500 * 1024 * 1024, retention_days: float = 14, max_files: int = 2000,
+                 queue_size: int = 100):
+        self.directory = directory
+        self.compress = compress
+        self.run_budget_bytes = run_budget_bytes
+        self.total_budget_bytes = total_budget_bytes
+        self.retention_seconds = retention_days * 86400
+        self.max_files = max_files
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._worker = None
+        self._digests = {}
+        self._accepted_bytes = 0
+        self.written = 0
+        self.written_bytes = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.removed = 0
 
-    results = list(final_results.values())
-    
-    report = format_final_report(results)
-    webhook_cfg = get_webhook_config(config)
-    webhook_result = await send_wechat_webhook(report, webhook_cfg)
-    if not webhook_result.get("ok") and not webhook_result.get("disabled"):
-        print(f"Webhook 发送失败: {webhook_result}")
+    def submit(self, name: str, data, compress: bool = None):
+        """登记一个待写入的文件并立即返回其路径；因去重返回已有文件的路径，超出预算或队列已满返回 None。"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        digest = hashlib.sha1(data).digest()
+        if digest in self._digests:
+            self.deduplicated += 1
+            return self._digests[digest]
+        if self._accepted_bytes + len(data) > self.run_budget_bytes:
+            self.dropped += 1
+            return None
 
-    print("\n所有账号签到任务已完成。")
-    return results
+        compress = self.compress if compress is None else compress
+        path = os.path.join(self.directory, name + (".gz" if compress else ""))
+        try:
+            self._queue.put_nowait((path, data, compress))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return None
+        self._digests[digest] = path
+        self._accepted_bytes += len(data)
+        if self._worker is None:
+            self._worker = asyncio.ensure_future(self._run())
+        return path
 
-import argparse
+    async def _run(self):
+        try:
+            await asyncio.to_thread(self._sweep)
+        except Exception as e:
+            # 清理失败不能让写入任务退出，否则队列无人消费，close() 会永远等待
+            print(f"清理现场目录失败（忽略）: {e}")
+        while True:
+            path, data, compress = await self._queue.get()
+            try:
+                await asyncio.to_thread(self._write, path, data, compress)
+            except Exception as e:
+                print(f"写入现场文件失败（忽略）: {path} {e}")
+            finally:
+                self._queue.task_done()
 
-# ... (Previous imports)
+    def _write(self, path: str, data: bytes, compress: bool):
+        _ensure_dir(os.path.dirname(path) or ".")
+        if compress:
+            data = gzip.compress(data, compresslevel=6)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.written += 1
+        self.written_bytes += len(data)
+
+    def _sweep(self):
+        """按保留天数删除过期文件，再按文件数与总容量从最旧的开始删除。"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    except OSError:
+                        # 扫描期间被删除或无权访问的文件直接跳过
+                        continue
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"扫描现场目录失败，跳过本次清理: {self.directory} {e}")
+            return
+        entries.sort()
+        now = time.time()
+        total_bytes = sum(size for _, size, _ in entries)
+        kept = len(entries)
+        for mtime, size, path in entries:
+            expired = self.retention_seconds > 0 and now - mtime > self.retention_seconds
+            if not expired and kept <= self.max_files and total_bytes <= self.total_budget_bytes:
+                break
+            try:
+                os.remove(path)
+                self.removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"删除旧现场文件失败（忽略）: {path} {e}")
+                continue
+            kept -= 1
+            total_bytes -= size
+
+    async def close(self):
+        """等待队列中的文件全部写完，再清理一次目录。"""
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        await asyncio.to_thread(self._sweep)
+
+    def summary(self):
+        return (
+            f"写入 {self.written} 个（{self.written_bytes / 1024 / 1024:.1f}MB），去重 {self.deduplicated}，"
+            f"超出预算/队列丢弃 {self.dropped}，清理旧文件 {self.removed}"
+        )
+
+def create_artifact_writer(config: dict):
+    artifacts_cfg = (config or {}).get("artifacts", {}) or {}
+
+    def number(key, default, cast=float):
+        try:
+            value = cast(artifacts_cfg.get(key, default))
+            return value if value >= 0 else default
+        except Exception:
+            return default
+
+    return ArtifactWriter(
+        artifacts_cfg.get("dir") or "artifacts",
+        compress=bool(artifacts_cfg.get("compress", True)),
+        run_budget_bytes=int(number("run_budget_mb", 50) * 1024 * 1024),
+        total_budget_bytes=int(number("total_budget_mb", 500) * 1024 * 1024),
+        retention_days=number("retention_days", 14),
+        max_files=number("max_files", 2000, int),
+        queue_size=max(1, number("queue_size", 100, int)),
+    )
+
+class NetworkTrace:
+    """
+    网络跟踪：把控制台消息、页面错误、失败请求和已完成请求实时写入按大小轮转的 JSONL 文件。
+
+    每条事件带耗时（毫秒）与大小（字节）；每个页面另保留最近 ring_size 条事件的环形缓冲，
+    失败时随现场一起保存。URL 过滤与采样率用于在生产环境长期开启时控制开销。
+    失败请求、页面错误和控制台 error 不参与采样，始终记录。
+    """
+
+    def __init__(self, path: str, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3, ring_size: int = 200,
+                 sample_rate: float = 1.0, include_patterns=None, exclude_patterns=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.ring_size = ring_size
+        self.sample_rate = sample_rate
+        self.include = [re.compile(p) for p in (include_patterns or [])]
+        self.exclude = [re.compile(p) for p in (exclude_patterns or [])]
+        self.events = 0
+        self._file = None
+
+    def _matches(self, url: str):
+        if self.include and not any(p.search(url) for p in self.include):
+            return False
+        return not any(p.search(url) for p in self.exclude)
+
+    def _sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _write(self, event: dict):
+        try:
+            if self._file is None:
+                _ensure_dir(os.path.dirname(self.path) or ".")
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self.events += 1
+            if self.max_bytes > 0 and self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except Exception:
+            pass
+
+    def attach(self, page, username: str):
+        """开始跟踪 page，返回该页面的环形缓冲（collections.deque）。"""
+        ring = collections.deque(maxlen=self.ring_size)
+
+        def emit(event: dict):
+            event = {"time": datetime.now().isoformat(timespec="milliseconds"), "user": username, **event}
+            ring.append(event)
+            self._write(event)
+
+        def on_console(msg):
+            if msg.type == "error" or self._sampled():
+                text = msg.text
+                emit({"kind": "console", "type": msg.type, "text": text[:2000], "bytes": len(text)})
+
+        def on_page_error(exc):
+            text = str(exc)
+            emit({"kind": "pageerror", "text": text[:2000], "bytes": len(text)})
+
+        def on_request_failed(request):
+            if not self._matches(request.url):
+                return
+            timing = request.timing or {}
+            elapsed = timing.get("responseEnd", -1)
+            emit({
+                "kind": "requestfailed",
+                "method": request.method,
+                "url": request.url,
+                "error": request.failure,
+                "ms": round(elapsed, 1) if elapsed is not None and elapsed >= 0 else None,
+            })
+
+        async def on_request_finished(request):
+            if not self._matches(request.url) or not self._sampled():
+                return
+            try:
+                response = await request.response()
+                sizes = await request.sizes()
+            except Exception:
+                response, sizes = None, {}
+            timing = request.timing or {}
+            elapsed = timing.get("responseEnd", -1)
+            emit({
+                "kind": "response",
+                "method": request.method,
+                "url": request.url,
+                "status": response.status if response is not None else None,
+                "ms": round(elapsed, 1) if elapsed is not None and elapsed >= 0 else None,
+                "bytes": sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0),
+            })
+
+        page.on("console", on_console)
+        page.on("pageerror", on_page_error)
+        page.on("requestfailed", on_request_failed)
+        page.on("requestfinished", on_request_finished)
+        return ring
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+
+def create_network_trace(config: dict):
+    browser_cfg = (config or {}).get("browser", {}) or {}
+    trace_cfg = browser_cfg.get("network_trace") or {}
+    # 未显式配置 enabled 时沿用旧的 debug_network 开关
+    if not trace_cfg.get("enabled", bool(browser_cfg.get("debug_network", False))):
+        return None
+
+    def number(key, default, cast=float):
+        try:
+            value = cast(trace_cfg.get(key, default))
+            return value if value >= 0 else default
+        except Exception:
+            return default
+
+    try:
+        return NetworkTrace(
+            trace_cfg.get("path") or os.path.join("state", "network_trace.jsonl"),
+            max_bytes=int(number("max_file_mb", 5) * 1024 * 1024),
+            backup_count=number("backup_count", 3, int),
+            ring_size=max(1, number("ring_size", 200, int)),
+            sample_rate=min(1.0, number("sample_rate", 1.0)),
+            include_patterns=trace_cfg.get("include_patterns", ["/api/", "/login", "/console"]),
+            exclude_patterns=trace_cfg.get("exclude_patterns", []),
+        )
+    except re.error as e:
+        print(f"network_trace 中的正则无效，已关闭网络跟踪: {e}")
+        return None
+
+# HAR 脱敏：这些请求/响应头的值整体替换
+_HAR_SENSITIVE_HEADERS = {"cookie", "set-cookie", "authorization", "proxy-authorization", "x-api-key", "new-api-user"}
+# 这些 JSON 字段（登录表单、/api/user/self 等响应）的值整体替换
+_HAR_SENSITIVE_KEYS = {"password", "access_token", "token", "session", "username", "email", "display_name"}
+_HAR_SCRUBBED = "[scrubbed]"
+# 回放时不照搬的响应头：正文已解码，长度与编码由 Playwright 重新计算
+_HAR_SKIPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+
+def _scrub_json_text(text: str, secrets):
+    try:
+        data = json.loads(text)
+    except Exception:
+        return _scrub_text(text, secrets)
+
+    def walk(value):
+        if isinstance(value, dict):
+            return {
+                k: (_HAR_SCRUBBED if str(k).lower() in _HAR_SENSITIVE_KEYS and value[k] not in (None, "") else walk(value[k]))
+                for k in value
+            }
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        if isinstance(value, str):
+            return _scrub_text(value, secrets)
+        return value
+
+    return json.dumps(walk(data), ensure_ascii=False)
+
+def _scrub_text(text: str, secrets):
+    for secret in secrets:
+        if secret:
+            text = text.replace(secret, _HAR_SCRUBBED)
+    return text
+
+def scrub_har(har: dict, secrets, identifiers=()):
+    """
+    就地脱敏一份 HAR：Cookie / 认证头、cookies 列表、表单与 JSON 中的密码、token、用户名和邮箱，以及 secrets 原文。
+
+    secrets（密码）在任意位置替换；identifiers（用户名）只在请求、响应头和接口 JSON 中替换——
+    用户名可能很短，在 HTML / JS 正文里整词替换会破坏回放用的页面资源。
+    """
+    secrets = [s for s in secrets if s]
+    identified = secrets + [s for s in identifiers if s]
+    for entry in (har.get("log") or {}).get("entries") or []:
+        for part in (entry.get("request") or {}, entry.get("response") or {}):
+            for header in part.get("headers") or []:
+                if str(header.get("name", "")).lower() in _HAR_SENSITIVE_HEADERS:
+                    header["value"] = _HAR_SCRUBBED
+                else:
+                    header["value"] = _scrub_text(str(header.get("value", "")), identified)
+            if part.get("cookies"):
+                part["cookies"] = []
+        request = entry.get("request") or {}
+        request["url"] = _scrub_text(request.get("url", ""), identified)
+        for param in request.get("queryString") or []:
+            param["value"] = _scrub_text(str(param.get("value", "")), identified)
+        post_data = request.get("postData") or {}
+        if post_data.get("text"):
+            post_data["text"] = _scrub_json_text(post_data["text"], identified)
+        for param in post_data.get("params") or []:
+            if str(param.get("name", "")).lower() in _HAR_SENSITIVE_KEYS:
+                param["value"] = _HAR_SCRUBBED
+        content = (entry.get("response") or {}).get("content") or {}
+        if content.get("text") and content.get("encoding") != "base64":
+            if "json" in str(content.get("mimeType", "")):
+                content["text"] = _scrub_json_text(content["text"], identified)
+            else:
+                content["text"] = _scrub_text(content["text"], secrets)
+    return har
+
+class HarSession:
+    """
+    --record-har / --replay-har：录制每个账号的一次完整签到，或在无网络的情况下按录制结果回放。
+
+    录制：context 以 record_har_path 创建，关闭后把 HAR 脱敏写为 <目录>/<用户名哈希>.har。
+    未脱敏的原始 HAR（含 Cookie 与密码）只写在私有目录 <目录>/.raw/<进程号>/（0700）下，脱敏后立即删除；
+    close() 删除该目录，下次启动时清理已退出进程遗留的原始文件。
+    回放：在 context 上注册路由，全部请求（登录页、个人中心、充值页、/api/* 与静态资源）从 HAR 中按
+    方法 + URL 依次取出响应返回，可注入固定延迟；找不到的请求直接中止，不会访问网络。
+    """
+
+    def __init__(self, mode: str, directory: str, latency_ms: float = 0):
+        self.mode = mode
+        self.directory = directory
+        self.latency_ms = latency_ms
+        self.recorded = 0
+        self.replayed_accounts = 0
+        self.served = 0
+        self.missed = 0
+        self._loaded = {}
+        self._raw_dir = None
+        _ensure_dir(directory)
+        if mode == "record":
+            raw_root = os.path.join(directory, ".raw")
+            _ensure_dir(raw_root)
+            os.chmod(raw_root, 0o700)
+            self._remove_stale_raw(raw_root)
+            self._raw_dir = os.path.join(raw_root, str(os.getpid()))
+            _ensure_dir(self._raw_dir)
+            os.chmod(self._raw_dir, 0o700)
+
+    def _remove_stale_raw(self, raw_root: str):
+        # 旧版本直接写在录制目录下的 *.har.raw，以及已退出进程的私有目录（浏览器崩溃或被强制结束时遗留）
+        for name in os.listdir(self.directory):
+            if name.endswith(".har.raw"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        for name in os.listdir(raw_root):
+            if name.isdigit() and int(name) != os.getpid() and _pid_alive(int(name)):
+                # 并行录制（--processes）的其他进程仍在使用
+                continue
+            print(f"[HAR] 删除遗留的未脱敏录制: {os.path.join(raw_root, name)}")
+            shutil.rmtree(os.path.join(raw_root, name), ignore_errors=True)
+
+    def _path(self, username: str):
+        digest = hashlib.sha256((username or "").encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{digest}.har")
+
+    def _raw_path(self, username: str):
+        return os.path.join(self._raw_dir, os.path.basename(self._path(username)) + ".raw")
+
+    def recording_kwargs(self, username: str):
+        return {"record_har_path": self._raw_path(username), "record_har_content": "embed"}
+
+    async def finish_recording(self, username: str, password: str):
+        raw_path = self._raw_path(username)
+        if not os.path.exists(raw_path):
+            print(f"账号 {username} 未生成 HAR（context 可能未正常关闭）")
+            return None
+
+        def scrub():
+            with open(raw_path, "r", encoding="utf-8") as f:
+                har = json.load(f)
+            scrub_har(har, [password], identifiers=[username])
+            path = self._path(username)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(har, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            os.remove(raw_path)
+            return path, len((har.get("log") or {}).get("entries") or [])
+
+        try:
+            path, count = await asyncio.to_thread(scrub)
+        except Exception as e:
+            print(f"账号 {username} 的 HAR 脱敏失败，已删除原始文件: {e}")
+            try:
+                os.remove(raw_path)
+            except OSError:
+                pass
+            return None
+        self.recorded += 1
+        print(f"账号 {username} 已录制 {count} 个请求: {path}")
+        return path
+
+    def _har_for(self, username: str):
+        path = self._path(username)
+        if not os.path.exists(path):
+            # 回放的账号不一定录制过：使用目录中的第一份录制
+            candidates = sorted(f for f in os.listdir(self.directory) if f.endswith(".har"))
+            if not candidates:
+                return None
+            path = os.path.join(self.directory, candidates[0])
+        if path not in self._loaded:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = (json.load(f).get("log") or {}).get("entries") or []
+            index = {}
+            for entry in entries:
+                request, response = entry.get("request") or {}, entry.get("response") or {}
+                if (response.get("status") or 0) <= 0:
+                    continue
+                method = request.get("method", "GET").upper()
+                parts = urllib.parse.urlsplit(request.get("url", ""))
+                # 先按完整 URL 匹配，再忽略主机（base_url 不同），最后忽略查询串（带时间戳的接口）
+                for key in ((method, request.get("url", "")), (method, parts.path, parts.query), (method, parts.path)):
+                    index.setdefault(key, []).append(response)
+            self._loaded[path] = index
+        return self._loaded[path]
+
+    async def install_replay(self, context, username: str):
+        """在 context 上注册回放路由，返回实时更新的计数 {"served", "missed"}。"""
+        index = self._har_for(username)
+        if index is None:
+            raise RuntimeError(f"{self.directory} 中没有可回放的 HAR")
+        counters = {"served": 0, "missed": 0}
+        # 同一个 URL 多次请求时依次返回录制中的各次响应，用完后重复最后一次
+        cursors = {}
+
+        def match(method: str, url: str):
+            parts = urllib.parse.urlsplit(url)
+            for key in ((method, url), (method, parts.path, parts.query), (method, parts.path)):
+                responses = index.get(key)
+                if responses:
+                    position = cursors.get(key, 0)
+                    cursors[key] = position + 1
+                    return responses[min(position, len(responses) - 1)]
+            return None
+
+        async def handle_route(route):
+            request = route.request
+            response = match(request.method.upper(), request.url)
+            if response is None:
+                counters["missed"] += 1
+                self.missed += 1
+                await route.abort("internetdisconnected")
+                return
+            if self.latency_ms > 0:
+                await asyncio.sleep(self.latency_ms / 1000)
+            content = response.get("content") or {}
+            body = content.get("text") or ""
+            body = base64.b64decode(body) if content.get("encoding") == "base64" else body.encode("utf-8")
+            headers = {
+                h["name"]: h["value"] for h in response.get("headers") or []
+                if str(h.get("name", "")).lower() not in _HAR_SKIPPED_RESPONSE_HEADERS and not str(h.get("name", "")).startswith(":")
+            }
+            counters["served"] += 1
+            self.served += 1
+            await route.fulfill(status=response.get("status") or 200, headers=headers, body=body)
+
+        await context.route("**/*", handle_route)
+        self.replayed_accounts += 1
+        return counters
+
+    def close(self):
+        """删除本进程的原始 HAR 目录（被单账号时限取消、未走到 finish_recording 的账号也会在这里清掉）。"""
+        if self._raw_dir is not None:
+            shutil.rmtree(self._raw_dir, ignore_errors=True)
+
+    def summary(self):
+        if self.mode == "record":
+            return f"录制 {self.recorded} 个账号 -> {self.directory}"
+        return (
+            f"回放 {self.replayed_accounts} 个账号，命中 {self.served} / 未命中 {self.missed} 个请求"
+            + (f"，注入延迟 {self.latency_ms:g} ms" if self.latency_ms else "")
+        )
+
+def create_har_session(config: dict):
+    """config["har"] 由命令行 --record-har / --replay-har 写入，不来自配置文件。"""
+    har_cfg = (config or {}).get("har") or {}
+    if har_cfg.get("mode") not in ("record", "replay") or not har_cfg.get("dir"):
+        return None
+    try:
+        latency_ms = max(0.0, float(har_cfg.get("latency_ms") or 0))
+    except Exception:
+        latency_ms = 0.0
+    return HarSession(har_cfg["mode"], har_cfg["dir"], latency_ms)
+
+def apply_har_mode(config: dict, record_dir: str = None, replay_dir: str = None, latency_ms: float = 0):
+    """
+    按 --record-har / --replay-har 调整配置：只用浏览器引擎、不用会话缓存。
+
+    回放时不发通知（报告只打印到控制台）、不写运行历史、不走代理；阶段耗时 JSONL 写到 <回放目录>/metrics，
+    不写 Prometheus textfile，避免离线数据混进正式的 state/ 与监控。
+    """
+    if not record_dir and not replay_dir:
+        return config
+    config = dict(config or {})
+    config["engine"] = "browser"
+    # 会话缓存会跳过登录页：录制与回放都需要完整的登录流程
+    config["session_cache"] = dict(config.get("session_cache") or {}, enabled=False)
+    if record_dir:
+        config["har"] = {"mode": "record", "dir": record_dir}
+        return config
+    config["har"] = {"mode": "replay", "dir": replay_dir, "latency_ms": latency_ms}
+    config["webhook"] = {"enabled": False}
+    config["history"] = dict(config.get("history") or {}, enabled=False)
+    config["metrics"] = {"enabled": True, "dir": os.path.join(replay_dir, "metrics"), "prometheus_textfile": None}
+    config["browser"] = dict(config.get("browser") or {}, proxy=None, proxies=[])
+    config["run"] = dict(config.get("run") or {}, max_retries=0, rate_limit={"enabled": False})
+    return config
+
+async def run_sign_in(account, config: dict, browser_manager=None, session_cache=None, artifact_writer=None,
+                      network_trace=None, proxy_pool=None, har_session=None):
+    username = account.get("username")
+    password = account.get("password")
+    if not username or not password:
+        return {
+            "ok": False,
+            "username": username,
+            "detail": "账号或密码为空，请检查 accounts.json",
+            "failure_class": FAILURE_BAD_CREDENTIALS,
+            "site_reached": False,
+        }
+
+    started_at = time.monotonic()
+    phase_timer = PhaseTimer()
+    sampler = RssSampler()
+    sampler.start()
+    try:
+        result = await _sign_in_account(
+            username, password, config, browser_manager, session_cache, phase_timer, artifact_writer, network_trace,
+            proxy_pool, har_session,
+        )
+    finally:
+        peak_rss_mb = await sampler.stop()
+
+    result["elapsed_seconds"] = round(time.monotonic() - started_at, 2)
+    result["peak_rss_mb"] = peak_rss_mb
+    result["phases"] = phase_timer.phases
+    return result
+
+def resolve_trace_settings(config: dict):
+    """run.trace_sample_rate / run.trace_slow_seconds：按比例给账号开启 Playwright tracing，只保留慢或失败的。"""
+    run_cfg = (config or {}).get("run", {}) or {}
+    sample_rate = run_cfg.get("trace_sample_rate", 0)
+    slow_seconds = run_cfg.get("trace_slow_seconds", 60)
+    try:
+        sample_rate = min(1.0, max(0.0, float(sample_rate)))
+    except Exception:
+        sample_rate = 0.0
+    try:
+        slow_seconds = float(slow_seconds)
+        if slow_seconds < 0: slow_seconds = 60
+    except Exception:
+        slow_seconds = 60
+    return {"sample_rate": sample_rate, "slow_seconds": slow_seconds}
+
+async def _finish_tracing(context, username, result, elapsed_seconds: float, slow_seconds: float, artifact_writer,
+                          timeout_seconds: float):
+    """结束 tracing：失败（含被取消）或耗时超过 slow_seconds 时把 trace.zip 交给 artifact_writer，否则直接丢弃。"""
+    failed = result is None or not result.get("ok")
+    if not failed and elapsed_seconds < slow_seconds:
+        try:
+            await asyncio.wait_for(context.tracing.stop(), timeout_seconds)
+        except Exception:
+            pass
+        return None
+
+    fd, tmp_path = tempfile.mkstemp(prefix="api-daily-trace-", suffix=".zip")
+    os.close(fd)
+    try:
+        await asyncio.wait_for(context.tracing.stop(path=tmp_path), timeout_seconds)
+        with open(tmp_path, "rb") as f:
+            data = f.read()
+    except Exception as e:
+        print(f"账号 {username} 保存 Playwright 跟踪失败（忽略）: {e}")
+        return None
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+    name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{_safe_filename_part(username)}_trace.zip"
+    # zip 本身已压缩，不再 gzip
+    path = artifact_writer.submit(name, data, compress=False)
+    reason = "失败" if failed else f"耗时 {elapsed_seconds:.0f} 秒"
+    print(f"账号 {username} {reason}，Playwright 跟踪: {path or '超出现场文件预算，未保存'}（用 playwright show-trace 查看）")
+    return path
+
+async def _sign_in_account(username, password, config: dict, browser_manager=None, session_cache=None, phase_timer=None,
+                           artifact_writer=None, network_trace=None, proxy_pool=None, har_session=None):
+    options = _resolve_browser_options(config)
+    context_kwargs = _build_context_kwargs(options)
+    recording = har_session is not None and har_session.mode == "record"
+    replaying = har_session is not None and har_session.mode == "replay"
+    if recording:
+        context_kwargs.update(har_session.recording_kwargs(username))
+    session_path = session_cache.lookup(username) if session_cache is not None else None
+    if session_path:
+        context_kwargs["storage_state"] = session_path
+
+    owns_manager = browser_manager is None
+    if owns_manager:
+        # 未传入共享浏览器时沿用旧路径：本账号单独启动并关闭一次 Chromium
+        browser_manager = BrowserManager(config, relaunch_after_accounts=1)
+    owns_writer = artifact_writer is None
+    if owns_writer:
+        artifact_writer = create_artifact_writer(config)
+    owns_trace = network_trace is None
+    if owns_trace:
+        network_trace = create_network_trace(config)
+    phase_timer = phase_timer or PhaseTimer()
+    trace_settings = resolve_trace_settings(config)
+    traced = False
+    trace_path = None
+
+    proxy_entry = None
+    if proxy_pool is not None:
+        proxy_entry = await proxy_pool.acquire()
+        context_kwargs["proxy"] = proxy_entry.proxy
+        print(f"账号 {username} 使用代理 {proxy_entry.label}")
+    started_at = time.monotonic()
+    result = None
+    # 站点主机返回的 429/5xx 状态码，供自适应限速判断是否被站点推回
+    pushback_statuses = []
+    site_host = urllib.parse.urlsplit(BASE_URL).hostname
+
+    def record_status(response):
+        if _is_pushback_status(response.status) and urllib.parse.urlsplit(response.url).hostname == site_host:
+            pushback_statuses.append(response.status)
+
+    site_reached = False
+    # 当前所处步骤，出错时据此给出准确的失败说明（不把所有异常都算作浏览器启动失败）
+    stage = "launch"
+
+    try:
+        async with browser_manager.open_context(phase_timer=phase_timer, **context_kwargs) as context:
+            context.on("response", record_status)
+            resource_counters = None
+            replay_counters = None
+            if replaying:
+                # 先注册回放路由：资源拦截放行（fallback）的请求再交给它
+                stage = "har_replay"
+                replay_counters = await har_session.install_replay(context, username)
+            if options["resource_policy"] is not None:
+                stage = "resource_blocking"
+                resource_counters = await install_resource_blocking(context, options["resource_policy"])
+            stage = "sign_in"
+            # 未采样的账号只多一次随机数判断
+            if trace_settings["sample_rate"] > 0 and random.random() < trace_settings["sample_rate"]:
+                try:
+                    await context.tracing.start(screenshots=True, snapshots=True)
+                    traced = True
+                except Exception as e:
+                    print(f"账号 {username} 开启 Playwright 跟踪失败（忽略）: {e}")
+            try:
+                site_reached = True
+                result = await _sign_in_with_context(
+                    context, username, password, options,
+                    session_cache=session_cache,
+                    restored_session=bool(session_path),
+                    phase_timer=phase_timer,
+                    artifact_writer=artifact_writer,
+                    network_trace=network_trace,
+                )
+            finally:
+                # 被单账号时限取消时也会走到这里，正是最需要保留跟踪的情况
+                if traced:
+                    trace_path = await _finish_tracing(
+                        context, username, result, time.monotonic() - started_at,
+                        trace_settings["slow_seconds"], artifact_writer, options["close_timeout_seconds"],
+                    )
+            if resource_counters is not None:
+                result["resources"] = resource_counters
+            if replay_counters is not None:
+                result["replay"] = replay_counters
+    except Exception as e:
+        if stage == "launch" and "context_create" in phase_timer.phases:
+            # 浏览器已就绪，失败发生在 new_context（代理配置错误多半出在这里）
+            stage = "context_create"
+        label = {
+            "launch": "启动浏览器失败",
+            "context_create": f"创建浏览器上下文失败（代理 {proxy_entry.label}）" if proxy_entry is not None else "创建浏览器上下文失败",
+            "har_replay": "加载 HAR 回放失败",
+            "resource_blocking": "安装资源拦截失败",
+            "sign_in": "签到流程出错",
+        }[stage]
+        print(f"账号 {username} {label}: {str(e)}")
+        result = {
+            "ok": False,
+            "username": username,
+            "detail": f"{label}：{str(e)}",
+            "stats": {},
+            "failure_class": classify_failure(str(e), exc=e),
+            "site_reached": site_reached,
+        }
+    finally:
+        if proxy_entry is not None:
+            await proxy_pool.release(proxy_entry, result, time.monotonic() - started_at)
+        if owns_manager:
+            with phase_timer.phase("teardown"):
+                await browser_manager.close()
+        if owns_writer:
+            await artifact_writer.close()
+        if owns_trace and network_trace is not None:
+            network_trace.close()
+    if proxy_entry is not None:
+        result["proxy"] = proxy_entry.label
+    if pushback_statuses:
+        result["http_status"] = _pushback_status(pushback_statuses)
+    if traced:
+        result["traced"] = True
+        if trace_path:
+            result["trace"] = trace_path
+    if recording:
+        # HAR 在 context 关闭时才写出
+        har_path = await har_session.finish_recording(username, password)
+        if har_path:
+            result["har"] = har_path
+    return result
+
+# 事件等待的上限（毫秒）：等到信号立即继续，超时则按原流程往下走
+CHECKBOX_WAIT_MS = 2000
+POPUP_CLOSE_WAIT_MS = 2000
+CHECKIN_SIGNAL_WAIT_MS = 5000
+# 签到结果提示（Semi UI Toast / Notification）
+TOAST_SELECTORS = (".semi-toast-content", ".semi-notification-notice", "[role='alert']")
+# 点击前给页面上已有的提示打上该属性，只把点击之后新出现的提示当作确认信号
+TOAST_SEEN_ATTRIBUTE = "data-api-daily-seen"
+STATS_READY_WAIT_MS = 10000
+STAT_LABELS = {"balance": "当前余额", "consumption": "历史消耗", "requests": "请求次数"}
+
+# 协议复选框已勾选（或页面上根本没有复选框）
+_CHECKBOX_CHECKED_JS = """() => {
+    const box = document.querySelector("input[type='checkbox']");
+    return !box || box.checked;
+}"""
+
+# 一次性读取充值页"账户统计"中全部 标签 -> 数值：找到文本恰好为标签的元素，
+# 向上最多 4 层父级，取第一行包含 ¥ 或数字且不含标签本身的文本。
+# requireAll 为 true 时，只有全部标签都取到值才返回结果（供 wait_for_function 轮询），否则返回 false。
+_EXTRACT_STATS_JS = """({ labels, requireAll }) => {
+    const leaves = Array.from(document.querySelectorAll("body *")).filter((e) => e.children.length === 0);
+    const result = {};
+    for (const label of labels) {
+        result[label] = null;
+        const el = leaves.find((e) => e.textContent.trim() === label);
+        let current = el;
+        for (let i = 0; current && i < 4 && current.parentElement; i++) {
+            current = current.parentElement;
+            const values = current.innerText.split("\\n").map((s) => s.trim()).filter((s) => s && !s.includes(label));
+            const value = values.find((s) => s.includes("¥") || /\\d/.test(s));
+            if (value) {
+                result[label] = value;
+                break;
+            }
+        }
+        if (requireAll && result[label] === null) return false;
+    }
+    return result;
+}"""
+
+# 在页面内直接请求 new-api 的用户信息接口（复用页面的 Cookie 与 localStorage 中的用户 ID），
+# 站点展示配置优先取前端缓存在 localStorage 的 status，没有再请求 /api/status
+_FETCH_USER_SELF_JS = """async () => {
+    try {
+        let userId = null;
+        try {
+            const user = JSON.parse(localStorage.getItem("user") || "null");
+            userId = user && user.id !== undefined ? user.id : null;
+        } catch (e) {}
+        const headers = { Accept: "application/json" };
+        if (userId !== null) headers["New-Api-User"] = String(userId);
+        const get = async (path) => {
+            const res = await fetch(path, { headers, credentials: "include" });
+            return res.ok ? res.json() : null;
+        };
+        let status = null;
+        try {
+            status = JSON.parse(localStorage.getItem("status") || "null");
+        } catch (e) {}
+        if (!status) {
+            const payload = await get("/api/status");
+            status = payload && payload.data ? payload.data : null;
+        }
+        const self = await get("/api/user/self");
+        return { status, user: self && self.success ? self.data : null };
+    } catch (e) {
+        return null;
+    }
+}"""
+
+async def _timed_wait(waits: dict, name: str, awaitable):
+    """执行一次有界等待，把实际耗时（毫秒）累加到 waits[name]；超时或出错不抛异常，返回是否等到信号。"""
+    started_at = time.monotonic()
+    try:
+        await awaitable
+        return True
+    except Exception:
+        return False
+    finally:
+        waits[name] = waits.get(name, 0) + int((time.monotonic() - started_at) * 1000)
+
+async def _wait_first_signal(waits: dict, name: str, signals: dict, timeout_ms: int, trigger=None):
+    """
+    同时等待多个信号（名称 -> awaitable），返回最先成功的 (名称, 结果)；全部失败或超时返回 (None, None)。
+
+    trigger 会在所有信号开始监听之后才执行，避免点击后响应来得太快而漏掉。
+    """
+    started_at = time.monotonic()
+    tasks = {asyncio.ensure_future(awaitable): key for key, awaitable in signals.items()}
+    winner, value = None, None
+    try:
+        if trigger is not None:
+            await trigger
+        pending = set(tasks)
+        deadline = started_at + timeout_ms / 1000
+        while pending and winner is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    winner, value = tasks[task], task.result()
+                    break
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        waits[name] = waits.get(name, 0) + int((time.monotonic() - started_at) * 1000)
+    return winner, value
+
+# 登录按钮候选（css, 需包含的文本），按优先级排列
+# 优先寻找表单内的提交按钮，避免点击到 Header 栏的 "登录" 链接
+LOGIN_BUTTON_CANDIDATES = [
+    # 1. 明确的提交按钮
+    ("button[type='submit']", None),
+    # 2. 表单内的按钮
+    ("form button", "登录"),
+    ("form button", "Continue"),
+    ("form button", "继续"),
+    # 3. 排除 Header/Nav 的按钮
+    # 使用 :not(header *) 排除 header 内的按钮
+    ("button:not(header *):not(nav *)", "登录"),
+    ("button:not(header *):not(nav *)", "Continue"),
+    ("button:not(header *):not(nav *)", "继续"),
+    # 4. 原有的一般性策略 (作为最后的兜底，但排除 borderless)
+    ("button:not([class*='borderless'])", "登录"),
+    ("button:not([class*='borderless'])", "Sign in"),
+    ("button:not([class*='borderless'])", "Continue"),
+    ("button:not([class*='borderless'])", "继续"),
+]
+
+# 常见的弹窗关闭按钮
+POPUP_CLOSE_CANDIDATES = [
+    ("button[aria-label='Close']", None),
+    ("button.ant-modal-close", None),
+    # Semi UI 弹窗关闭按钮
+    ("button.semi-modal-close", None),
+    ("button.semi-button[aria-label='关闭']", None),
+    # 通用
+    ("button", "我知道了"),
+    ("button", "关闭"),
+    (".dialog-close", None),
+]
+
+PROBE_MARK_ATTR = "data-api-daily-probe"
+
+# 在页面内按优先级检查全部候选，命中的元素打上标记属性，Python 侧再用属性选择器点击。
+# 文本匹配与 Playwright 的 :has-text 一致：忽略大小写的子串匹配。
+# legacy 为逐个选择器调用 all/is_visible/is_disabled 时需要的往返次数，用于统计节省量。
+_PROBE_SELECTORS_JS = """({ candidates, mark }) => {
+    document.querySelectorAll(`[${mark}]`).forEach((e) => e.removeAttribute(mark));
+    const visible = (el) => {
+        const rect = el.getBoundingClientRect();
+        const style = window.getComputedStyle(el);
+        return rect.width > 0 && rect.height > 0 && style.visibility !== "hidden" && style.display !== "none";
+    };
+    const disabled = (el) => el.disabled || el.getAttribute("aria-disabled") === "true";
+    let firstDisabled = null;
+    let legacy = 0;
+    for (let i = 0; i < candidates.length; i++) {
+        const [css, text] = candidates[i];
+        legacy += 1;
+        let elements = [];
+        try {
+            elements = document.querySelectorAll(css);
+        } catch (e) {
+            continue;
+        }
+        for (const el of elements) {
+            if (text && !(el.innerText || "").toLowerCase().includes(text.toLowerCase())) continue;
+            legacy += 1;
+            if (!visible(el)) continue;
+            legacy += 2;
+            if (disabled(el)) {
+                if (firstDisabled === null) {
+                    firstDisabled = i;
+                    el.setAttribute(mark, "disabled");
+                }
+                continue;
+            }
+            el.setAttribute(mark, "match");
+            return { index: i, disabled: false, legacy };
+        }
+    }
+    return { index: firstDisabled, disabled: firstDisabled !== null, legacy };
+}"""
+
+def _describe_candidate(candidate):
+    css, text = candidate
+    return f"{css}:has-text('{text}')" if text else css
+
+async def probe_selectors(page, candidates, waits: dict, name: str, counters: dict):
+    """
+    一次 page.evaluate 找出第一个可见且可用的候选元素（保持候选顺序即优先级）。
+
+    返回 {"index", "selector", "disabled"}；全部不可见时 index 为 None，只有被禁用的命中时 disabled 为 True。
+    """
+    started_at = time.monotonic()
+    try:
+        probe = await page.evaluate(
+            _PROBE_SELECTORS_JS,
+            {"candidates": [list(c) for c in candidates], "mark": PROBE_MARK_ATTR},
+        )
+    finally:
+        waits[name] = waits.get(name, 0) + int((time.monotonic() - started_at) * 1000)
+
+    counters["round_trips"] = counters.get("round_trips", 0) + 1
+    counters["round_trips_saved"] = counters.get("round_trips_saved", 0) + max(0, int(probe.get("legacy") or 0) - 1)
+    index = probe.get("index")
+    return {
+        "index": index,
+        "selector": _describe_candidate(candidates[index]) if index is not None else None,
+        "disabled": bool(probe.get("disabled")),
+    }
+
+async def _page_text(page, limit: int = 500):
+    try:
+        # 获取 body 文本，限制长度
+        body_text = await page.evaluate("document.body.innerText")
+        return (body_text or "").strip()[:limit].replace("\n", " ")
+    except Exception:
+        return ""
+
+async def _login_with_form(page, username, password, dump_artifacts, waits: dict, probe_counters: dict, phase_timer: PhaseTimer):
+    """走完整的登录页流程：填写表单、勾选协议、点击登录并等待跳转、关闭公告弹窗。"""
+    print(f"正在尝试登录账号: {username}...")
+    phase_timer.start("login_page_load")
+    await page.goto(LOGIN_URL)
+    
+    # 等待登录表单加载
+    await page.wait_for_selector("input[name='username']", timeout=10000)
+    phase_timer.start("login_submit")
+    
+    # 输入账号密码
+    await page.fill("input[name='username']", username)
+    await page.fill("input[name='password']", password)
+    
+    # 检查并勾选用户协议（如果有）
+    checkbox = page.locator("input[type='checkbox']").first
+    label = page.locator("text=我已阅读并同意").first
+    
+    try:
+        # 策略1: 查找 input[type='checkbox']
+        if await checkbox.count() > 0:
+            if not await checkbox.is_checked():
+                print("检测到协议复选框，正在强制勾选...")
+                await checkbox.check(force=True)
+                # 补充：尝试触发 click 事件，某些框架可能监听 click 而不是 change
+                # 针对 Semi UI 等框架，尝试点击 checkbox 的父级容器或视觉元素
+                try:
+                    if not await checkbox.is_checked():
+                        # 尝试点击 Semi UI 的视觉元素
+                        semi_inner = page.locator(".semi-checkbox-inner").first
+                        if await semi_inner.is_visible():
+                            await semi_inner.click()
+                        else:
+                            await checkbox.click(force=True)
+                except Exception:
+                    pass
+                await _timed_wait(waits, "checkbox", page.wait_for_function(_CHECKBOX_CHECKED_JS, timeout=CHECKBOX_WAIT_MS))
+
+        # 策略2: 点击 "我已阅读并同意" 文本
+        # 双重保险：如果策略1没生效（例如自定义组件未绑定 input），点击文本通常能触发 toggle
+        label = page.locator("text=我已阅读并同意").first
+        if await label.is_visible():
+            # 检查 checkbox 是否已勾选（如果能找到的话）
+            if await checkbox.count() == 0 or not await checkbox.is_checked():
+                print("尝试点击协议文本以确保勾选...")
+                await label.click(force=True)
+                await _timed_wait(waits, "checkbox", page.wait_for_function(_CHECKBOX_CHECKED_JS, timeout=CHECKBOX_WAIT_MS))
+    except Exception as e:
+        print(f"勾选协议尝试时忽略错误: {e}")
+
+    async def click_login_button():
+        # 一次 evaluate 按优先级找出第一个可见的登录按钮，代替逐个选择器的 all/is_visible/is_disabled 往返
+        try:
+            probe = await probe_selectors(page, LOGIN_BUTTON_CANDIDATES, waits, "login_button_probe", probe_counters)
+            if probe["index"] is not None and probe["disabled"]:
+                selector = probe["selector"]
+                print(f"发现登录按钮 ({selector}) 但被禁用，尝试再次勾选协议...")
+                button = page.locator(f"[{PROBE_MARK_ATTR}='disabled']").first
+                button_handle = await button.element_handle()
+
+                # 针对 Semi UI 的再次尝试
+                # 先尝试点击 label（通常比较稳妥）
+                if await label.is_visible():
+                    await label.click(force=True)
+                    await _timed_wait(waits, "login_button_enabled", page.wait_for_function(
+                        "el => !el.disabled", arg=button_handle, timeout=CHECKBOX_WAIT_MS
+                    ))
+
+                if await button.is_disabled():
+                    # 如果还不行，尝试点击 Semi UI 的 checkbox 视觉元素
+                    semi_inner = page.locator(".semi-checkbox-inner").first
+                    if await semi_inner.is_visible():
+                        await semi_inner.click(force=True)
+                        await _timed_wait(waits, "login_button_enabled", page.wait_for_function(
+                            "el => !el.disabled", arg=button_handle, timeout=CHECKBOX_WAIT_MS
+                        ))
+
+                # 再次探测：可能已解除禁用，也可能有其他可用的候选按钮
+                probe = await probe_selectors(page, LOGIN_BUTTON_CANDIDATES, waits, "login_button_probe", probe_counters)
+                if probe["disabled"]:
+                    print(f"登录按钮 ({selector}) 仍然禁用")
+
+            if probe["index"] is not None and not probe["disabled"]:
+                selector = probe["selector"]
+                print(f"尝试点击登录按钮: {selector}")
+                await page.locator(f"[{PROBE_MARK_ATTR}='match']").first.click(timeout=5000)
+                return {"ok": True, "selector": selector}
+        except Exception:
+            pass
+
+        # 如果上面的都失败了，尝试盲点 Enter
+        try:
+            await page.press("input[name='password']", "Enter")
+            return {"ok": True, "selector": "press_enter"}
+        except Exception:
+            pass
+
+        return {"ok": False, "selector": None}
+
+    click_result = await click_login_button()
+    if not click_result.get("ok"):
+        page_text = await _page_text(page)
+        failure_class = classify_failure(url=page.url, page_text=page_text)
+        if failure_class not in (FAILURE_CAPTCHA, FAILURE_SITE_ERROR):
+            failure_class = FAILURE_SELECTOR_DRIFT
+        artifacts = await dump_artifacts("login_button_missing")
+        raise SignInError(f"未找到可点击的登录按钮（可能页面结构变化/风控/人机验证）。{artifacts}", failure_class)
+    
+    # 等待不再是登录页（因为登录后可能停留在任意页面）
+    try:
+        await page.wait_for_url(lambda url: "/login" not in url, timeout=20000)
+    except Exception:
+        print(f"等待跳转超时，当前 URL: {page.url}")
+        if "/login" in page.url:
+            # 尝试获取页面上的错误提示信息
+            page_text = await _page_text(page)
+            # 页面上没有明确提示时，停留在登录页多半是风控拦截
+            failure_class = classify_failure(url=page.url, page_text=page_text)
+            if failure_class in (FAILURE_UNKNOWN, FAILURE_NETWORK):
+                failure_class = FAILURE_CAPTCHA
+            artifacts = await dump_artifacts("login_stuck")
+            raise SignInError(
+                f"登录后停留在登录页，可能登录失败。页面部分内容: [{page_text}] {artifacts}", failure_class
+            )
+    
+    # 尝试关闭系统公告弹窗
+    phase_timer.start("popup_dismiss")
+    try:
+        # 每轮一次 evaluate 找出第一个可见的关闭按钮；关闭后再探测一轮，处理叠加的多个弹窗
+        for _ in range(3):
+            probe = await probe_selectors(page, POPUP_CLOSE_CANDIDATES, waits, "popup_probe", probe_counters)
+            if probe["index"] is None or probe["disabled"]:
+                break
+            print(f"检测到弹窗，尝试关闭 ({probe['selector']})...")
+            close_button = page.locator(f"[{PROBE_MARK_ATTR}='match']").first
+            await close_button.click()
+            await _timed_wait(waits, "popup_closed", close_button.wait_for(
+                state="hidden", timeout=POPUP_CLOSE_WAIT_MS
+            ))
+    except Exception:
+        pass
+
+def _capture_user_api(page):
+    """
+    监听页面自身发出的 /api/user/self 与 /api/status 请求，保存其 JSON。
+
+    个人中心/充值页加载时前端都会请求用户信息，直接复用即可省去 DOM 解析。
+    """
+    captured = {"user": None, "status": None}
+
+    async def on_response(response):
+        url = response.url
+        if "/api/user/self" not in url and "/api/status" not in url:
+            return
+        try:
+            payload = await response.json()
+        except Exception:
+            return
+        if not isinstance(payload, dict) or not payload.get("success") or not isinstance(payload.get("data"), dict):
+            return
+        if "/api/user/self" in url:
+            captured["user"] = payload["data"]
+        else:
+            captured["status"] = payload["data"]
+
+    page.on("response", on_response)
+    return captured
+
+async def _collect_stats(page, api_capture: dict, waits: dict):
+    """
+    按开销从低到高获取账户统计：
+    1. 页面加载时已捕获的 /api/user/self 响应；
+    2. 在当前页面内 fetch 一次 /api/user/self；
+    3. 前往充值页，用一次 evaluate 读取"账户统计"中的全部标签。
+    """
+    if api_capture.get("user") and api_capture.get("status"):
+        return _stats_from_user_payload(api_capture["user"], api_capture["status"], source="api_capture")
+
+    started_at = time.monotonic()
+    try:
+        fetched = await page.evaluate(_FETCH_USER_SELF_JS)
+    except Exception:
+        fetched = None
+    finally:
+        waits["stats_fetch"] = waits.get("stats_fetch", 0) + int((time.monotonic() - started_at) * 1000)
+    if fetched and fetched.get("user"):
+        site_status = fetched.get("status") or api_capture.get("status") or {}
+        return _stats_from_user_payload(fetched["user"], site_status, source="api_fetch")
+
+    print("前往充值页面获取账户统计信息...")
+    api_capture["user"] = None
+    await page.goto(TOPUP_URL)
+    # 等待页面加载
+    await page.wait_for_selector("text=账户统计", timeout=15000)
+    if api_capture.get("user") and api_capture.get("status"):
+        return _stats_from_user_payload(api_capture["user"], api_capture["status"], source="api_capture")
+
+    # 等待 AJAX 数据填充：全部标签附近都出现数值时直接返回读取结果
+    labels = list(STAT_LABELS.values())
+    values = None
+    started_at = time.monotonic()
+    try:
+        handle = await page.wait_for_function(
+            _EXTRACT_STATS_JS, arg={"labels": labels, "requireAll": True}, polling=200, timeout=STATS_READY_WAIT_MS
+        )
+        values = await handle.json_value()
+    except Exception:
+        pass
+    finally:
+        waits["stats_ready"] = waits.get("stats_ready", 0) + int((time.monotonic() - started_at) * 1000)
+    if not values:
+        # 超时后读取已有的部分数据，缺失的标签记为 N/A
+        values = await page.evaluate(_EXTRACT_STATS_JS, {"labels": labels, "requireAll": False})
+    return _stats_from_labels(values)
+
+async def _sign_in_with_context(context, username, password, options: dict, session_cache=None, restored_session=False,
+                                phase_timer=None, artifact_writer=None, network_trace=None):
+    phase_timer = phase_timer or PhaseTimer()
+    page = await context.new_page()
+    page.set_default_timeout(options["action_timeout_ms"])
+    page.set_default_navigation_timeout(options["navigation_timeout_ms"])
+    api_capture = _capture_user_api(page)
+    
+    ok = False
+    detail = ""
+    failure_class = None
+    stats = {}
+    # 各个事件等待实际花费的毫秒数
+    waits = {}
+    # DOM 探测的往返次数，以及相对逐个选择器检查节省的次数
+    probe_counters = {"round_trips": 0, "round_trips_saved": 0}
+
+    # 未传入 writer 时自行创建，并在结束时关闭（等待后台队列写完）
+    owns_writer = artifact_writer is None
+    if owns_writer:
+        artifact_writer = ArtifactWriter("artifacts")
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    name_part = _safe_filename_part(username)
+    # 最近的网络事件（环形缓冲），失败时随现场保存；完整记录已实时写入 network_trace 文件
+    network_ring = network_trace.attach(page, username) if network_trace is not None else None
+
+    def dump_network_tail(tag_part: str):
+        if not network_ring:
+            return None
+        content = "\n".join(json.dumps(event, ensure_ascii=False) for event in network_ring)
+        return artifact_writer.submit(f"{ts}_{name_part}_{tag_part}_network.jsonl", content)
+
+    async def dump_artifacts(tag: str):
+        # 只在签到流程中抓取截图与 HTML（两者并行），压缩与写盘交给后台队列
+        tag_part = _safe_filename_part(tag)
+        screenshot, html = await asyncio.gather(
+            # lite 只截可视区域：整页截图需要把页面完整渲染成一张大位图
+            page.screenshot(full_page=options.get("profile") != "lite"), page.content(), return_exceptions=True
+        )
+        png_path = html_path = None
+        if isinstance(screenshot, bytes):
+            # PNG 本身已压缩，不再 gzip
+            png_path = artifact_writer.submit(f"{ts}_{name_part}_{tag_part}.png", screenshot, compress=False)
+        if isinstance(html, str):
+            html_path = artifact_writer.submit(f"{ts}_{name_part}_{tag_part}.html", html)
+        log_path = dump_network_tail(tag_part)
+        return {"png": png_path, "html": html_path, "log": log_path, "url": getattr(page, "url", "")}
+
+    try:
+        logged_in = False
+        if restored_session:
+            # 会话缓存命中：直接打开个人中心，仅在被重定向回登录页时才走完整登录流程
+            print(f"使用缓存会话直接访问个人中心: {username}...")
+            phase_timer.start("personal_page_load")
+            await page.goto(PERSONAL_URL)
+            try:
+                await page.wait_for_selector(f"{CHECKIN_SELECTOR}, input[name='username']", timeout=10000)
+            except Exception:
+                pass
+            if "/login" in page.url or await page.locator("input[name='username']").count() > 0:
+                print("缓存会话已失效，改为完整登录...")
+                session_cache.invalidate(username, stale=True)
+            else:
+                session_cache.record_hit()
+                logged_in = True
+
+        if not logged_in:
+            await _login_with_form(page, username, password, dump_artifacts, waits, probe_counters, phase_timer)
+
+            # 直接前往个人中心（签到功能所在页）
+            print("前往个人中心签到页面...")
+            phase_timer.start("personal_page_load")
+            await page.goto(PERSONAL_URL)
+
+            if "/login" in page.url:
+                artifacts = await dump_artifacts("redirected_to_login")
+                raise SignInError(f"访问个人中心被重定向到登录页，疑似未登录成功/被风控。{artifacts}", FAILURE_CAPTCHA)
+
+            if session_cache is not None:
+                try:
+                    session_cache.store(username, await context.storage_state())
+                except Exception as e:
+                    print(f"保存会话缓存失败（忽略）: {e}")
+        
+        # 等待签到按钮出现
+        # 按钮可能显示 '每日签到' 或 '今日已签到'
+        phase_timer.start("checkin")
+        try:
+            await page.wait_for_selector(CHECKIN_SELECTOR, timeout=10000)
+            checkin_btn = page.locator(CHECKIN_SELECTOR).first
+            
+            button_text = await checkin_btn.inner_text()
+            if "已签到" in button_text or await checkin_btn.is_disabled():
+                print(f"账号 {username}: 今日已签到 (按钮状态: {button_text})")
+                ok = True
+                detail = f"今日已签到（按钮：{button_text.strip()}）"
+            else:
+                # 签到会改变余额，丢弃签到前捕获的用户信息，只使用之后的响应
+                api_capture["user"] = None
+                # 登录时留下的 Toast / 公告可能还在页面上，wait_for_selector 会立即命中它们
+                await page.evaluate(
+                    "([selector, attr]) => document.querySelectorAll(selector).forEach((e) => e.setAttribute(attr, '1'))",
+                    [", ".join(TOAST_SELECTORS), TOAST_SEEN_ATTRIBUTE],
+                )
+                # 点击后等待任一确认信号：签到接口响应、Toast 提示、按钮变为"已签到"
+                signal, value = await _wait_first_signal(
+                    waits,
+                    "checkin_confirm",
+                    {
+                        "api": page.wait_for_event(
+                            "response",
+                            predicate=lambda r: "checkin" in r.url and r.request.method == "POST",
+                            timeout=CHECKIN_SIGNAL_WAIT_MS,
+                        ),
+                        "toast": page.wait_for_selector(
+                            ", ".join(f"{selector}:not([{TOAST_SEEN_ATTRIBUTE}])" for selector in TOAST_SELECTORS),
+                            timeout=CHECKIN_SIGNAL_WAIT_MS,
+                        ),
+                        "button": page.wait_for_function(
+                            "() => Array.from(document.querySelectorAll('button')).some((b) => b.innerText.includes('已签到'))",
+                            timeout=CHECKIN_SIGNAL_WAIT_MS,
+                        ),
+                    },
+                    CHECKIN_SIGNAL_WAIT_MS,
+                    trigger=checkin_btn.click(),
+                )
+                print(f"账号 {username}: 签到成功！")
+                ok = True
+                detail = "已执行签到点击"
+                if signal == "api":
+                    try:
+                        message = (await value.json()).get("message")
+                    except Exception:
+                        message = None
+                    detail += f"（接口：{message}）" if message else "（已收到接口响应）"
+                elif signal:
+                    detail += f"（确认信号：{signal}）"
+                else:
+                    detail += "（未等到确认信号）"
+        except Exception as e:
+            print(f"账号 {username}: 未能找到签到按钮或执行失败。错误: {str(e)}")
+            ok = False
+            page_text = await _page_text(page)
+            failure_class = classify_failure(url=page.url, page_text=page_text)
+            if failure_class == FAILURE_UNKNOWN:
+                # 已经进入个人中心却找不到签到按钮，通常是页面结构变化
+                failure_class = FAILURE_SELECTOR_DRIFT
+            artifacts = await dump_artifacts("checkin_failed")
+            detail = f"未找到签到按钮或执行失败：{str(e)}。{artifacts}"
+        
+        # 获取账户统计信息
+        phase_timer.start("stats")
+        try:
+            stats = await _collect_stats(page, api_capture, waits)
+            print(f"统计获取成功: {stats}")
+        except Exception as e:
+            print(f"获取账户统计失败: {e}")
+            # 不影响整体任务状态，仅记录错误
+            stats["error"] = str(e)
+
+        # 每个账号使用独立的 BrowserContext，关闭 context 即可清理登录状态，无需执行退出逻辑
+        print(f"账号 {username} 任务处理完毕。")
+        
+    except Exception as e:
+        print(f"账号 {username} 执行过程中出错: {str(e)}")
+        ok = False
+        detail = str(e)
+        failure_class = classify_failure(detail, url=getattr(page, "url", ""), exc=e)
+    finally:
+        phase_timer.stop()
+        if owns_writer:
+            await artifact_writer.close()
+
+    return {
+        "ok": ok,
+        "username": username,
+        "detail": detail,
+        "failure_class": None if ok else failure_class,
+        "stats": stats,
+        "waits": waits,
+        "probes": probe_counters,
+    }
+
+def _is_pushback_status(status: int):
+    """429 与 5xx 表示站点在限流或过载。"""
+    return status == 429 or status >= 500
+
+def _pushback_status(statuses):
+    """从记录到的 429/5xx 中挑一个代表：有 429 时取 429，否则取最大的 5xx。"""
+    if not statuses:
+        return None
+    return 429 if 429 in statuses else max(statuses)
+
+class HttpEngineFallback(Exception):
+    """HTTP 引擎无法处理该账号（人机验证 / 非预期响应），需要改用浏览器流程。"""
+
+def _format_quota(quota, site_status: dict):
+    """按站点 /api/status 的展示配置把 new-api 的 quota 换算为页面上显示的字符串，返回 (显示值, 数值)。"""
+    site_status = site_status or {}
+    try:
+        quota = float(quota)
+    except Exception:
+        return "N/A", None
+
+    display_type = site_status.get("quota_display_type")
+    if display_type is None:
+        display_type = "USD" if site_status.get("display_in_currency", True) else "TOKENS"
+    if display_type == "TOKENS":
+        return f"{int(quota)}", quota
+
+    try:
+        quota_per_unit = float(site_status.get("quota_per_unit") or 500000)
+    except Exception:
+        quota_per_unit = 500000
+    amount = quota / quota_per_unit
+    if display_type == "CNY":
+        try:
+            amount *= float(site_status.get("usd_exchange_rate") or 1)
+        except Exception:
+            pass
+        return f"¥{amount:.2f}", round(amount, 2)
+    return f"${amount:.2f}", round(amount, 2)
+
+def _parse_stat_number(text):
+    """从页面显示的统计文本（如 "¥1,234.56"、"2.5万"、"1.2K"）中解析出数值，解析失败返回 None。"""
+    if not text:
+        return None
+    match = re.search(r"(-?\d[\d,]*(?:\.\d+)?)\s*([kKmM万亿]?)", str(text))
+    if not match:
+        return None
+    value = float(match.group(1).replace(",", ""))
+    value *= {"k": 1e3, "K": 1e3, "m": 1e6, "M": 1e6, "万": 1e4, "亿": 1e8}.get(match.group(2), 1)
+    return int(value) if value.is_integer() else value
+
+def _stats_from_user_payload(user: dict, site_status: dict, source: str):
+    balance, balance_value = _format_quota(user.get("quota"), site_status)
+    consumption, consumption_value = _format_quota(user.get("used_quota"), site_status)
+    request_count = user.get("request_count")
+    return {
+        "balance": balance,
+        "consumption": consumption,
+        "requests": str(request_count) if request_count is not None else "N/A",
+        "balance_value": balance_value,
+        "consumption_value": consumption_value,
+        "requests_value": _parse_stat_number(request_count),
+        "source": source,
+    }
+
+def _stats_from_labels(values: dict, source: str = "topup_page"):
+    stats = {}
+    for key, label in STAT_LABELS.items():
+        text = (values or {}).get(label) or "N/A"
+        stats[key] = text
+        stats[f"{key}_value"] = _parse_stat_number(text) if text != "N/A" else None
+    stats["source"] = source
+    return stats
+
+class HttpConnectionPool:
+    """
+    按 (scheme, host, port) 复用 keep-alive 连接的简易连接池。
+
+    请求在线程池中同步执行，因此内部用锁保护空闲连接表；Cookie 不在池内保存，由各账号的 HttpAccountSession 维护。
+    """
+
+    def __init__(self, timeout_seconds: float = 20, proxy=None, max_idle_per_host: int = 8):
+        self.timeout_seconds = timeout_seconds
+        self.proxy = proxy
+        self.max_idle_per_host = max_idle_per_host
+        self.site_status = None
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    def _open(self, scheme: str, host: str, port: int, proxy=None):
+        conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        if not proxy:
+            conn = conn_cls(host, port, timeout=self.timeout_seconds)
+        else:
+            proxy_url = urllib.parse.urlsplit(proxy["server"])
+            if proxy_url.scheme not in ("http", "https", ""):
+                raise HttpEngineFallback(f"HTTP 引擎不支持该代理类型: {proxy_url.scheme}")
+            proxy_host = proxy_url.hostname or proxy["server"]
+            proxy_port = proxy_url.port or 8080
+            conn = conn_cls(proxy_host, proxy_port, timeout=self.timeout_seconds)
+            tunnel_headers = {}
+            if proxy.get("username"):
+                token = f"{proxy['username']}:{proxy.get('password', '')}"
+                tunnel_headers["Proxy-Authorization"] = "Basic " + base64.b64encode(token.encode("utf-8")).decode("ascii")
+            conn.set_tunnel(host, port, headers=tunnel_headers)
+        self.connections_opened += 1
+        return conn
+
+    def request(self, method: str, url: str, body=None, headers=None, proxy=None):
+        """proxy 为代理池分配给当前账号的代理；为 None 时使用 browser.proxy。空闲连接按代理分开复用。"""
+        proxy = proxy or self.proxy
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or "https"
+        port = parts.port or (443 if scheme == "https" else 80)
+        proxy_key = (proxy["server"], proxy.get("username")) if proxy else None
+        key = (scheme, parts.hostname, port, proxy_key)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        for attempt in range(2):
+            with self._lock:
+                idle = self._idle.get(key) or []
+                conn = idle.pop() if idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = self._open(scheme, parts.hostname, port, proxy)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # 复用的空闲连接可能已被服务端关闭，换一条新连接重试一次
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            self.requests_sent += 1
+            if resp.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    idle = self._idle.setdefault(key, [])
+                    if len(idle) < self.max_idle_per_host:
+                        idle.append(conn)
+                    else:
+                        conn.close()
+            return resp.status, resp.getheaders(), data
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._idle = {}
+
+def create_http_pool(config: dict):
+    http_cfg = (config or {}).get("http", {}) or {}
+    timeout_seconds = http_cfg.get("timeout_seconds", 20)
+    max_idle_per_host = http_cfg.get("max_idle_per_host", 8)
+    try:
+        timeout_seconds = float(timeout_seconds)
+        if timeout_seconds <= 0: timeout_seconds = 20
+    except Exception:
+        timeout_seconds = 20
+    try:
+        max_idle_per_host = int(max_idle_per_host)
+        if max_idle_per_host < 1: max_idle_per_host = 8
+    except Exception:
+        max_idle_per_host = 8
+    proxy = _resolve_browser_options(config)["proxy"]
+    return HttpConnectionPool(timeout_seconds, proxy=proxy, max_idle_per_host=max_idle_per_host)
+
+class HttpAccountSession:
+    """单个账号的 HTTP 会话：独立的 Cookie Jar，登录后带上 new-api 要求的 New-Api-User 头。"""
+
+    def __init__(self, pool: HttpConnectionPool, base_url: str, proxy=None, pushback_statuses=None):
+        self.pool = pool
+        self.base_url = base_url.rstrip("/")
+        self.proxy = proxy
+        # 收到的 429/5xx 状态码（由调用方传入列表，异常退出时也能拿到）
+        self.pushback_statuses = pushback_statuses if pushback_statuses is not None else []
+        self.cookies = {}
+        self.user_id = None
+
+    def _headers(self, has_body: bool):
+        headers = {
+            "User-Agent": USER_AGENT,
+            "Accept": "application/json, text/plain, */*",
+            "Connection": "keep-alive",
+        }
+        if has_body:
+            headers["Content-Type"] = "application/json"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        if self.user_id is not None:
+            headers["New-Api-User"] = str(self.user_id)
+        return headers
+
+    def _store_cookies(self, response_headers):
+        for name, value in response_headers:
+            if name.lower() != "set-cookie":
+                continue
+            jar = http.cookies.SimpleCookie()
+            try:
+                jar.load(value)
+            except http.cookies.CookieError:
+                continue
+            for key, morsel in jar.items():
+                self.cookies[key] = morsel.value
+
+    async def request_json(self, method: str, path: str, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        status, response_headers, data = await asyncio.to_thread(
+            self.pool.request, method, f"{self.base_url}{path}", body, self._headers(body is not None), self.proxy
+        )
+        self._store_cookies(response_headers)
+        if _is_pushback_status(status):
+            self.pushback_statuses.append(status)
+        try:
+            parsed = json.loads(data.decode("utf-8"))
+        except Exception:
+            raise HttpEngineFallback(f"{method} {path} 返回非 JSON 响应（HTTP {status}）")
+        if not isinstance(parsed, dict):
+            raise HttpEngineFallback(f"{method} {path} 返回非预期结构（HTTP {status}）")
+        return status, parsed
+
+def _classify_login_message(message: str):
+    # 登录接口明确返回失败且不是人机验证/站点错误时，基本就是账号密码问题
+    failure_class = classify_failure(message)
+    if failure_class in (FAILURE_UNKNOWN, FAILURE_NETWORK):
+        return FAILURE_BAD_CREDENTIALS
+    return failure_class
+
+async def run_http_sign_in(account, config: dict, http_pool: HttpConnectionPool, phase_timer=None, proxy=None,
+                           pushback_statuses=None):
+    """
+    不启动浏览器，直接调用 new-api 的 JSON 接口完成登录、签到与统计获取。
+
+    pushback_statuses 为调用方提供的列表，收集过程中遇到的 429/5xx 状态码（抛出异常时同样有效）。
+    """
+    username = account.get("username")
+    password = account.get("password")
+    if not username or not password:
+        return {
+            "ok": False,
+            "username": username,
+            "detail": "账号或密码为空，请检查 accounts.json",
+            "failure_class": FAILURE_BAD_CREDENTIALS,
+            "site_reached": False,
+        }
+
+    http_cfg = (config or {}).get("http", {}) or {}
+    checkin_path = http_cfg.get("checkin_path") or "/api/user/checkin"
+    started_at = time.monotonic()
+    phase_timer = phase_timer or PhaseTimer()
+    session = HttpAccountSession(http_pool, BASE_URL, proxy=proxy, pushback_statuses=pushback_statuses)
+
+    if http_pool.site_status is None:
+        with phase_timer.phase("site_status"):
+            _, status_payload = await session.request_json("GET", "/api/status")
+        http_pool.site_status = status_payload.get("data") or {}
+    if http_pool.site_status.get("turnstile_check"):
+        raise HttpEngineFallback("站点开启了 Turnstile 人机验证")
+
+    print(f"[HTTP] 正在登录账号: {username}...")
+    with phase_timer.phase("login_submit"):
+        status, login = await session.request_json("POST", "/api/user/login", {"username": username, "password": password})
+    message = str(login.get("message") or "")
+    if not login.get("success"):
+        if any(hint in message.lower() for hint in _CAPTCHA_HINTS):
+            raise HttpEngineFallback(f"登录需要人机验证：{message}")
+        if status >= 500:
+            raise HttpEngineFallback(f"登录接口异常（HTTP {status}）：{message}")
+        return {
+            "ok": False,
+            "username": username,
+            "detail": f"登录失败：{message or f'HTTP {status}'}",
+            # 429 是站点限流，不是账号密码问题
+            "failure_class": FAILURE_SITE_ERROR if status == 429 else _classify_login_message(message),
+            "stats": {},
+            "elapsed_seconds": round(time.monotonic() - started_at, 2),
+            "phases": phase_timer.phases,
+        }
+    login_data = login.get("data") or {}
+    if login_data.get("require_2fa"):
+        raise HttpEngineFallback("账号开启了两步验证")
+    session.user_id = login_data.get("id")
+
+    with phase_timer.phase("checkin"):
+        status, checkin = await session.request_json("POST", checkin_path)
+    message = str(checkin.get("message") or "")
+    if checkin.get("success"):
+        ok = True
+        detail = f"已执行签到（接口：{message}）" if message else "已执行签到"
+    elif "已签到" in message or "already" in message.lower():
+        ok = True
+        detail = f"今日已签到（接口：{message}）"
+    else:
+        raise HttpEngineFallback(f"签到接口返回非预期结果（HTTP {status}）：{message}")
+    print(f"[HTTP] 账号 {username}: {detail}")
+
+    stats = {}
+    try:
+        with phase_timer.phase("stats"):
+            _, user_self = await session.request_json("GET", "/api/user/self")
+        if not user_self.get("success"):
+            raise RuntimeError(user_self.get("message") or "接口返回失败")
+        stats = _stats_from_user_payload(user_self.get("data") or {}, http_pool.site_status, source="http")
+    except Exception as e:
+        print(f"[HTTP] 获取账户统计失败: {e}")
+        stats["error"] = str(e)
+
+    return {
+        "ok": ok,
+        "username": username,
+        "detail": detail,
+        "stats": stats,
+        "elapsed_seconds": round(time.monotonic() - started_at, 2),
+        "phases": phase_timer.phases,
+    }
+
+async def run_account(account, config: dict, engine: str = "browser", http_pool=None, **browser_kwargs):
+    """按 engine 选择执行方式："browser" 仅用浏览器；"http" 仅用接口；"auto" 先走接口，遇到人机验证/非预期响应再回退浏览器。"""
+    if engine in ("http", "auto") and http_pool is not None:
+        # 代理池同样作用于 HTTP 引擎：每个账号从池中取一个出口，结束后按结果归还
+        proxy_pool = browser_kwargs.get("proxy_pool")
+        proxy_entry = await proxy_pool.acquire() if proxy_pool is not None else None
+        started_at = time.monotonic()
+        result = None
+        fallback_reason = None
+        pushback_statuses = []
+        try:
+            result = await run_http_sign_in(
+                account, config, http_pool, proxy=proxy_entry.proxy if proxy_entry is not None else None,
+                pushback_statuses=pushback_statuses,
+            )
+            result["engine"] = "http"
+        except (OSError, http.client.HTTPException) as e:
+            username = account.get("username")
+            print(f"[HTTP] 账号 {username} 请求失败: {e}")
+            result = {
+                "ok": False,
+                "username": username,
+                "detail": f"HTTP 请求失败：{e}",
+                "stats": {},
+                "engine": "http",
+                "failure_class": FAILURE_NETWORK,
+            }
+        except HttpEngineFallback as e:
+            if engine == "http":
+                username = account.get("username")
+                result = {"ok": False, "username": username, "detail": f"HTTP 引擎无法完成：{e}", "stats": {}, "engine": "http"}
+            else:
+                fallback_reason = str(e)
+        finally:
+            if result is not None and pushback_statuses:
+                result["http_status"] = _pushback_status(pushback_statuses)
+            if proxy_entry is not None:
+                await proxy_pool.release(proxy_entry, result, time.monotonic() - started_at)
+        if result is not None:
+            if proxy_entry is not None:
+                result["proxy"] = proxy_entry.label
+            return result
+        print(f"[HTTP] 账号 {account.get('username')} 回退到浏览器流程: {fallback_reason}")
+        result = await run_sign_in(account, config, **browser_kwargs)
+        result["engine"] = "browser"
+        result["fallback_reason"] = fallback_reason
+        return result
+
+    result = await run_sign_in(account, config, **browser_kwargs)
+    result["engine"] = "browser"
+    return result
+
+def _summarize_engines(results):
+    counts = {}
+    fallbacks = 0
+    for r in results:
+        engine = r.get("engine")
+        if not engine:
+            continue
+        counts[engine] = counts.get(engine, 0) + 1
+        if r.get("fallback_reason"):
+            fallbacks += 1
+    if not counts:
+        return {}
+    text = " / ".join(f"{k} {v}" for k, v in sorted(counts.items()))
+    if fallbacks:
+        text += f"（回退浏览器 {fallbacks}）"
+    return {"执行引擎": text}
+
+def _summarize_failures(results, failure_policies: dict):
+    counts = {}
+    escalated = []
+    for r in results:
+        if r.get("ok") or not r.get("failure_class"):
+            continue
+        failure_class = r["failure_class"]
+        counts[failure_class] = counts.get(failure_class, 0) + 1
+        if (failure_policies.get(failure_class) or {}).get("escalate"):
+            escalated.append(r.get("username") or "<empty>")
+    if not counts:
+        return {}
+    summary = {
+        "失败分类": " / ".join(
+            f"{(failure_policies.get(k) or {}).get('label', k)} {v}" for k, v in sorted(counts.items())
+        )
+    }
+    if escalated:
+        summary["需人工处理"] = ", ".join(escalated)
+    return summary
+
+def _summarize_resources(results):
+    counters = [r["resources"] for r in results if r.get("resources")]
+    if not counters:
+        return {}
+    blocked = sum(c.get("blocked", 0) for c in counters)
+    allowed = sum(c.get("allowed", 0) for c in counters)
+    allowed_mb = sum(c.get("allowed_bytes", 0) for c in counters) / (1024 * 1024)
+    return {"资源拦截": f"拦截 {blocked} 个请求 / 放行 {allowed} 个（约 {allowed_mb:.1f}MB）"}
+
+def _summarize_probes(results):
+    counters = [r["probes"] for r in results if r.get("probes")]
+    if not counters:
+        return {}
+    round_trips = sum(c.get("round_trips", 0) for c in counters)
+    saved = sum(c.get("round_trips_saved", 0) for c in counters)
+    return {"DOM 探测": f"{round_trips} 次往返（比逐个选择器检查节省约 {saved} 次）"}
+
+def _summarize_account_costs(results):
+    elapsed = [r["elapsed_seconds"] for r in results if r.get("elapsed_seconds") is not None]
+    peaks = [r["peak_rss_mb"] for r in results if r.get("peak_rss_mb") is not None]
+    summary = {}
+    if elapsed:
+        summary["单账号平均耗时"] = f"{sum(elapsed) / len(elapsed):.2f}s（最长 {max(elapsed):.2f}s）"
+    if peaks:
+        summary["峰值内存"] = f"{max(peaks)}MB"
+    return summary
+
+def parse_shard(text: str):
+    """解析 "INDEX/COUNT"（INDEX 从 0 开始），返回 (index, count)；格式错误抛出 ValueError。"""
+    try:
+        index_text, count_text = str(text).split("/", 1)
+        index, count = int(index_text), int(count_text)
+    except Exception:
+        raise ValueError(f"分片格式应为 INDEX/COUNT，例如 0/4: {text!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片编号需满足 0 <= INDEX < COUNT: {text!r}")
+    return index, count
+
+def account_shard(account, count: int, salt: str = ""):
+    """按用户名哈希稳定地分配分片：与账号在文件中的顺序、增删其他账号都无关。"""
+    key = f"{salt}{account.get('username') or ''}".encode("utf-8")
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], "big") % count
+
+SPREAD_SALT = "spread:"
+
+def resolve_spread(schedule_cfg: dict):
+    """schedule.spread_minutes / schedule.spread_batch_seconds -> (窗口秒数, 批次秒数)；窗口为 0 表示不分散。"""
+    spread_minutes = (schedule_cfg or {}).get("spread_minutes", 0)
+    batch_seconds = (schedule_cfg or {}).get("spread_batch_seconds", 60)
+    try:
+        window_seconds = float(spread_minutes) * 60
+        if window_seconds < 0: window_seconds = 0
+    except Exception:
+        window_seconds = 0
+    try:
+        batch_seconds = float(batch_seconds)
+        if batch_seconds < 1: batch_seconds = 1
+    except Exception:
+        batch_seconds = 60
+    return window_seconds, min(batch_seconds, window_seconds) if window_seconds else 0
+
+def account_spread_offset(account, window_seconds: float, batch_seconds: float):
+    """
+    账号在分散窗口内的固定偏移（秒）：按用户名哈希，每天相同；向下取整到 batch_seconds，
+    同一批次的账号共享同一个就绪时刻，调度器每批只唤醒一次。
+    """
+    if window_seconds <= 0:
+        return 0
+    batches = max(1, int(window_seconds // batch_seconds))
+    return account_shard(account, batches, SPREAD_SALT) * batch_seconds
+
+def shard_accounts(accounts, shards):
+    """
+    shards 为 [(index, count, salt), ...]，逐级筛选：先按 --shard 分到节点，再按 --processes 分到本机进程。
+
+    每一级使用不同的 salt，避免同一节点内的账号再次按相同哈希分组时全部落到一个进程。
+    """
+    selected = list(accounts)
+    for index, count, salt in shards:
+        selected = [a for a in selected if account_shard(a, count, salt) == index]
+    return selected
+
+def _account_host(account):
+    # 目前所有账号都访问同一个站点；按主机名分组以便将来支持多站点
+    return urllib.parse.urlsplit(BASE_URL).netloc
+
+class HostStartSpacer:
+    """保证同一目标主机上相邻两个账号的启动时间至少间隔 min_interval_seconds。"""
+
+    def __init__(self, min_interval_seconds: float):
+        self.min_interval_seconds = min_interval_seconds
+        self._next_start = {}
+
+    async def wait_turn(self, host: str):
+        if self.min_interval_seconds <= 0:
+            return
+        now = time.monotonic()
+        # 先占位再等待：并发的 worker 会依次领到间隔递增的启动时刻
+        start_at = max(now, self._next_start.get(host, now))
+        self._next_start[host] = start_at + self.min_interval_seconds
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+class AdaptiveRateLimiter:
+    """
+    目标主机上账号启动速率的 AIMD 令牌桶（替代固定的 between_accounts_seconds）。
+
+    每个账号开始前领取一个令牌，速率以“次/分钟”计：成功一次加 increase_per_minute（加性增），
+    失败结果带有 429/5xx（http_status），或被分类为人机验证/站点错误（含登录后停留在登录页、被重定向回登录页）时
+    乘以 decrease_factor（乘性减）并清空已攒的令牌。
+    同一轮拥塞只降速一次：降速之前就已开始的账号再报告失败不会继续减半。
+    没有实际访问站点的账号（site_reached 为 False，如浏览器没启动起来；或已成功无需执行）退还令牌。
+    """
+
+    def __init__(self, initial_per_minute: float = 10, min_per_minute: float = 2, max_per_minute: float = 20,
+                 increase_per_minute: float = 1, decrease_factor: float = 0.5, burst: float = 1):
+        self.min_per_minute = min_per_minute
+        self.max_per_minute = max(min_per_minute, max_per_minute)
+        self.initial_per_minute = min(self.max_per_minute, max(min_per_minute, initial_per_minute))
+        self.increase_per_minute = increase_per_minute
+        self.decrease_factor = decrease_factor
+        self.burst = burst
+        # host -> {"rate": 次/分钟, "tokens": 令牌数（可为负，表示已被预约）, "updated_at": 上次结算时刻}
+        self._buckets = {}
+        self.increases = 0
+        self.decreases = 0
+        self.lowest_per_minute = self.initial_per_minute
+
+    def _bucket(self, host: str):
+        now = time.monotonic()
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = {
+                "rate": self.initial_per_minute, "tokens": self.burst, "updated_at": now, "decreased_at": None,
+            }
+        else:
+            bucket["tokens"] = min(self.burst, bucket["tokens"] + (now - bucket["updated_at"]) * bucket["rate"] / 60)
+            bucket["updated_at"] = now
+        return bucket
+
+    async def acquire(self, host: str):
+        """等到可以开始下一个账号，返回开始时刻（传给 observe）。"""
+        bucket = self._bucket(host)
+        # 与 HostStartSpacer 相同，先占位再等待：并发的 worker 依次排在后面
+        bucket["tokens"] -= 1
+        if bucket["tokens"] < 0:
+            await asyncio.sleep(-bucket["tokens"] * 60 / bucket["rate"])
+        return time.monotonic()
+
+    @staticmethod
+    def is_pushback(result: dict):
+        if result.get("ok"):
+            return False
+        status = result.get("http_status")
+        if status is not None and _is_pushback_status(status):
+            return True
+        return result.get("failure_class") in (FAILURE_CAPTCHA, FAILURE_SITE_ERROR)
+
+    def observe(self, host: str, result, started_at: float = None):
+        bucket = self._bucket(host)
+        if result is None or result.get("site_reached") is False:
+            bucket["tokens"] = min(self.burst, bucket["tokens"] + 1)
+        elif self.is_pushback(result):
+            bucket["tokens"] = min(bucket["tokens"], 0)
+            if started_at is not None and bucket["decreased_at"] is not None and started_at < bucket["decreased_at"]:
+                return
+            bucket["decreased_at"] = time.monotonic()
+            bucket["rate"] = max(self.min_per_minute, bucket["rate"] * self.decrease_factor)
+            self.decreases += 1
+            self.lowest_per_minute = min(self.lowest_per_minute, bucket["rate"])
+            print(f"[限速] {host} 遇到站点限制，速率降至 {bucket['rate']:.1f} 次/分钟")
+        elif result.get("ok"):
+            if bucket["rate"] < self.max_per_minute:
+                bucket["rate"] = min(self.max_per_minute, bucket["rate"] + self.increase_per_minute)
+                self.increases += 1
+
+    def current_per_minute(self):
+        if not self._buckets:
+            return self.initial_per_minute
+        return min(bucket["rate"] for bucket in self._buckets.values())
+
+    def summary(self):
+        return (
+            f"当前 {self.current_per_minute():.1f} 次/分钟（起始 {self.initial_per_minute:.1f}，最低 {self.lowest_per_minute:.1f}，"
+            f"加速 {self.increases} 次，降速 {self.decreases} 次）"
+        )
+
+def create_rate_limiter(config: dict, share: int = 1):
+    """share > 1（--processes 的子进程）时各速率按进程数平分，所有进程合计仍不超过配置值。"""
+    rate_cfg = ((config or {}).get("run", {}) or {}).get("rate_limit", {}) or {}
+    if not rate_cfg.get("enabled", True):
+        return None
+
+    def number(key, default, minimum=0.0):
+        try:
+            value = float(rate_cfg.get(key, default))
+            return value if value > minimum else default
+        except Exception:
+            return default
+
+    decrease_factor = number("decrease_factor", 0.5)
+    if decrease_factor >= 1:
+        decrease_factor = 0.5
+    share = max(1, share)
+    return AdaptiveRateLimiter(
+        initial_per_minute=number("initial_per_minute", 10) / share,
+        min_per_minute=number("min_per_minute", 2) / share,
+        max_per_minute=number("max_per_minute", 20) / share,
+        increase_per_minute=number("increase_per_minute", 1, -1) / share,
+        decrease_factor=decrease_factor,
+        burst=max(1.0, number("burst", 1)),
+    )
+
+# 边读边执行时队列中最多缓冲 concurrency * FEED_BUFFER_FACTOR（至少 FEED_BUFFER_MIN）个待执行账号
+FEED_BUFFER_FACTOR = 4
+FEED_BUFFER_MIN = 16
+
+class AccountScheduler:
+    """
+    按就绪时间排序的账号队列（heapq）。
+
+    首次尝试入队即就绪；失败的账号按各自的退避时间重新入队，与仍在排队的首次尝试交替执行。
+    队列为空且没有正在执行的账号时 get() 返回 None，表示全部完成。
+    feeding=True 时账号仍在边读边入队，直到 close_feed() 之前队列暂时为空也不会结束。
+    """
+
+    def __init__(self, feeding: bool = False):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self._in_flight = 0
+        self._feeding = feeding
+        # 边读边入队、尚未被取走的首次尝试数量（不含重试）
+        self._fed_waiting = 0
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def feeding(self):
+        return self._feeding
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    async def push(self, item, ready_at: float = None, fed: bool = False):
+        async with self._cond:
+            ready_at = time.monotonic() if ready_at is None else ready_at
+            heapq.heappush(self._heap, (ready_at, next(self._seq), item, fed))
+            if fed:
+                self._fed_waiting += 1
+            self._cond.notify_all()
+
+    async def wait_for_room(self, limit: int):
+        """
+        读取账号文件时的背压：排队中的首次尝试达到 limit 时等待 worker 取走，避免整份文件堆进队列。
+
+        stop() 之后立即返回 False，表示不再接收新账号。
+        """
+        async with self._cond:
+            while self._fed_waiting >= limit and not self._stopped:
+                await self._cond.wait()
+            return not self._stopped
+
+    async def get(self, deadline_at: float = None):
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                if deadline_at is not None and now >= deadline_at:
+                    return None
+                if self._heap:
+                    ready_at = self._heap[0][0]
+                    if ready_at <= now:
+                        _, _, item, fed = heapq.heappop(self._heap)
+                        if fed:
+                            self._fed_waiting -= 1
+                            # 唤醒等待背压的读取方
+                            self._cond.notify_all()
+                        self._in_flight += 1
+                        return item
+                    timeout = ready_at - now
+                elif self._in_flight == 0 and not self._feeding:
+                    return None
+                else:
+                    # 还有账号在执行（可能会重新入队），或账号文件尚未读完
+                    timeout = None
+                if deadline_at is not None:
+                    timeout = deadline_at - now if timeout is None else min(timeout, deadline_at - now)
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def task_done(self):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    async def close_feed(self):
+        async with self._cond:
+            self._feeding = False
+            self._cond.notify_all()
+
+    async def stop(self):
+        """运行期限已到：取出仍在排队的账号并停止接收，正在等待背压的读取方随即返回。"""
+        async with self._cond:
+            items = [item for _, _, item, _ in sorted(self._heap)]
+            self._heap = []
+            self._fed_waiting = 0
+            self._stopped = True
+            self._cond.notify_all()
+            return items
+
+def compute_retry_delay(attempt: int, base_seconds: float, max_seconds: float):
+    """第 attempt 次失败后的等待时间：指数退避 base * 2^(attempt-1)，不超过 max，再叠加 ±50% 抖动打散重试时刻。"""
+    delay = min(max_seconds, base_seconds * (2 ** max(0, attempt - 1)))
+    return delay * random.uniform(0.5, 1.5)
+
+async def run_with_deadline(coro, timeout_seconds: float, grace_seconds: float = 30):
+    """
+    在 timeout_seconds 内执行 coro，返回 (结果, 是否超时)；timeout_seconds <= 0 表示不限制。
+
+    超时后取消任务，并最多再等 grace_seconds 让 finally 中的清理（关闭 context / 浏览器）完成；
+    清理仍卡住时不再等待，避免一个账号拖住整次运行。
+    """
+    task = asyncio.ensure_future(coro)
+    if not timeout_seconds or timeout_seconds <= 0:
+        return await task, False
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout_seconds)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if done:
+        return task.result(), False
+
+    task.cancel()
+    done, _ = await asyncio.wait({task}, timeout=grace_seconds)
+    if not done:
+        print(f"[超时] 取消后 {grace_seconds:g} 秒内清理仍未结束，放弃等待")
+    # 取出任务的异常，避免 "exception was never retrieved" 警告
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return None, True
+
+async def run_account_pool(scheduler: AccountScheduler, handler, concurrency: int = 1, spacer=None,
+                           between_accounts_seconds: float = 0, deadline_at: float = None, limiter=None):
+    """
+    用 concurrency 个 worker 从 scheduler 取账号执行。
+
+    有 limiter 时每个账号开始前向它领取令牌，并把 handler 返回的结果反馈给它；
+    否则沿用旧行为，每个 worker 处理完一个账号后暂停 between_accounts_seconds。
+    """
+
+    async def worker():
+        while True:
+            account = await scheduler.get(deadline_at)
+            if account is None:
+                return
+            host = _account_host(account)
+            result = None
+            started_at = None
+            try:
+                if spacer is not None:
+                    await spacer.wait_turn(host)
+                if limiter is not None:
+                    started_at = await limiter.acquire(host)
+                result = await handler(account)
+            finally:
+                if limiter is not None:
+                    limiter.observe(host, result, started_at)
+                await scheduler.task_done()
+            if limiter is None and between_accounts_seconds > 0 and len(scheduler) > 0:
+                await asyncio.sleep(between_accounts_seconds)
+
+    # 边读边入队时队列刚开始可能还是空的，按配置的并发数启动 worker
+    pending = concurrency if scheduler.feeding else len(scheduler)
+    worker_count = max(1, min(concurrency, pending))
+    await asyncio.gather(*(worker() for _ in range(worker_count)))
+
+class RunHistory:
+    """
+    SQLite 运行历史：每个账号完成后立即写入一条记录（时间、结果、统计、失败分类）。
+
+    run_once 启动时据此跳过当前站点日内已成功的账号，进程中途崩溃后重跑也只会处理剩余账号。
+    """
+
+    def __init__(self, path: str, site_timezone: str = "Asia/Shanghai", retention_days: int = 90):
+        _ensure_dir(os.path.dirname(path) or ".")
+        self.path = path
+        self.site_timezone = site_timezone
+        # --processes 模式下多个进程同时写入，等待锁而不是立即报错
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                username TEXT NOT NULL,
+                site_day TEXT NOT NULL,
+                finished_at TEXT NOT NULL,
+                ok INTEGER NOT NULL,
+                detail TEXT,
+                failure_class TEXT,
+                stats TEXT,
+                attempts INTEGER,
+                elapsed_seconds REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_day_user ON results (site_day, username, ok)")
+        if retention_days > 0:
+            cutoff = (self._site_now() - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+            self._conn.execute("DELETE FROM results WHERE site_day < ?", (cutoff,))
+        self._conn.commit()
+
+    def _site_now(self):
+        try:
+            from zoneinfo import ZoneInfo
+
+            return datetime.now(ZoneInfo(self.site_timezone))
+        except Exception:
+            return datetime.now()
+
+    def site_day(self):
+        """站点的签到日（按站点时区计算的日期）。"""
+        return self._site_now().strftime("%Y-%m-%d")
+
+    def record(self, run_id: str, result: dict):
+        self._conn.execute(
+            """INSERT INTO results
+                (run_id, username, site_day, finished_at, ok, detail, failure_class, stats, attempts, elapsed_seconds)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                run_id,
+                result.get("username") or "",
+                self.site_day(),
+                datetime.now().isoformat(timespec="seconds"),
+                1 if result.get("ok") else 0,
+                result.get("detail"),
+                result.get("failure_class"),
+                json.dumps(result.get("stats") or {}, ensure_ascii=False),
+                result.get("attempts"),
+                result.get("elapsed_seconds"),
+            ),
+        )
+        self._conn.commit()
+
+    def completed_today(self):
+        """当前站点日内已成功的账号 -> 最近一次成功记录。"""
+        rows = self._conn.execute(
+            """SELECT username, finished_at, detail, stats FROM results
+                WHERE site_day = ? AND ok = 1 ORDER BY id""",
+            (self.site_day(),),
+        ).fetchall()
+        completed = {}
+        for username, finished_at, detail, stats in rows:
+            try:
+                stats = json.loads(stats or "{}")
+            except Exception:
+                stats = {}
+            completed[username] = {"finished_at": finished_at, "detail": detail, "stats": stats}
+        return completed
+
+    def close(self):
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+
+def create_run_history(config: dict):
+    history_cfg = (config or {}).get("history", {}) or {}
+    if not history_cfg.get("enabled", True):
+        return None
+
+    retention_days = history_cfg.get("retention_days", 90)
+    try:
+        retention_days = int(retention_days)
+    except Exception:
+        retention_days = 90
+    path = history_cfg.get("path") or os.path.join("state", "history.sqlite3")
+    try:
+        return RunHistory(path, history_cfg.get("site_timezone") or "Asia/Shanghai", retention_days)
+    except Exception as e:
+        print(f"打开运行历史失败，本次不跳过已完成账号: {e}")
+        return None
+
+# Prometheus 直方图的桶上限（秒）
+PHASE_BUCKETS_SECONDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+PROMETHEUS_PREFIX = "api_daily"
+
+@contextlib.contextmanager
+def _exclusive_file_lock(path: str):
+    """跨进程互斥（fcntl.flock）；没有 fcntl 的平台（Windows）不加锁。"""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class RunMetrics:
+    """
+    本次运行的阶段耗时导出。
+
+    每次账号尝试结束后立即向 <dir>/<run_id>.jsonl 追加一行（阶段耗时、等待、结果）；
+    运行结束后重写 Prometheus textfile，供 node_exporter 的 textfile collector 抓取。
+    直方图与计数器跨运行累加，累计值保存在 textfile 旁边的 .state.json 中。
+    """
+
+    def __init__(self, run_id: str, jsonl_dir: str = None, textfile_path: str = None):
+        self.run_id = run_id
+        self.jsonl_path = None
+        if jsonl_dir:
+            _ensure_dir(jsonl_dir)
+            self.jsonl_path = os.path.join(jsonl_dir, f"{run_id}.jsonl")
+        self.textfile_path = textfile_path
+        self._observations = []
+
+    def record(self, result: dict, rate_per_minute: float = None):
+        self._observations.append(result)
+        if not self.jsonl_path:
+            return
+        line = {
+            "run_id": self.run_id,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "username": result.get("username"),
+            "engine": result.get("engine"),
+            "attempt": result.get("attempts"),
+            "ok": bool(result.get("ok")),
+            "failure_class": result.get("failure_class"),
+            "elapsed_seconds": result.get("elapsed_seconds"),
+            "phases_ms": result.get("phases") or {},
+            "waits_ms": result.get("waits") or {},
+            "rate_per_minute": round(rate_per_minute, 2) if rate_per_minute is not None else None,
+            "deadline_hit": bool(result.get("deadline_hit")),
+        }
+        try:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"写入阶段耗时 JSONL 失败（忽略）: {e}")
+
+    def _load_state(self, state_path: str):
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("buckets") == list(PHASE_BUCKETS_SECONDS):
+                return state
+        except Exception:
+            pass
+        return {"buckets": list(PHASE_BUCKETS_SECONDS), "phases": {}, "accounts": {}, "failures": {}}
+
+    def export_textfile(self, run_seconds: float, rate_per_minute: float = None):
+        if not self.textfile_path:
+            return None
+        _ensure_dir(os.path.dirname(self.textfile_path) or ".")
+        state_path = self.textfile_path + ".state.json"
+        # --processes 模式下各分片进程依次合并累计值，避免读改写互相覆盖
+        with _exclusive_file_lock(self.textfile_path + ".lock"):
+            return self._export_textfile_locked(state_path, run_seconds, rate_per_minute)
+
+    def _export_textfile_locked(self, state_path: str, run_seconds: float, rate_per_minute: float = None):
+        state = self._load_state(state_path)
+
+        for result in self._observations:
+            outcome = "success" if result.get("ok") else "failure"
+            state["accounts"][outcome] = state["accounts"].get(outcome, 0) + 1
+            if not result.get("ok"):
+                failure_class = result.get("failure_class") or FAILURE_UNKNOWN
+                state["failures"][failure_class] = state["failures"].get(failure_class, 0) + 1
+            for phase, ms in (result.get("phases") or {}).items():
+                seconds = ms / 1000
+                histogram = state["phases"].setdefault(
+                    phase, {"counts": [0] * len(PHASE_BUCKETS_SECONDS), "sum": 0.0, "count": 0}
+                )
+                for i, bound in enumerate(PHASE_BUCKETS_SECONDS):
+                    if seconds <= bound:
+                        histogram["counts"][i] += 1
+                histogram["sum"] += seconds
+                histogram["count"] += 1
+        self._observations = []
+
+        name = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {name}_phase_duration_seconds Duration of each sign-in phase.",
+            f"# TYPE {name}_phase_duration_seconds histogram",
+        ]
+        for phase in sorted(state["phases"]):
+            histogram = state["phases"][phase]
+            for bound, count in zip(PHASE_BUCKETS_SECONDS, histogram["counts"]):
+                lines.append(f'{name}_phase_duration_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}')
+            lines.append(f'{name}_phase_duration_seconds_bucket{{phase="{phase}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{name}_phase_duration_seconds_sum{{phase="{phase}"}} {histogram["sum"]:.3f}')
+            lines.append(f'{name}_phase_duration_seconds_count{{phase="{phase}"}} {histogram["count"]}')
+        lines += [
+            f"# HELP {name}_account_attempts_total Account sign-in attempts by outcome.",
+            f"# TYPE {name}_account_attempts_total counter",
+        ]
+        for outcome in ("success", "failure"):
+            lines.append(f'{name}_account_attempts_total{{result="{outcome}"}} {state["accounts"].get(outcome, 0)}')
+        lines += [
+            f"# HELP {name}_account_failures_total Failed attempts by failure class.",
+            f"# TYPE {name}_account_failures_total counter",
+        ]
+        for failure_class in sorted(state["failures"]):
+            lines.append(f'{name}_account_failures_total{{failure_class="{failure_class}"}} {state["failures"][failure_class]}')
+        lines += [
+            f"# HELP {name}_last_run_timestamp_seconds Unix time the last run finished.",
+            f"# TYPE {name}_last_run_timestamp_seconds gauge",
+            f"{name}_last_run_timestamp_seconds {time.time():.0f}",
+            f"# HELP {name}_last_run_duration_seconds Wall time of the last run.",
+            f"# TYPE {name}_last_run_duration_seconds gauge",
+            f"{name}_last_run_duration_seconds {run_seconds:.3f}",
+        ]
+        if rate_per_minute is not None:
+            lines += [
+                f"# HELP {name}_rate_limit_per_minute Adaptive account start rate at the end of the last run.",
+                f"# TYPE {name}_rate_limit_per_minute gauge",
+                f"{name}_rate_limit_per_minute {rate_per_minute:.3f}",
+            ]
+
+        # node_exporter 可能随时读取：先写临时文件再原子替换
+        try:
+            for path, content in (
+                (state_path, json.dumps(state)),
+                (self.textfile_path, "\n".join(lines) + "\n"),
+            ):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            return self.textfile_path
+        except Exception as e:
+            print(f"写入 Prometheus textfile 失败（忽略）: {e}")
+            return None
+
+def create_run_metrics(config: dict, run_id: str):
+    metrics_cfg = (config or {}).get("metrics", {}) or {}
+    if not metrics_cfg.get("enabled", True):
+        return None
+    return RunMetrics(
+        run_id,
+        jsonl_dir=metrics_cfg.get("dir") or None,
+        textfile_path=metrics_cfg.get("prometheus_textfile") or None,
+    )
+
+def _summarize_phases(results):
+    """按阶段汇总本次全部账号的平均耗时，便于在通知中定位慢的环节。"""
+    totals = {}
+    for r in results:
+        for phase, ms in (r.get("phases") or {}).items():
+            total, count = totals.get(phase, (0, 0))
+            totals[phase] = (total + ms, count + 1)
+    if not totals:
+        return {}
+    slowest = sorted(totals.items(), key=lambda item: item[1][0] / item[1][1], reverse=True)[:5]
+    return {"阶段平均耗时（最慢 5 项）": ", ".join(f"{phase} {total / count / 1000:.1f}s" for phase, (total, count) in slowest)}
+
+class AccountSource:
+    """
+    流式读取账号文件，逐个产出账号，不一次性载入整个文件。
+
+    支持原有的 JSON 数组（[{...}, {...}]）和 JSONL（每行一个账号，空行与 // 或 # 开头的行忽略）。
+    重复的用户名只保留第一次出现，判重只保存 8 字节摘要；无法解析的条目记录行号后跳过，不影响其他账号。
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    # JSON 数组中单个条目的最大长度，超过则视为格式错误，避免坏文件把整个文件读进内存
+    MAX_ENTRY_CHARS = 1024 * 1024
+
+    def __init__(self, path: str = "accounts.json"):
+        self.path = path
+        self.count = 0
+        self.duplicates = 0
+        # (行号, 说明)
+        self.errors = []
+        self._seen = set()
+
+    def __iter__(self):
+        with open(self.path, "r", encoding="utf-8-sig") as f:
+            first_char = ""
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                stripped = chunk.lstrip()
+                if stripped:
+                    first_char = stripped[0]
+                    break
+            f.seek(0)
+            entries = self._iter_json_array(f) if first_char == "[" else self._iter_jsonl(f)
+            for line_no, entry in entries:
+                account = self._accept(line_no, entry)
+                if account is not None:
+                    yield account
+
+    def _accept(self, line_no: int, entry):
+        if not isinstance(entry, dict):
+            self.errors.append((line_no, "不是账号对象（应为包含 username/password 的 JSON 对象）"))
+            return None
+        username = entry.get("username")
+        if username:
+            digest = hashlib.blake2b(str(username).encode("utf-8"), digest_size=8).digest()
+            if digest in self._seen:
+                self.duplicates += 1
+                self.errors.append((line_no, f"用户名 {username} 重复，已忽略"))
+                return None
+            self._seen.add(digest)
+        self.count += 1
+        return entry
+
+    def _iter_jsonl(self, f):
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("//") or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line.rstrip(","))
+            except json.JSONDecodeError as e:
+                self.errors.append((line_no, f"无法解析: {e.msg}"))
+                continue
+            yield line_no, entry
+
+    def _iter_json_array(self, f):
+        decoder = json.JSONDecoder()
+        # 跳过 "[" 之前的空白：空白可能跨越多个块，逐块读取直到真正遇到 "["
+        line_no = 1
+        while True:
+            buf = f.read(self.CHUNK_SIZE)
+            if not buf:
+                return
+            stripped = buf.lstrip()
+            line_no += buf.count("\n", 0, len(buf) - len(stripped))
+            if stripped:
+                buf = stripped
+                break
+        eof = False
+        pos = 1
+
+        def compact():
+            # 丢弃已解析部分并读入下一块
+            nonlocal buf, pos, eof
+            chunk = f.read(self.CHUNK_SIZE)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                if buf[pos] == "\n":
+                    line_no += 1
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    return
+                compact()
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                entry, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if not eof and len(buf) - pos < self.MAX_ENTRY_CHARS:
+                    # 条目可能被分块截断，读入更多内容后重试
+                    compact()
+                    continue
+                self.errors.append((line_no + buf.count("\n", pos, e.pos), f"无法解析: {e.msg}"))
+                # 跳到下一个 "{" 继续（账号对象不含嵌套对象）
+                search_from = pos + 1
+                while True:
+                    next_pos = buf.find("{", search_from)
+                    if next_pos != -1:
+                        line_no += buf.count("\n", pos, next_pos)
+                        pos = next_pos
+                        break
+                    line_no += buf.count("\n", pos)
+                    pos = len(buf)
+                    if eof:
+                        return
+                    compact()
+                    search_from = 0
+                continue
+            yield line_no, entry
+            line_no += buf.count("\n", pos, end)
+            pos = end
+            if pos >= self.CHUNK_SIZE:
+                buf, pos = buf[pos:], 0
+
+    def report_problems(self):
+        if not self.errors:
+            return
+        print(f"账号文件 {self.path} 中有 {len(self.errors)} 处问题（已跳过）:")
+        for line_no, message in self.errors[:20]:
+            print(f"  第 {line_no} 行: {message}")
+        if len(self.errors) > 20:
+            print(f"  ……其余 {len(self.errors) - 20} 处省略")
+
+    def summary(self):
+        if not self.errors:
+            return None
+        line_no, message = self.errors[0]
+        return f"{len(self.errors)} 处已跳过（其中重复 {self.duplicates} 个；首处第 {line_no} 行：{message}）"
+
+def load_accounts(path: str = "accounts.json"):
+    if not os.path.exists(path):
+        print(f"错误: 未找到 {path} 配置文件。")
+        return None
+
+    source = AccountSource(path)
+    try:
+        accounts = list(source)
+    except Exception as e:
+        print(f"错误: 无法读取 {path}。请检查格式。{e}")
+        return None
+    source.report_problems()
+    return accounts
+
+def _ordered_results(usernames, final_results: dict):
+    results = []
+    seen_usernames = set()
+    for username in usernames:
+        if username in seen_usernames or username not in final_results:
+            continue
+        seen_usernames.add(username)
+        results.append(final_results[username])
+    return results
+
+async def send_run_report(config: dict, results, summary: dict, failure_policies: dict = None):
+    """补全由结果推导的运行统计，生成最终报告并发送 Webhook。"""
+    failure_policies = failure_policies or resolve_failure_policies(config)
+    summary = dict(summary)
+    summary.update(_summarize_failures(results, failure_policies))
+    summary.update(_summarize_engines(results))
+    summary.update(_summarize_resources(results))
+    summary.update(_summarize_probes(results))
+    summary.update(_summarize_account_costs(results))
+    summary.update(_summarize_phases(results))
+
+    report = format_final_report(results, summary, failure_policies)
+    if ((config or {}).get("har") or {}).get("mode") == "replay":
+        # 回放是离线对比：报告（含阶段耗时汇总）只打印到控制台，不受 WECHAT_WEBHOOK_* 环境变量影响
+        print(f"\n{report}")
+        return report
+    webhook_cfg = get_webhook_config(config)
+    webhook_result = await send_wechat_webhook(report, webhook_cfg)
+    if not webhook_result.get("ok") and not webhook_result.get("disabled"):
+        print(f"Webhook 发送失败: {webhook_result}")
+    return report
+
+def _write_shard_results(path: str, results, summary: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"results": results, "summary": summary}, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+async def run_once(config: dict, accounts=None, force: bool = False, shards=None, results_path: str = None,
+                   spread: bool = True):
+    """
+    执行一轮签到。shards 非空时只处理分配到本分片的账号；
+    results_path 非空时（--processes 的子进程）把结果写入该文件交给父进程汇总，不发送通知。
+    配置了 schedule.spread_minutes 时，每个账号在窗口内按固定偏移开始；spread=False（--no-spread）时立即全部开始。
+    """
+    set_base_url(resolve_base_url(config))
+    account_source = None
+    if accounts is None:
+        # 边读边执行：第一个账号不必等整个 accounts.json 解析完
+        if not os.path.exists("accounts.json"):
+            print("错误: 未找到 accounts.json 配置文件。")
+            return []
+        account_source = AccountSource("accounts.json")
+    shard_label = " · ".join(f"{index}/{count}" for index, count, _ in shards) if shards else None
+
+    print("开始读取账号并执行签到任务...")
+    
+    run_cfg = (config or {}).get("run", {})
+    between_accounts_seconds = run_cfg.get("between_accounts_seconds", 2)
+    max_retries = run_cfg.get("max_retries", 3)
+    retry_delay_seconds = run_cfg.get("retry_delay_seconds", 300)
+    retry_base_delay_seconds = run_cfg.get("retry_base_delay_seconds", 30)
+    deadline_seconds = run_cfg.get("deadline_seconds", 0)
+    concurrency = run_cfg.get("concurrency", 1)
+    min_start_interval_seconds = run_cfg.get("min_start_interval_seconds", 3)
+    account_timeout_seconds = run_cfg.get("account_timeout_seconds", 180)
+
+    try:
+        between_accounts_seconds = float(between_accounts_seconds)
+    except Exception:
+        between_accounts_seconds = 2
+
+    try:
+        max_retries = int(max_retries)
+        if max_retries < 0: max_retries = 0
+    except Exception:
+        max_retries = 3
+
+    try:
+        retry_delay_seconds = int(retry_delay_seconds)
+        if retry_delay_seconds < 0: retry_delay_seconds = 300
+    except Exception:
+        retry_delay_seconds = 300
+
+    try:
+        retry_base_delay_seconds = float(retry_base_delay_seconds)
+        if retry_base_delay_seconds < 0: retry_base_delay_seconds = 30
+    except Exception:
+        retry_base_delay_seconds = 30
+
+    try:
+        deadline_seconds = float(deadline_seconds)
+        if deadline_seconds < 0: deadline_seconds = 0
+    except Exception:
+        deadline_seconds = 0
+
+    try:
+        concurrency = int(concurrency)
+        if concurrency < 1: concurrency = 1
+    except Exception:
+        concurrency = 1
+
+    try:
+        min_start_interval_seconds = float(min_start_interval_seconds)
+        if min_start_interval_seconds < 0: min_start_interval_seconds = 0
+    except Exception:
+        min_start_interval_seconds = 3
+
+    try:
+        account_timeout_seconds = float(account_timeout_seconds)
+        if account_timeout_seconds < 0: account_timeout_seconds = 0
+    except Exception:
+        account_timeout_seconds = 180
+
+    # --processes 的子进程：N 个进程访问同一站点，启动间隔与限速按进程数分摊，合计速率与单进程相同
+    process_count = next((count for _, count, salt in shards or [] if salt == PROCESS_SHARD_SALT), 1)
+    if process_count > 1:
+        min_start_interval_seconds *= process_count
+        between_accounts_seconds *= process_count
+    spacer = HostStartSpacer(min_start_interval_seconds)
+    if concurrency > 1:
+        print(f"并发执行: 同时处理 {concurrency} 个账号，同一站点启动间隔至少 {min_start_interval_seconds} 秒")
+    rate_limiter = create_rate_limiter(config, share=process_count)
+    if rate_limiter is not None:
+        print(f"自适应限速: 起始 {rate_limiter.initial_per_minute:.1f} 次/分钟，"
+              f"范围 {rate_limiter.min_per_minute:.1f}~{rate_limiter.max_per_minute:.1f}")
+    
+    browser_options = _resolve_browser_options(config)
+    reaped_at_start = 0
+    if browser_options["reap_orphans"]:
+        reaped_at_start = reap_orphan_chromium()
+        if reaped_at_start:
+            print(f"[浏览器] 已清理 {reaped_at_start} 个之前运行遗留的 Chromium 进程")
+    # 单账号超时后留给清理的时间：关闭 context、关闭浏览器各一次，再加少量余量
+    teardown_grace_seconds = browser_options["close_timeout_seconds"] * 2 + 5
+    deadline_hits = 0
+    traced_count = 0
+    traces_kept = 0
+
+    browser_manager = None
+    if browser_options["shared"]:
+        browser_manager = BrowserManager(config)
+    session_cache = create_session_cache(config)
+    artifact_writer = create_artifact_writer(config)
+    network_trace = create_network_trace(config)
+    proxy_pool = create_proxy_pool(config)
+    if proxy_pool is not None:
+        await proxy_pool.health_check(BASE_URL)
+    har_session = create_har_session(config)
+
+    engine = str((config or {}).get("engine") or "browser").lower()
+    if engine not in ("browser", "http", "auto"):
+        print(f"未知的 engine 配置 {engine!r}，改用 browser")
+        engine = "browser"
+    http_pool = create_http_pool(config) if engine in ("http", "auto") else None
+
+    failure_policies = resolve_failure_policies(config)
+    final_results = {}
+    # username -> {"attempts": 尝试次数, "seconds": 累计耗时}
+    account_costs = {}
+    run_started_at = time.monotonic()
+    spread_seconds, spread_batch_seconds = resolve_spread((config or {}).get("schedule", {})) if spread else (0, 0)
+    if spread_seconds:
+        print(f"分散执行: 账号按固定偏移分布在 {spread_seconds / 60:g} 分钟内，每 {spread_batch_seconds:g} 秒一批")
+    # 运行期限从窗口结束时算起，窗口末尾的账号同样有完整的时间预算
+    deadline_at = run_started_at + spread_seconds + deadline_seconds if deadline_seconds > 0 else None
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if shards:
+        run_id += "_shard" + "_".join(f"{index}of{count}" for index, count, _ in shards)
+    history = create_run_history(config)
+    run_metrics = create_run_metrics(config, run_id)
+    completed = {}
+    if history is not None and not force and ((config or {}).get("history", {}) or {}).get("skip_completed", True):
+        completed = history.completed_today()
+
+    scheduler = AccountScheduler(feeding=True)
+    # 背压：排队中的账号最多为并发数的若干倍，读取速度跟随执行速度，内存不随账号文件增长。
+    # 分散执行时账号的就绪时间由偏移决定、与文件顺序无关，必须全部入队才能按偏移先后执行，因此不限制。
+    feed_limit = 0 if spread_seconds else max(FEED_BUFFER_MIN, concurrency * FEED_BUFFER_FACTOR)
+    # 按文件顺序记录本次负责的用户名，报告据此排序（不保留整份账号列表）
+    account_order = []
+    skipped_count = 0
+    # 因运行期限未执行的账号数（包括期限到达后才读到的账号）
+    unexecuted_count = 0
+
+    def mark_unexecuted(username):
+        nonlocal unexecuted_count
+        if username in final_results:
+            return
+        unexecuted_count += 1
+        final_results[username] = {
+            "ok": False,
+            "username": username,
+            "detail": f"超出运行期限（{deadline_seconds:.0f} 秒），未执行",
+            "stats": {},
+        }
+
+    async def feed_accounts():
+        nonlocal skipped_count
+        read_count = 0
+        try:
+            for account in account_source if account_source is not None else accounts:
+                read_count += 1
+                if read_count % 100 == 0:
+                    # 大文件解析期间让出事件循环，已入队的账号可以先开始执行
+                    await asyncio.sleep(0)
+                if shards and shard_accounts([account], shards) == []:
+                    continue
+                username = account.get("username")
+                account_order.append(username)
+                if username and username in completed:
+                    # 当前站点日内已成功：直接沿用历史记录，不再启动浏览器
+                    previous = completed[username]
+                    final_results[username] = {
+                        "ok": True,
+                        "username": username,
+                        "detail": f"今日已完成（{previous['finished_at']}），跳过：{previous.get('detail') or '-'}",
+                        "stats": previous.get("stats") or {},
+                        "skipped": True,
+                    }
+                    skipped_count += 1
+                    continue
+                if feed_limit:
+                    await scheduler.wait_for_room(feed_limit)
+                if scheduler.stopped:
+                    # 运行期限已到：剩余账号只读取不执行，报告中仍逐个列出
+                    mark_unexecuted(username)
+                    continue
+                await scheduler.push(
+                    account,
+                    run_started_at + account_spread_offset(account, spread_seconds, spread_batch_seconds),
+                    fed=True,
+                )
+        except Exception as e:
+            print(f"读取 accounts.json 时出错，已读取的账号继续执行: {e}")
+        finally:
+            await scheduler.close_feed()
+        if account_source is not None:
+            account_source.report_problems()
+        if shard_label:
+            print(f"分片 {shard_label}: 共 {read_count} 个账号，本分片负责 {len(account_order)} 个")
+        else:
+            print(f"账号读取完成，共 {len(account_order)} 个账号")
+        if skipped_count:
+            print(f"运行历史显示 {skipped_count} 个账号今日已完成，跳过（使用 --force 可强制重跑）")
+
+    async def handle_account(account):
+        nonlocal deadline_hits, traced_count, traces_kept
+        username = account.get("username")
+        # 已经成功的不再跑
+        if final_results.get(username, {}).get("ok"):
+            return None
+
+        cost = account_costs.setdefault(username, {"attempts": 0, "seconds": 0.0})
+        cost["attempts"] += 1
+        attempt = cost["attempts"]
+        if attempt > 1:
+            print(f"\n[重试机制] 账号 {username} 开始第 {attempt - 1}/{max_retries} 次重试...")
+
+        started_at = time.monotonic()
+        try:
+            result, timed_out = await run_with_deadline(
+                run_account(
+                    account, config,
+                    engine=engine,
+                    http_pool=http_pool,
+                    browser_manager=browser_manager,
+                    session_cache=session_cache,
+                    artifact_writer=artifact_writer,
+                    network_trace=network_trace,
+                    proxy_pool=proxy_pool,
+                    har_session=har_session,
+                ),
+                account_timeout_seconds,
+                grace_seconds=teardown_grace_seconds,
+            )
+            if timed_out:
+                deadline_hits += 1
+                print(f"账号 {username} 超过单账号时限 {account_timeout_seconds:g} 秒，已取消")
+                result = {
+                    "ok": False,
+                    "username": username,
+                    "detail": f"单账号超时（{account_timeout_seconds:g} 秒），已取消",
+                    "stats": {},
+                    "failure_class": FAILURE_NETWORK,
+                    "deadline_hit": True,
+                    "elapsed_seconds": round(time.monotonic() - started_at, 2),
+                }
+        except Exception as e:
+            print(f"账号 {username} 执行过程中出错: {str(e)}")
+            result = {
+                "ok": False,
+                "username": username,
+                "detail": str(e),
+                "stats": {},
+                "failure_class": classify_failure(str(e), exc=e),
+            }
+        if not result.get("ok") and not result.get("failure_class"):
+            result["failure_class"] = classify_failure(result.get("detail") or "")
+        cost["seconds"] += time.monotonic() - started_at
+        if result.get("traced"):
+            traced_count += 1
+            traces_kept += 1 if result.get("trace") else 0
+        result["attempts"] = attempt
+        result["total_seconds"] = round(cost["seconds"], 2)
+
+        # 每个账号完成后立即更新结果（覆盖旧的失败结果，或保留新的成功结果）
+        final_results[username] = result
+        if history is not None:
+            try:
+                history.record(run_id, result)
+            except Exception as e:
+                print(f"写入运行历史失败（忽略）: {e}")
+        if run_metrics is not None:
+            run_metrics.record(result, rate_limiter.current_per_minute() if rate_limiter is not None else None)
+
+        if result.get("ok"):
+            return result
+        failure_class = result["failure_class"]
+        policy = failure_policies.get(failure_class) or failure_policies[FAILURE_UNKNOWN]
+        if not policy.get("retry", True):
+            print(f"[重试机制] 账号 {username} 失败类型为 {failure_class}（{policy.get('label')}），不再重试")
+            return result
+        if attempt > min(max_retries, policy.get("max_retries", max_retries)):
+            return result
+        delay = compute_retry_delay(attempt, retry_base_delay_seconds, retry_delay_seconds)
+        delay *= float(policy.get("backoff_multiplier", 1))
+        retry_at = time.monotonic() + delay
+        if deadline_at is not None and retry_at >= deadline_at:
+            print(f"[重试机制] 账号 {username} 的下一次重试将超出运行期限，不再重试")
+            return result
+        print(f"[重试机制] 账号 {username} 第 {attempt} 次尝试失败（{failure_class}），{delay:.0f} 秒后重试")
+        await scheduler.push(account, retry_at)
+        return result
+
+    feeder = asyncio.ensure_future(feed_accounts())
+    try:
+        await run_account_pool(
+            scheduler,
+            handle_account,
+            concurrency=concurrency,
+            spacer=spacer,
+            between_accounts_seconds=between_accounts_seconds,
+            deadline_at=deadline_at,
+            limiter=rate_limiter,
+        )
+        for account in await scheduler.stop():
+            mark_unexecuted(account.get("username"))
+        # 读完账号文件（不再入队），期限到达时尚未读到的账号同样记入报告
+        await feeder
+        if unexecuted_count:
+            print(f"已达到运行期限 {deadline_seconds:.0f} 秒，剩余 {unexecuted_count} 个账号未执行")
+        if all(r.get("ok") for r in final_results.values()):
+            print("所有账号均执行成功。")
+    finally:
+        if not feeder.done():
+            feeder.cancel()
+        await asyncio.gather(feeder, return_exceptions=True)
+        # 无论正常结束还是被取消（守护进程收到 SIGTERM），都释放浏览器与连接池
+        if history is not None:
+            history.close()
+        await artifact_writer.close()
+        if network_trace is not None:
+            network_trace.close()
+        if run_metrics is not None:
+            run_metrics.export_textfile(
+                time.monotonic() - run_started_at,
+                rate_limiter.current_per_minute() if rate_limiter is not None else None,
+            )
+        if http_pool is not None:
+            http_pool.close()
+        if browser_manager is not None:
+            await browser_manager.close()
+        if har_session is not None:
+            # 浏览器关闭后（context 已全部写出 HAR）再删除未脱敏的原始文件
+            har_session.close()
+        reaped_at_end = reap_orphan_chromium(os.getpid()) if browser_options["reap_orphans"] else 0
+        if reaped_at_end:
+            print(f"[浏览器] 运行结束时仍有 {reaped_at_end} 个 Chromium 进程未退出，已强制结束")
+
+    summary = {}
+    if shard_label and not results_path:
+        summary["分片"] = shard_label
+    if browser_manager is not None:
+        summary["浏览器启动次数"] = browser_manager.launch_count
+    if session_cache is not None:
+        summary["会话缓存"] = session_cache.summary()
+    if skipped_count:
+        summary["今日已完成跳过"] = skipped_count
+    if deadline_hits:
+        summary["单账号超时"] = f"{deadline_hits} 次（时限 {account_timeout_seconds:g} 秒）"
+    if har_session is not None:
+        summary["HAR"] = har_session.summary()
+    if traced_count:
+        summary["Playwright 跟踪"] = f"采样 {traced_count} 次，保留 {traces_kept} 个（慢或失败）"
+    if reaped_at_start or reaped_at_end:
+        summary["清理残留 Chromium"] = f"开始 {reaped_at_start} 个 / 结束 {reaped_at_end} 个"
+    if rate_limiter is not None:
+        summary["限速"] = rate_limiter.summary()
+    if proxy_pool is not None:
+        summary["代理"] = proxy_pool.summary()
+    if network_trace is not None:
+        summary["网络跟踪"] = f"{network_trace.events} 条事件 -> {network_trace.path}"
+    if artifact_writer.written or artifact_writer.dropped or artifact_writer.deduplicated:
+        summary["现场文件"] = artifact_writer.summary()
+
+    if account_source is not None and account_source.summary():
+        summary["账号文件问题"] = account_source.summary()
+
+    # 报告按 accounts.json 中的顺序输出，而不是完成顺序
+    results = _ordered_results(account_order, final_results)
+    if not results and not summary.get("账号文件问题"):
+        if results_path:
+            _write_shard_results(results_path, [], {})
+        return []
+    if results_path:
+        _write_shard_results(results_path, results, summary)
+        return results
+    await send_run_report(config, results, summary, failure_policies)
+
+    print("\n所有账号签到任务已完成。")
+    return results
+
+@contextlib.contextmanager
+def profile_run(output_dir: str = None):
+    """
+    --profile：用 cProfile 记录一次运行，写出 .prof（pstats / snakeviz 可读）和按累计耗时排序的前 40 个函数。
+
+    未指定 output_dir 时什么都不做，cProfile 也不会被导入。
+    """
+    if not output_dir:
+        yield
+        return
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _ensure_dir(output_dir)
+        base = os.path.join(output_dir, f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}")
+        try:
+            profiler.dump_stats(base + ".prof")
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(40)
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(stream.getvalue())
+            print(f"性能分析已保存: {base}.prof / {base}.txt")
+        except Exception as e:
+            print(f"保存性能分析失败（忽略）: {e}")
+
+PROCESS_SHARD_SALT = "process:"
+
+def _merge_shard_summaries(summaries):
+    """合并各子进程的运行统计：数值相加，文本按进程拼接。"""
+    merged = {}
+    for summary in summaries:
+        for key, value in summary.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = merged.get(key, 0) + value
+            elif key in merged:
+                merged[key] = f"{merged[key]}；{value}"
+            else:
+                merged[key] = value
+    return merged
+
+async def _relay_output(stream, prefix: str):
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        print(f"{prefix} {line.decode('utf-8', errors='replace').rstrip()}")
+
+async def run_processes(config: dict, processes: int, force: bool = False, shards=None, profile_dir: str = None,
+                        spread: bool = True, har_args=None):
+    """
+    本机多进程模式：按用户名哈希把账号分给 processes 个子进程，每个子进程运行自己的事件循环和 Chromium。
+
+    子进程不发送通知，只把结果写入临时文件；父进程等待全部结束后按 accounts.json 的顺序合并，
+    只发送一次汇总报告。异常退出的子进程所负责的账号记为失败。
+    """
+    accounts = load_accounts()
+    if accounts is None:
+        # load_accounts 已输出与 run_once 相同的错误信息
+        return []
+    if shards:
+        accounts = shard_accounts(accounts, shards)
+    if not accounts:
+        return []
+    print(f"多进程模式: {len(accounts)} 个账号分给 {processes} 个子进程执行...")
+
+    work_dir = tempfile.mkdtemp(prefix="api-daily-shards-")
+    children = []
+    try:
+        for index in range(processes):
+            results_path = os.path.join(work_dir, f"shard_{index}.json")
+            cmd = [
+                sys.executable, os.path.abspath(__file__), "--worker",
+                "--process-shard", f"{index}/{processes}",
+                "--shard-results", results_path,
+            ]
+            for node_index, node_count, _ in shards or []:
+                cmd += ["--shard", f"{node_index}/{node_count}"]
+            if force:
+                cmd.append("--force")
+            if not spread:
+                cmd.append("--no-spread")
+            cmd += list(har_args or [])
+            if profile_dir:
+                # 每个子进程各自写一份（文件名带 PID）
+                cmd += ["--profile", profile_dir]
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                env=dict(os.environ, PYTHONUNBUFFERED="1"),
+            )
+            relay = asyncio.ensure_future(_relay_output(proc.stdout, f"[进程 {index}/{processes}]"))
+            children.append((index, proc, relay, results_path))
+
+        final_results = {}
+        summaries = []
+        for index, proc, relay, results_path in children:
+            returncode = await proc.wait()
+            await relay
+            try:
+                with open(results_path, "r", encoding="utf-8") as f:
+                    payload = json.load(f)
+            except Exception:
+                payload = None
+            if payload is None:
+                print(f"[进程 {index}/{processes}] 异常退出（退出码 {returncode}），未返回结果")
+                for account in shard_accounts(accounts, [(index, processes, PROCESS_SHARD_SALT)]):
+                    final_results[account.get("username")] = {
+                        "ok": False,
+                        "username": account.get("username"),
+                        "detail": f"分片进程 {index}/{processes} 异常退出（退出码 {returncode}）",
+                        "stats": {},
+                        "failure_class": FAILURE_UNKNOWN,
+                    }
+                continue
+            summaries.append(payload.get("summary") or {})
+            for result in payload.get("results") or []:
+                final_results[result.get("username")] = result
+    finally:
+        # 父进程被中断时不留下孤儿子进程
+        for _, proc, _, _ in children:
+            if proc.returncode is None:
+                try:
+                    proc.terminate()
+                except ProcessLookupError:
+                    pass
+        for _, proc, relay, _ in children:
+            if proc.returncode is None:
+                await proc.wait()
+            relay.cancel()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = _ordered_results((account.get("username") for account in accounts), final_results)
+    summary = {"本机进程数": processes}
+    if shards:
+        summary["分片"] = " · ".join(f"{index}/{count}" for index, count, _ in shards)
+    summary.update(_merge_shard_summaries(summaries))
+    await send_run_report(config, results, summary)
+    print("\n所有账号签到任务已完成。")
+    return results
+
+def _config_paths():
+    return ["config.json", "config.jsonc"]
+
+def _mtime_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            signature.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+class ReloadingInputs:
+    """常驻进程中缓存配置与账号列表，仅在对应文件的 mtime 变化（或被强制）时重新解析。"""
+
+    def __init__(self, accounts_path: str = "accounts.json"):
+        self.accounts_path = accounts_path
+        self._config = None
+        self._config_signature = None
+        self._accounts = None
+        self._accounts_signature = None
+
+    def config(self, force: bool = False):
+        signature = _mtime_signature(_config_paths())
+        if force or self._config is None or signature != self._config_signature:
+            if self._config is not None:
+                print("[守护进程] 检测到配置文件变化，重新加载配置")
+            self._config = load_config()
+            self._config_signature = signature
+        return self._config
+
+    def accounts(self, force: bool = False):
+        signature = _mtime_signature([self.accounts_path])
+        if force or self._accounts is None or signature != self._accounts_signature:
+            if self._accounts is not None:
+                print(f"[守护进程] 检测到 {self.accounts_path} 变化，重新加载账号")
+            self._accounts = load_accounts(self.accounts_path)
+            self._accounts_signature = signature
+        return self._accounts
+
+    def changed(self):
+        return (
+            _mtime_signature(_config_paths()) != self._config_signature
+            or _mtime_signature([self.accounts_path]) != self._accounts_signature
+        )
+
+async def _wait_any_event(events, timeout: float):
+    tasks = [asyncio.ensure_future(event.wait()) for event in events]
+    try:
+        await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+# 守护进程等待期间检查配置文件 mtime 的间隔（秒）
+DAEMON_POLL_SECONDS = 60
+
+def _daemon_next_run_at(schedule_cfg: dict, last_run_at, started_at: datetime):
+    """以上一次任务结束时间为基准计算下一次运行时间；还没运行过时以守护进程启动时间为基准。"""
+    if not (schedule_cfg or {}).get("enabled", True):
+        return None
+    if last_run_at is None:
+        if (schedule_cfg or {}).get("run_immediately_on_start", True):
+            return started_at
+        return compute_next_run_at(started_at, schedule_cfg)
+    return compute_next_run_at(last_run_at, schedule_cfg)
+
+async def run_daemon(shards=None):
+    """
+    常驻调度：在同一个 asyncio 进程内循环 compute_next_run_at -> run_once。
+
+    SIGTERM/SIGINT：停止调度，正在执行的任务会被取消并释放浏览器；
+    SIGHUP / 文件变化：立即重新加载配置与账号；只有 schedule 段变化时才重新计算下一次运行时间，
+    且仍以上一次运行为基准，频繁修改账号文件不会把待执行的任务一再推迟。
+    Playwright 只在首次执行任务时才导入，每次任务结束都会关闭浏览器。
+    """
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    reload_event = asyncio.Event()
+
+    for sig, event in ((signal.SIGTERM, stop_event), (signal.SIGINT, stop_event), (getattr(signal, "SIGHUP", None), reload_event)):
+        if sig is None:
+            continue
+        try:
+            loop.add_signal_handler(sig, event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    inputs = ReloadingInputs()
+    started_at = datetime.now()
+    # 上一次任务结束的时间；间隔模式以它为基准，不随配置/账号重新加载而改变
+    last_run_at = None
+    schedule_cfg = None
+    next_at = None
+    print("[守护进程] 已启动")
+
+    while not stop_event.is_set():
+        force = reload_event.is_set()
+        if force:
+            print("[守护进程] 收到 SIGHUP，重新加载配置与账号")
+            reload_event.clear()
+        config = inputs.config(force=force)
+        inputs.accounts(force=force)
+        current_schedule = (config or {}).get("schedule", {}) or {}
+
+        if schedule_cfg is None or current_schedule != schedule_cfg:
+            if schedule_cfg is not None:
+                print("[守护进程] 调度配置已变化，重新计算下一次运行时间")
+            schedule_cfg = current_schedule
+            # 与 Shell 调度一致：未开启调度时不执行（next_at 为 None），等待配置变化或信号
+            next_at = _daemon_next_run_at(schedule_cfg, last_run_at, started_at)
+            if next_at is not None:
+                print(f"[守护进程] 下一次运行时间: {next_at.strftime('%Y-%m-%d %H:%M:%S')}")
+            else:
+                print("[守护进程] 调度未开启，等待配置变化...")
+
+        # 分段等待：期间检查信号与配置文件变化
+        interrupted = False
+        while not stop_event.is_set():
+            if next_at is not None:
+                remaining = (next_at - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+            else:
+                remaining = DAEMON_POLL_SECONDS
+            await _wait_any_event([stop_event, reload_event], min(remaining, DAEMON_POLL_SECONDS))
+            if reload_event.is_set() or inputs.changed():
+                interrupted = True
+                break
+        if stop_event.is_set():
+            break
+        if interrupted:
+            continue
+
+        config = inputs.config()
+        accounts = inputs.accounts()
+        run_task = asyncio.ensure_future(run_once(config, accounts=accounts, shards=shards))
+        stop_waiter = asyncio.ensure_future(stop_event.wait())
+        await asyncio.wait([run_task, stop_waiter], return_when=asyncio.FIRST_COMPLETED)
+        stop_waiter.cancel()
+        if not run_task.done():
+            print("[守护进程] 收到停止信号，取消正在执行的任务...")
+            run_task.cancel()
+        try:
+            await run_task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[守护进程] 本次任务执行出错: {e}")
+        last_run_at = datetime.now()
+        next_at = _daemon_next_run_at(schedule_cfg, last_run_at, started_at)
+        if next_at is not None and not stop_event.is_set():
+            print(f"[守护进程] 下一次运行时间: {next_at.strftime('%Y-%m-%d %H:%M:%S')}")
+        # 任务结束后浏览器已关闭，主动回收内存，降低空闲占用
+        gc.collect()
+
+    print("[守护进程] 已退出")
+
+import argparse
+
+# ... (Previous imports)
 
 # ... (Functions: get_webhook_config, send_wechat_webhook, format_final_report, load_config, compute_next_run_at, etc.)
 
@@ -716,12 +4592,61 @@ async def main():
     parser.add_argument("--worker", action="store_true", help="Run the sign-in worker immediately")
     parser.add_argument("--next-run", action="store_true", help="Calculate seconds until next run")
     parser.add_argument("--startup", action="store_true", help="Indicate this is the startup check")
+    parser.add_argument("--daemon", action="store_true", help="Run the scheduler loop inside this process")
+    parser.add_argument("--force", action="store_true", help="Run accounts even if they already succeeded today")
+    parser.add_argument("--no-spread", action="store_true", help="Ignore schedule.spread_minutes and start every account now")
+    parser.add_argument("--record-har", metavar="DIR", help="Record each account's browser session to a scrubbed HAR in DIR")
+    parser.add_argument("--replay-har", metavar="DIR", help="Serve every request from the HARs in DIR instead of the network")
+    parser.add_argument("--replay-latency-ms", type=float, default=0, help="Latency added to each replayed response")
+    parser.add_argument("--shard", metavar="INDEX/COUNT", help="Only run the accounts hashed to this shard (0-based)")
+    parser.add_argument("--processes", type=int, default=1, help="Split the accounts across N local worker processes")
+    parser.add_argument("--profile", nargs="?", const=os.path.join("state", "profile"), metavar="DIR",
+                        help="Profile the run with cProfile and write the stats to DIR (default: state/profile)")
+    # 以下两个参数仅供 --processes 启动的子进程使用
+    parser.add_argument("--process-shard", metavar="INDEX/COUNT", help=argparse.SUPPRESS)
+    parser.add_argument("--shard-results", help=argparse.SUPPRESS)
     args = parser.parse_args()
 
+    shards = []
+    try:
+        if args.shard:
+            shards.append(parse_shard(args.shard) + ("",))
+        if args.process_shard:
+            shards.append(parse_shard(args.process_shard) + (PROCESS_SHARD_SALT,))
+    except ValueError as e:
+        parser.error(str(e))
+    if args.processes < 1:
+        parser.error("--processes 必须大于等于 1")
+    if args.profile and args.daemon:
+        parser.error("--profile 只用于单次运行，不能与 --daemon 同时使用")
+    if args.record_har and args.replay_har:
+        parser.error("--record-har 与 --replay-har 不能同时使用")
+    if (args.record_har or args.replay_har) and args.daemon:
+        parser.error("--record-har / --replay-har 只用于单次运行，不能与 --daemon 同时使用")
+    har_args = []
+    if args.record_har:
+        har_args = ["--record-har", args.record_har]
+    elif args.replay_har:
+        har_args = ["--replay-har", args.replay_har, "--replay-latency-ms", str(args.replay_latency_ms)]
+    # 录制与回放都是为了得到一次完整的流程：忽略今日已完成记录与分散窗口
+    force = args.force or bool(har_args)
+    spread = not args.no_spread and not har_args
+
+    # 0. Daemon 模式：常驻进程内调度，替代 entrypoint.sh 的循环
+    if args.daemon:
+        await run_daemon(shards=shards)
+        return
+
     # 1. Worker 模式：执行具体的签到任务
     if args.worker:
         config = load_config()
-        await run_once(config)
+        config = apply_har_mode(config, args.record_har, args.replay_har, args.replay_latency_ms)
+        if args.processes > 1:
+            await run_processes(config, args.processes, force=force, shards=shards, profile_dir=args.profile,
+                                spread=spread, har_args=har_args)
+        else:
+            with profile_run(args.profile):
+                await run_once(config, force=force, shards=shards, results_path=args.shard_results, spread=spread)
         return
 
     # 2. Next Run 模式：计算下一次运行的等待秒数
@@ -756,7 +4681,13 @@ async def main():
     # 默认行为：如果什么参数都没传，为了兼容旧习惯，也可以默认运行一次 worker
     # 或者打印帮助
     config = load_config()
-    await run_once(config)
+    config = apply_har_mode(config, args.record_har, args.replay_har, args.replay_latency_ms)
+    if args.processes > 1:
+        await run_processes(config, args.processes, force=force, shards=shards, profile_dir=args.profile,
+                            spread=spread, har_args=har_args)
+    else:
+        with profile_run(args.profile):
+            await run_once(config, force=force, shards=shards, results_path=args.shard_results, spread=spread)
 
 if __name__ == "__main__":
     try:
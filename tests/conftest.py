@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+import main  # noqa: E402
+from standin_server import StandInServer  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """在临时目录中运行：accounts.json、state/ 与 artifacts/ 都不会写进仓库。"""
+    monkeypatch.chdir(tmp_path)
+    for name in ("API_DAILY_BASE_URL", "WECHAT_WEBHOOK_URL", "WECHAT_WEBHOOK_ENABLED", "WECHAT_WEBHOOK_DRY_RUN"):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def standin(request):
+    """本地替身站点；用 @pytest.mark.standin(latency_ms=...) 传入 StandInServer 参数。"""
+    marker = request.node.get_closest_marker("standin")
+    server = StandInServer(**(marker.kwargs if marker else {})).start()
+    main.set_base_url(server.url)
+    try:
+        yield server
+    finally:
+        server.stop()
+        main.set_base_url(main.DEFAULT_BASE_URL)
+
+
+@pytest.fixture
+def http_config():
+    return _http_config
+
+
+def _http_config(base_url: str, **run_overrides):
+    """与 bench/run_bench.py 相同的离线配置：HTTP 引擎，关闭通知、运行历史、阶段导出与限速。"""
+    config = main.load_config()
+    config["base_url"] = base_url
+    config["engine"] = "http"
+    config["webhook"] = {"enabled": False}
+    config["history"] = {"enabled": False}
+    config["metrics"] = {"enabled": False}
+    config["session_cache"] = dict(config.get("session_cache") or {}, enabled=False)
+    config["browser"] = dict(config.get("browser") or {}, proxy=None, proxies=[], reap_orphans=False)
+    config["run"] = dict(
+        config.get("run") or {},
+        concurrency=1,
+        between_accounts_seconds=0,
+        min_start_interval_seconds=0,
+        max_retries=0,
+        rate_limit={"enabled": False},
+    )
+    config["run"].update(run_overrides)
+    return config
@@ -0,0 +1,61 @@
+import json
+
+import main
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def _usernames(source):
+    return [account["username"] for account in source]
+
+
+def test_json_array(tmp_path):
+    accounts = [{"username": f"u{i}", "password": "p"} for i in range(3)]
+    source = main.AccountSource(_write(tmp_path / "a.json", json.dumps(accounts, indent=2)))
+    assert _usernames(source) == ["u0", "u1", "u2"]
+    assert source.count == 3
+    assert source.errors == []
+
+
+def test_json_array_with_bom_and_leading_whitespace_beyond_one_chunk(tmp_path):
+    padding = " \n" * main.AccountSource.CHUNK_SIZE
+    path = tmp_path / "a.json"
+    path.write_bytes(b"\xef\xbb\xbf" + (padding + json.dumps([{"username": "u0", "password": "p"}])).encode("utf-8"))
+    assert _usernames(main.AccountSource(str(path))) == ["u0"]
+
+
+def test_json_array_entries_spanning_chunks(tmp_path):
+    accounts = [{"username": f"user-{i:05d}", "password": "x" * 50} for i in range(3000)]
+    source = main.AccountSource(_write(tmp_path / "a.json", json.dumps(accounts)))
+    assert _usernames(source) == [a["username"] for a in accounts]
+
+
+def test_json_array_bad_entry_is_skipped_with_line_number(tmp_path):
+    text = '[\n  {"username": "u0", "password": "p"},\n  {"username": "u1", "password": },\n  {"username": "u2", "password": "p"}\n]'
+    source = main.AccountSource(_write(tmp_path / "a.json", text))
+    assert _usernames(source) == ["u0", "u2"]
+    assert [line for line, _ in source.errors] == [3]
+
+
+def test_jsonl_with_comments_duplicates_and_non_objects(tmp_path):
+    text = "\n".join([
+        "# comment",
+        '{"username": "u0", "password": "p"}',
+        "",
+        "// another comment",
+        '{"username": "u1", "password": "p"},',
+        '{"username": "u0", "password": "again"}',
+        '"not an account"',
+        "{broken",
+    ])
+    source = main.AccountSource(_write(tmp_path / "a.jsonl", text))
+    assert _usernames(source) == ["u0", "u1"]
+    assert source.duplicates == 1
+    assert [line for line, _ in source.errors] == [6, 7, 8]
+
+
+def test_empty_file(tmp_path):
+    assert list(main.AccountSource(_write(tmp_path / "a.json", "   \n"))) == []
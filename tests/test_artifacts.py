@@ -0,0 +1,68 @@
+import asyncio
+import errno
+import gzip
+import os
+
+import main
+
+
+def test_writes_compressed_and_deduplicates(tmp_path):
+    async def scenario():
+        writer = main.ArtifactWriter(str(tmp_path))
+        first = writer.submit("a.html", "<html>same</html>")
+        second = writer.submit("b.html", "<html>same</html>")
+        await writer.close()
+        return writer, first, second
+
+    writer, first, second = asyncio.run(scenario())
+    assert first == second == os.path.join(str(tmp_path), "a.html.gz")
+    assert gzip.decompress(open(first, "rb").read()) == b"<html>same</html>"
+    assert (writer.written, writer.deduplicated) == (1, 1)
+
+
+def test_run_budget_drops_extra_files(tmp_path):
+    async def scenario():
+        writer = main.ArtifactWriter(str(tmp_path), compress=False, run_budget_bytes=10)
+        kept = writer.submit("a.txt", b"12345678")
+        dropped = writer.submit("b.txt", b"abcdefgh")
+        await writer.close()
+        return writer, kept, dropped
+
+    writer, kept, dropped = asyncio.run(scenario())
+    assert kept and dropped is None and writer.dropped == 1
+
+
+def test_sweep_removes_oldest_beyond_max_files(tmp_path):
+    for i in range(5):
+        path = tmp_path / f"old{i}.txt"
+        path.write_text("x")
+        os.utime(path, (1000 + i, 1000 + i))
+    writer = main.ArtifactWriter(str(tmp_path), retention_days=0, max_files=2)
+    writer._sweep()
+    assert sorted(os.listdir(tmp_path)) == ["old3.txt", "old4.txt"]
+    assert writer.removed == 3
+
+
+def test_sweep_errors_do_not_hang_close(tmp_path, monkeypatch):
+    (tmp_path / "old.txt").write_text("x")
+
+    def denied(path):
+        raise PermissionError(errno.EACCES, "Permission denied", path)
+
+    def busy(path):
+        raise OSError(errno.EBUSY, "Device or resource busy", path)
+
+    async def scenario():
+        writer = main.ArtifactWriter(str(tmp_path), compress=False, retention_days=0, max_files=0)
+        path = writer.submit("new.txt", b"data")
+        await asyncio.wait_for(writer.close(), 5)
+        return path
+
+    monkeypatch.setattr(main.os, "scandir", denied)
+    path = asyncio.run(scenario())
+    assert open(path, "rb").read() == b"data"
+
+    monkeypatch.undo()
+    monkeypatch.setattr(main.os, "remove", busy)
+    path = asyncio.run(scenario())
+    assert os.path.exists(path)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import time
+
+import main
+
+
+def _write_config(workdir, **schedule):
+    schedule = dict({"enabled": True, "mode": "interval", "interval_seconds": 3, "run_immediately_on_start": False},
+                    **schedule)
+    (workdir / "config.json").write_text(json.dumps({"schedule": schedule}), encoding="utf-8")
+
+
+def _touch(path, bump):
+    # mtime 精度可能只有 1 秒：显式推进，保证每次都能被识别为变化
+    stamp = time.time() + bump
+    os.utime(path, (stamp, stamp))
+
+
+def _run_daemon(monkeypatch, duration_seconds, during=None):
+    runs = []
+
+    async def fake_run_once(config, accounts=None, shards=None, **kwargs):
+        runs.append(time.monotonic())
+        return []
+
+    monkeypatch.setattr(main, "run_once", fake_run_once)
+    monkeypatch.setattr(main, "DAEMON_POLL_SECONDS", 0.05)
+
+    async def scenario():
+        daemon = asyncio.ensure_future(main.run_daemon())
+        started = time.monotonic()
+        if during is not None:
+            await during()
+        await asyncio.sleep(max(0, duration_seconds - (time.monotonic() - started)))
+        daemon.cancel()
+        await asyncio.gather(daemon, return_exceptions=True)
+        return started
+
+    started = asyncio.run(scenario())
+    return [round(t - started, 1) for t in runs]
+
+
+def test_account_edits_do_not_postpone_interval_runs(workdir, monkeypatch):
+    _write_config(workdir)
+    accounts = workdir / "accounts.json"
+    accounts.write_text("[]", encoding="utf-8")
+
+    async def edit_accounts_every_second():
+        for i in range(8):
+            await asyncio.sleep(1)
+            _touch(accounts, i + 1)
+
+    runs = _run_daemon(monkeypatch, 8.5, edit_accounts_every_second)
+    assert len(runs) == 2
+    assert 2.5 <= runs[0] <= 3.6
+
+
+def test_schedule_change_is_anchored_to_daemon_start(workdir, monkeypatch):
+    _write_config(workdir, interval_seconds=60)
+    (workdir / "accounts.json").write_text("[]", encoding="utf-8")
+
+    async def shorten_interval():
+        await asyncio.sleep(1)
+        _write_config(workdir, interval_seconds=2)
+        _touch(workdir / "config.json", 1)
+
+    runs = _run_daemon(monkeypatch, 3, shorten_interval)
+    # 以启动时间为基准：2 秒间隔在 1 秒后改配置时只需再等 1 秒，而不是从修改时刻重新计时
+    assert len(runs) == 1
+    assert 1.0 <= runs[0] <= 2.6
+
+
+def test_next_run_at_is_anchored_to_last_run():
+    started_at = main.datetime(2026, 1, 1, 0, 0, 0)
+    last_run_at = main.datetime(2026, 1, 1, 1, 0, 0)
+    schedule = {"mode": "interval", "interval_seconds": 600, "run_immediately_on_start": True}
+    assert main._daemon_next_run_at(schedule, None, started_at) == started_at
+    assert main._daemon_next_run_at(schedule, last_run_at, started_at) == main.datetime(2026, 1, 1, 1, 10, 0)
+    assert main._daemon_next_run_at(dict(schedule, enabled=False), last_run_at, started_at) is None
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("detail, expected", [
+    ("登录失败：用户名或密码错误", main.FAILURE_BAD_CREDENTIALS),
+    ("账号已被封禁", main.FAILURE_BAD_CREDENTIALS),
+    ("页面出现 Turnstile 人机验证", main.FAILURE_CAPTCHA),
+    ("Too Many Requests", main.FAILURE_CAPTCHA),
+    ("502 Bad Gateway", main.FAILURE_SITE_ERROR),
+    ("系统维护中，请稍后再试", main.FAILURE_SITE_ERROR),
+    ("net::ERR_CONNECTION_RESET at https://example", main.FAILURE_NETWORK),
+    ("Navigation timeout of 45000 ms exceeded", main.FAILURE_NETWORK),
+    ("something odd happened", main.FAILURE_UNKNOWN),
+])
+def test_classify_by_detail(detail, expected):
+    assert main.classify_failure(detail) == expected
+
+
+def test_sign_in_error_class_wins_over_text():
+    exc = main.SignInError("超时后停留在登录页", main.FAILURE_SELECTOR_DRIFT)
+    assert main.classify_failure(str(exc), exc=exc) == main.FAILURE_SELECTOR_DRIFT
+
+
+def test_exception_type_and_url():
+    assert main.classify_failure("boom", exc=ConnectionResetError()) == main.FAILURE_NETWORK
+    assert main.classify_failure("boom", exc=asyncio.TimeoutError()) == main.FAILURE_NETWORK
+    assert main.classify_failure("", url="https://site.example/challenge?x=1") == main.FAILURE_CAPTCHA
+    # 文本提示优先于异常类型
+    assert main.classify_failure("密码错误", exc=OSError()) == main.FAILURE_BAD_CREDENTIALS
+
+
+def test_configured_policy_overrides_are_merged():
+    config = {"run": {"failure_policies": {main.FAILURE_CAPTCHA: {"label": "被风控", "retry": False}}}}
+    policies = main.resolve_failure_policies(config)
+    assert policies[main.FAILURE_CAPTCHA]["label"] == "被风控"
+    assert policies[main.FAILURE_CAPTCHA]["retry"] is False
+    assert policies[main.FAILURE_CAPTCHA]["backoff_multiplier"] == 4
+    assert policies[main.FAILURE_NETWORK] == main.DEFAULT_FAILURE_POLICIES[main.FAILURE_NETWORK]
+
+
+def test_report_uses_configured_labels(workdir, capsys):
+    config = {
+        "webhook": {"enabled": True, "url": "http://127.0.0.1:9/unused", "dry_run": True},
+        "run": {"failure_policies": {main.FAILURE_CAPTCHA: {"label": "被风控"}}},
+    }
+    results = [{"ok": False, "username": "u0", "detail": "验证码", "failure_class": main.FAILURE_CAPTCHA, "stats": {}}]
+    report = asyncio.run(main.send_run_report(config, results, {}))
+    assert "[被风控] 验证码" in report
+    assert "被风控 1" in report
+    assert "人机验证/风控" not in report
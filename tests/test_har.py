@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import stat
+
+import main
+
+PASSWORD = "s3cret-pass"
+
+
+def _har(username="alice"):
+    login = {"username": username, "password": PASSWORD}
+    user_self = {"data": {"id": 7, "username": username, "email": "a@example.com", "display_name": "Alice", "quota": 5}}
+    return {"log": {"entries": [
+        {
+            "request": {
+                "method": "POST",
+                "url": f"https://site.example/api/user/login?who={username}",
+                "headers": [{"name": "Cookie", "value": "session=abc"}, {"name": "X-Trace", "value": username}],
+                "cookies": [{"name": "session", "value": "abc"}],
+                "queryString": [{"name": "who", "value": username}],
+                "postData": {"mimeType": "application/json", "text": json.dumps(login)},
+            },
+            "response": {
+                "status": 200,
+                "headers": [{"name": "Set-Cookie", "value": "session=abc"}],
+                "content": {"mimeType": "application/json", "text": json.dumps({"success": True, "data": {"token": "t"}})},
+            },
+        },
+        {
+            "request": {"method": "GET", "url": "https://site.example/api/user/self", "headers": []},
+            "response": {"status": 200, "headers": [],
+                         "content": {"mimeType": "application/json", "text": json.dumps(user_self)}},
+        },
+        {
+            "request": {"method": "GET", "url": "https://site.example/app.js", "headers": []},
+            "response": {"status": 200, "headers": [],
+                         "content": {"mimeType": "text/javascript", "text": f"var alice = 1; // {PASSWORD}"}},
+        },
+    ]}}
+
+
+def test_scrub_har_removes_credentials_cookies_and_identity():
+    har = main.scrub_har(_har(), [PASSWORD], identifiers=["alice"])
+    text = json.dumps(har)
+    assert PASSWORD not in text
+    assert "abc" not in text and "a@example.com" not in text and "Alice" not in text
+    login, user_self, script = har["log"]["entries"]
+    assert "alice" not in json.dumps(login) and "alice" not in json.dumps(user_self)
+    assert login["request"]["cookies"] == []
+    assert json.loads(user_self["response"]["content"]["text"])["data"]["quota"] == 5
+    # 页面脚本中只替换密码，短用户名原样保留，避免破坏回放用的资源
+    assert script["response"]["content"]["text"] == "var alice = 1; // [scrubbed]"
+
+
+def test_raw_recording_is_private_and_removed_after_scrubbing(tmp_path):
+    session = main.HarSession("record", str(tmp_path))
+    raw_path = session.recording_kwargs("alice")["record_har_path"]
+    raw_dir = os.path.dirname(raw_path)
+    assert stat.S_IMODE(os.stat(raw_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(os.path.dirname(raw_dir)).st_mode) == 0o700
+
+    with open(raw_path, "w", encoding="utf-8") as f:
+        json.dump(_har(), f)
+    path = asyncio.run(session.finish_recording("alice", PASSWORD))
+
+    assert not os.path.exists(raw_path)
+    assert os.path.dirname(path) == str(tmp_path)
+    with open(path, encoding="utf-8") as f:
+        assert PASSWORD not in f.read()
+    session.close()
+    assert not os.path.exists(raw_dir)
+
+
+def test_unreadable_raw_recording_is_deleted(tmp_path):
+    session = main.HarSession("record", str(tmp_path))
+    raw_path = session.recording_kwargs("alice")["record_har_path"]
+    with open(raw_path, "w", encoding="utf-8") as f:
+        f.write("{truncated")
+    assert asyncio.run(session.finish_recording("alice", PASSWORD)) is None
+    assert not os.path.exists(raw_path)
+
+
+def test_stale_raw_files_are_removed_on_startup(tmp_path):
+    legacy = tmp_path / "0123.har.raw"
+    legacy.write_text("{}")
+    dead = tmp_path / ".raw" / "999999999"
+    dead.mkdir(parents=True)
+    (dead / "x.har.raw").write_text("{}")
+    main.HarSession("record", str(tmp_path))
+    assert not legacy.exists() and not dead.exists()
+
+
+class _FakeRequest:
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+
+
+class _FakeRoute:
+    def __init__(self, method, url):
+        self.request = _FakeRequest(method, url)
+        self.fulfilled = None
+        self.aborted = False
+
+    async def fulfill(self, status, headers, body):
+        self.fulfilled = (status, body)
+
+    async def abort(self, reason):
+        self.aborted = True
+
+
+class _FakeContext:
+    def __init__(self):
+        self.handler = None
+
+    async def route(self, pattern, handler):
+        self.handler = handler
+
+
+def test_replay_serves_recorded_responses_and_aborts_unknown(tmp_path):
+    recorder = main.HarSession("record", str(tmp_path))
+    with open(recorder.recording_kwargs("alice")["record_har_path"], "w", encoding="utf-8") as f:
+        json.dump(_har(), f)
+    asyncio.run(recorder.finish_recording("alice", PASSWORD))
+
+    async def scenario():
+        session = main.HarSession("replay", str(tmp_path))
+        context = _FakeContext()
+        counters = await session.install_replay(context, "alice")
+        # 主机不同（回放时 base_url 变化）也能按路径命中
+        known = _FakeRoute("GET", "http://127.0.0.1:8765/api/user/self")
+        unknown = _FakeRoute("GET", "http://127.0.0.1:8765/api/other")
+        await context.handler(known)
+        await context.handler(unknown)
+        return counters, known, unknown
+
+    counters, known, unknown = asyncio.run(scenario())
+    assert counters == {"served": 1, "missed": 1}
+    assert known.fulfilled[0] == 200 and b'"quota": 5' in known.fulfilled[1]
+    assert unknown.aborted
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+def _sign_in(username, password, pool=None, statuses=None):
+    pool = pool or main.HttpConnectionPool(timeout_seconds=5)
+    try:
+        return asyncio.run(main.run_http_sign_in(
+            {"username": username, "password": password}, {}, pool, pushback_statuses=statuses,
+        ))
+    finally:
+        pool.close()
+
+
+def test_check_in_and_stats(standin):
+    result = _sign_in("alice", standin.password)
+    assert result["ok"] and result["detail"].startswith("已执行签到")
+    assert result["stats"]["source"] == "http"
+    assert {"balance", "consumption", "requests"} <= set(result["stats"])
+    assert {"login_submit", "checkin", "stats"} <= set(result["phases"])
+
+
+def test_second_check_in_reports_already_done(standin):
+    pool = main.HttpConnectionPool(timeout_seconds=5)
+    try:
+        asyncio.run(main.run_http_sign_in({"username": "bob", "password": standin.password}, {}, pool))
+        again = asyncio.run(main.run_http_sign_in({"username": "bob", "password": standin.password}, {}, pool))
+        # 同一主机的 keep-alive 连接被复用
+        assert pool.connections_opened < pool.requests_sent
+    finally:
+        pool.close()
+    assert again["ok"] and again["detail"].startswith("今日已签到")
+
+
+def test_wrong_password_is_bad_credentials(standin):
+    result = _sign_in("carol", "wrong")
+    assert not result["ok"]
+    assert result["failure_class"] == main.FAILURE_BAD_CREDENTIALS
+
+
+@pytest.mark.standin(turnstile=True)
+def test_turnstile_falls_back_to_browser(standin):
+    with pytest.raises(main.HttpEngineFallback):
+        _sign_in("dave", standin.password)
+
+
+@pytest.mark.standin(fail_rate=1)
+def test_server_errors_are_recorded_as_pushback(standin):
+    result = asyncio.run(main.run_account(
+        {"username": "erin", "password": standin.password}, {}, engine="http",
+        http_pool=main.HttpConnectionPool(timeout_seconds=5),
+    ))
+    assert not result["ok"] and result["engine"] == "http"
+    assert result["http_status"] == 500
+    assert main.AdaptiveRateLimiter.is_pushback(result)
+
+
+def test_full_run(workdir, standin, http_config):
+    accounts = [{"username": f"u{i}", "password": standin.password} for i in range(5)]
+    accounts.append({"username": "bad", "password": "wrong"})
+    config = http_config(standin.url, concurrency=3)
+    results = asyncio.run(main.run_once(config, accounts, force=True, spread=False))
+    assert [r["username"] for r in results] == [a["username"] for a in accounts]
+    assert [r["ok"] for r in results] == [True] * 5 + [False]
+    assert all(r["engine"] == "http" for r in results)
+    assert results[-1]["failure_class"] == main.FAILURE_BAD_CREDENTIALS
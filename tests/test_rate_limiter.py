@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import main
+
+HOST = "site.example"
+
+
+def _limiter(**kwargs):
+    params = dict(initial_per_minute=10, min_per_minute=2, max_per_minute=12, increase_per_minute=1, decrease_factor=0.5)
+    params.update(kwargs)
+    return main.AdaptiveRateLimiter(**params)
+
+
+def test_success_increases_rate_up_to_max():
+    limiter = _limiter()
+    for _ in range(5):
+        limiter.observe(HOST, {"ok": True})
+    assert limiter.current_per_minute() == 12
+    assert limiter.increases == 2
+
+
+def test_pushback_decreases_once_per_congestion_round():
+    limiter = _limiter()
+    started_before = time.monotonic()
+    limiter.observe(HOST, {"ok": False, "http_status": 429}, started_before)
+    assert limiter.current_per_minute() == 5
+    # 降速之前就已开始的账号再报告失败，不再继续减半
+    limiter.observe(HOST, {"ok": False, "http_status": 503}, started_before)
+    assert limiter.current_per_minute() == 5
+    limiter.observe(HOST, {"ok": False, "failure_class": main.FAILURE_CAPTCHA}, time.monotonic())
+    assert limiter.current_per_minute() == 2.5
+    for _ in range(3):
+        limiter.observe(HOST, {"ok": False, "failure_class": main.FAILURE_SITE_ERROR}, time.monotonic())
+    assert limiter.current_per_minute() == 2
+    assert limiter.lowest_per_minute == 2
+
+
+def test_pushback_comes_from_structured_fields_only():
+    assert not main.AdaptiveRateLimiter.is_pushback({"ok": False, "detail": "2026-04-29 12:00:00 登录失败 (429)"})
+    assert not main.AdaptiveRateLimiter.is_pushback({"ok": False, "failure_class": main.FAILURE_BAD_CREDENTIALS})
+    assert not main.AdaptiveRateLimiter.is_pushback({"ok": True, "http_status": 429})
+    assert main.AdaptiveRateLimiter.is_pushback({"ok": False, "http_status": 429})
+    assert main.AdaptiveRateLimiter.is_pushback({"ok": False, "http_status": 502})
+
+
+def test_accounts_that_never_reached_the_site_refund_their_token():
+    async def scenario():
+        limiter = _limiter(initial_per_minute=60, max_per_minute=60)
+        await limiter.acquire(HOST)
+        limiter.observe(HOST, {"ok": False, "site_reached": False, "detail": "启动浏览器失败：x"})
+        started = time.monotonic()
+        await limiter.acquire(HOST)
+        return limiter, time.monotonic() - started
+
+    limiter, waited = asyncio.run(scenario())
+    assert waited < 0.2
+    assert limiter.current_per_minute() == 60 and limiter.decreases == 0
+
+
+def test_acquire_spaces_starts_by_rate():
+    async def scenario():
+        limiter = _limiter(initial_per_minute=600, max_per_minute=600)
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.acquire(HOST) for _ in range(3)))
+        return time.monotonic() - started
+
+    # burst=1：第一个立即开始，其余按 0.1 秒间隔排队
+    assert 0.18 <= asyncio.run(scenario()) < 0.6
+
+
+def test_create_rate_limiter_splits_rates_across_processes():
+    config = {"run": {"rate_limit": {"initial_per_minute": 12, "min_per_minute": 4, "max_per_minute": 24}}}
+    limiter = main.create_rate_limiter(config, share=4)
+    assert (limiter.initial_per_minute, limiter.min_per_minute, limiter.max_per_minute) == (3, 1, 6)
+    assert main.create_rate_limiter({"run": {"rate_limit": {"enabled": False}}}) is None
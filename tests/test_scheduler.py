@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import main
+
+
+def test_get_returns_items_by_ready_time_and_none_when_done():
+    async def scenario():
+        scheduler = main.AccountScheduler()
+        now = time.monotonic()
+        await scheduler.push("later", now + 0.05)
+        await scheduler.push("now", now)
+        first = await scheduler.get()
+        await scheduler.task_done()
+        second = await scheduler.get()
+        await scheduler.task_done()
+        return first, second, await scheduler.get()
+
+    assert asyncio.run(scenario()) == ("now", "later", None)
+
+
+def test_get_waits_for_feed_to_close():
+    async def scenario():
+        scheduler = main.AccountScheduler(feeding=True)
+        getter = asyncio.ensure_future(scheduler.get())
+        await asyncio.sleep(0.01)
+        assert not getter.done()
+        await scheduler.close_feed()
+        return await getter
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_get_returns_none_at_deadline():
+    async def scenario():
+        scheduler = main.AccountScheduler()
+        await scheduler.push("future", time.monotonic() + 60)
+        return await scheduler.get(deadline_at=time.monotonic() + 0.02)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_wait_for_room_bounds_fed_items_but_not_retries():
+    async def scenario():
+        scheduler = main.AccountScheduler(feeding=True)
+        for i in range(2):
+            await scheduler.wait_for_room(2)
+            await scheduler.push(i, fed=True)
+        # 重试入队不计入背压
+        await scheduler.push("retry")
+        waiter = asyncio.ensure_future(scheduler.wait_for_room(2))
+        await asyncio.sleep(0.01)
+        blocked = not waiter.done()
+        await scheduler.get()
+        return blocked, await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(scenario()) == (True, True)
+
+
+def test_stop_returns_queued_items_and_releases_feeder():
+    async def scenario():
+        scheduler = main.AccountScheduler(feeding=True)
+        await scheduler.push("a", fed=True)
+        waiter = asyncio.ensure_future(scheduler.wait_for_room(1))
+        await asyncio.sleep(0.01)
+        remaining = await scheduler.stop()
+        return remaining, await asyncio.wait_for(waiter, 1), scheduler.stopped
+
+    assert asyncio.run(scenario()) == (["a"], False, True)
+
+
+def test_pool_with_streaming_feed_keeps_queue_bounded():
+    async def scenario():
+        scheduler = main.AccountScheduler(feeding=True)
+        handled = []
+        max_queued = 0
+
+        async def feed():
+            for i in range(500):
+                await scheduler.wait_for_room(8)
+                await scheduler.push(i, fed=True)
+            await scheduler.close_feed()
+
+        async def handler(item):
+            nonlocal max_queued
+            max_queued = max(max_queued, len(scheduler))
+            handled.append(item)
+            await asyncio.sleep(0)
+            return {"ok": True}
+
+        feeder = asyncio.ensure_future(feed())
+        await main.run_account_pool(scheduler, handler, concurrency=3)
+        await feeder
+        return handled, max_queued
+
+    handled, max_queued = asyncio.run(scenario())
+    assert sorted(handled) == list(range(500))
+    assert max_queued <= 8
+
+
+@pytest.mark.standin(latency_ms=40)
+def test_deadline_with_streaming_feed_reports_every_account(workdir, standin, http_config):
+    accounts = [{"username": f"u{i:03d}", "password": standin.password} for i in range(60)]
+    (workdir / "accounts.json").write_text(json.dumps(accounts), encoding="utf-8")
+    config = http_config(standin.url, concurrency=1, deadline_seconds=1)
+
+    results = asyncio.run(main.run_once(config, force=True, spread=False))
+
+    assert [r["username"] for r in results] == [a["username"] for a in accounts]
+    unexecuted = [r for r in results if "未执行" in r["detail"]]
+    assert unexecuted and not any(r["ok"] for r in unexecuted)
+    assert any(r["ok"] for r in results)